@@ -1,12 +1,260 @@
-from fastapi import FastAPI, HTTPException, Query
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
-from services.erpnext import get_sales_invoices, get_overdue_invoices, get_bin_stock, get_low_stock_items, get_delayed_purchase_orders
+from fastapi.responses import PlainTextResponse, RedirectResponse, StreamingResponse
+from services.erpnext import (
+    get_sales_invoices_async,
+    get_overdue_invoices_async,
+    get_bin_stock_async,
+    get_low_stock_items_async,
+    get_delayed_purchase_orders_async,
+    close_async_client,
+    response_cache,
+    upstream_flights,
+    upstream_breaker,
+    site_breaker,
+    site_breakers,
+    local_mirror,
+    run_mirror_sync,
+    LOW_STOCK_HIGH_BELOW,
+    LOW_STOCK_MEDIUM_MAX,
+    LOW_STOCK_TOP_N,
+    MIRROR_INTERVAL
+)
+from services.events import EventBroker, diff_dataset, event_stream
+from services.breaker import CircuitOpenError, is_upstream_failure
+from services.http import CompressionMiddleware, ORJSONResponse, content_etag, json_response
+from services.metrics import MetricsMiddleware, render as render_metrics
+from services.profiling import PROFILING_ENABLED, ProfilingMiddleware, load_profile, profiling
+from services.sites import (
+    SITES,
+    fan_out,
+    merge_delayed_purchase_orders,
+    merge_low_stock,
+    merge_overdue_invoices
+)
+from services.snapshots import SnapshotStore
 import requests
 import os
 from pathlib import Path
 
-app = FastAPI(title="ERPNext Risk Radar API")
+logger = logging.getLogger(__name__)
+
+# Risk datasets are served from snapshots refreshed in the background
+# every RISK_SNAPSHOT_INTERVAL seconds (0 disables snapshots)
+SNAPSHOT_INTERVAL = float(os.getenv("RISK_SNAPSHOT_INTERVAL", "60"))
+# Query limit used by static/dashboard.html, pre-warmed on startup
+DASHBOARD_LIMIT = 100
+# Responses of at least this many bytes are brotli/gzip compressed
+COMPRESS_MIN_SIZE = int(os.getenv("RISK_COMPRESS_MIN_SIZE", "1024"))
+
+snapshots = SnapshotStore(max_age=SNAPSHOT_INTERVAL)
+# Row-level changes of the dashboard datasets, pushed over /events
+events = EventBroker()
+
+
+def across_sites(fetch, merge):
+    """
+    Snapshot loader for fetch. With ERP_SITES set, fetch runs on every
+    site concurrently and merge(site_results) builds the payload.
+    """
+    if not SITES:
+        return fetch
+
+    async def load():
+        return merge(await fan_out(SITES, fetch))
+
+    return load
+
+
+def overdue_snapshot(
+    limit=50,
+    customer=None,
+    days_medium_min=8,
+    days_medium_max=14,
+    days_high_min=15,
+    min_amount=None,
+    max_amount=None,
+    min_days=None,
+    max_days=None
+):
+    """Snapshot key and loader for /invoices/overdue."""
+    key = (
+        "overdue_invoices", limit, customer, days_medium_min, days_medium_max, days_high_min,
+        min_amount, max_amount, min_days, max_days
+    )
+    return key, across_sites(lambda: get_overdue_invoices_async(
+        limit=limit,
+        customer=customer,
+        days_medium_min=days_medium_min,
+        days_medium_max=days_medium_max,
+        days_high_min=days_high_min,
+        min_amount=min_amount,
+        max_amount=max_amount,
+        min_days=min_days,
+        max_days=max_days
+    ), lambda results: merge_overdue_invoices(results, limit))
+
+
+def low_stock_snapshot(
+    limit=None,
+    warehouse=None,
+    item_code=None,
+    high_below=LOW_STOCK_HIGH_BELOW,
+    medium_max=LOW_STOCK_MEDIUM_MAX,
+    top_n=LOW_STOCK_TOP_N
+):
+    """Snapshot key and loader for /inventory/low-stock."""
+    key = ("low_stock_items", limit, warehouse, item_code, high_below, medium_max, top_n)
+    return key, across_sites(lambda: get_low_stock_items_async(
+        limit=limit,
+        warehouse=warehouse,
+        item_code=item_code,
+        high_below=high_below,
+        medium_max=medium_max,
+        top_n=top_n
+    ), lambda results: merge_low_stock(results, top_n))
+
+
+def delayed_po_snapshot(limit=100):
+    """Snapshot key and loader for /purchase-orders/delayed."""
+    key = ("delayed_purchase_orders", limit)
+    return key, across_sites(
+        lambda: get_delayed_purchase_orders_async(limit=limit), merge_delayed_purchase_orders
+    )
+
+
+# Snapshot keys of the datasets static/dashboard.html shows
+DASHBOARD_DATASETS = {
+    overdue_snapshot(limit=DASHBOARD_LIMIT)[0]: "overdue_invoices",
+    low_stock_snapshot(top_n=DASHBOARD_LIMIT)[0]: "low_stock",
+    delayed_po_snapshot(limit=DASHBOARD_LIMIT)[0]: "delayed_purchase_orders"
+}
+
+
+def publish_risk_changes(key, old, new):
+    """Snapshot listener: push row-level changes of dashboard datasets."""
+    dataset = DASHBOARD_DATASETS.get(key)
+    if dataset is None or not events.subscribers:
+        return
+
+    changes = diff_dataset(dataset, old, new)
+    if changes:
+        events.publish("patch", {
+            "dataset": dataset,
+            "changes": changes,
+            "summary": {k: v for k, v in new.items() if k != "data"}
+        })
+
+
+snapshots.add_listener(publish_risk_changes)
+
+
+async def load_snapshot(key, loader):
+    """
+    Return (payload, etag) for the latest snapshot of key.
+
+    The payload carries the snapshot age in seconds and a `stale` flag,
+    set when ERPNext is failing (last refresh failed or the circuit
+    breaker is open) and the last good result is served instead. The
+    ETag hashes the snapshot content and the flag only, so it changes
+    when the data does, not as the snapshot ages.
+
+    Profiled requests (?profile=1) are always loaded live, so their
+    profile covers the ERPNext calls and scoring.
+    """
+    if SNAPSHOT_INTERVAL <= 0 or profiling.get():
+        # Live mode: always call ERPNext, keep the result as a fallback
+        try:
+            value = await loader()
+        except Exception as e:
+            last_good = snapshots.last_good(key)
+            if last_good is None or not is_upstream_failure(e):
+                raise
+            logger.warning("Serving last good %s: %s", key[0], e)
+            value, age = last_good
+            return snapshot_payload(key, value, age, stale=True)
+        snapshots.put(key, value)
+        return snapshot_payload(key, value, 0.0, stale=False)
+
+    value, age = await snapshots.get(key, loader)
+    return snapshot_payload(key, value, age, stale=snapshots.failed(key) or breaker_open())
+
+
+def breaker_open():
+    """
+    True if ERPNext is unreachable: the ERP_URL site's circuit breaker is
+    open or, with ERP_SITES, the breaker of every site. A single tripped
+    site is reported through "partial" and its "sites" entry instead.
+    """
+    if not SITES:
+        return site_breaker(None).is_open
+    return all(site_breaker(site).is_open for site in SITES)
+
+
+def snapshot_payload(key, value, age, stale: bool):
+    """(payload, etag) for a stored snapshot value."""
+    etag = snapshots.etag(key)
+    if stale:
+        etag = content_etag([etag, "stale"])
+    return {**value, "snapshot_age_seconds": round(age, 3), "stale": stale}, etag
+
+
+def set_mirror_freshness(response: Response):
+    """
+    When the local mirror is enabled, X-Mirror-Freshness tells how many
+    seconds ago it was last synced with ERPNext.
+    """
+    if local_mirror is not None:
+        freshness = local_mirror.freshness()
+        if freshness is not None:
+            response.headers["X-Mirror-Freshness"] = str(int(freshness))
+
+
+async def serve_snapshot(response: Response, key, loader):
+    """Return the latest snapshot for key and set its ETag on response."""
+    set_mirror_freshness(response)
+    payload, etag = await load_snapshot(key, loader)
+    response.headers["ETag"] = etag
+    return payload
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    refresher = None
+    mirror_sync = None
+    if local_mirror is not None:
+        mirror_sync = asyncio.create_task(run_mirror_sync(MIRROR_INTERVAL))
+    if SNAPSHOT_INTERVAL > 0:
+        snapshots.register(*overdue_snapshot(limit=DASHBOARD_LIMIT))
+        snapshots.register(*low_stock_snapshot(top_n=DASHBOARD_LIMIT))
+        snapshots.register(*delayed_po_snapshot(limit=DASHBOARD_LIMIT))
+        refresher = asyncio.create_task(snapshots.run(SNAPSHOT_INTERVAL))
+
+    yield
+
+    for task in (refresher, mirror_sync):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    # Release pooled ERPNext connections on shutdown
+    await close_async_client()
+
+
+app = FastAPI(
+    title="ERPNext Risk Radar API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESS_MIN_SIZE)
+# Outermost, so request latency includes compression
+app.add_middleware(MetricsMiddleware)
+if PROFILING_ENABLED:
+    # ?profile=1 / X-Profile: 1 sampling; not installed at all otherwise
+    app.add_middleware(ProfilingMiddleware)
 
 # Mount static files for dashboard
 # Use absolute path relative to this file's location
@@ -16,18 +264,65 @@ if STATIC_DIR.exists():
 
 
 @app.get("/")
-def root():
+async def root():
     """Redirect to dashboard"""
     return RedirectResponse(url="/static/dashboard.html")
 
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Statistics of the ERPNext response cache.
+
+    Fields returned: hits, misses, hit_ratio, entries, bytes, evictions,
+    single_flight (calls, executions, collapsed, in_flight: identical
+    concurrent upstream queries collapsed into one request),
+    circuit_breaker (state, consecutive_failures, trips, rejected),
+    site_circuit_breakers (the same per ERP_SITES site)
+    """
+    return {
+        **response_cache.stats(),
+        "single_flight": upstream_flights.stats(),
+        "circuit_breaker": upstream_breaker.stats(),
+        "site_circuit_breakers": {name: breaker.stats() for name, breaker in site_breakers.items()}
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus metrics.
+
+    Histograms: risk_radar_request_seconds (route, method, status),
+    risk_radar_upstream_seconds (doctype), risk_radar_scoring_seconds
+    (dataset), risk_radar_serialization_seconds (route).
+    Counters: risk_radar_rows_fetched_total (doctype),
+    risk_radar_rows_kept_total (dataset),
+    risk_radar_upstream_errors_total (doctype, status).
+    """
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
+
+
+@app.get("/profiles/{name}", response_class=PlainTextResponse)
+async def request_profile(name: str):
+    """
+    Folded-stack profile of a request made with ?profile=1, by the file
+    name from its X-Profile header (only with RISK_PROFILING=1).
+    """
+    profile = load_profile(name) if PROFILING_ENABLED else None
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+
 @app.get("/invoices")
-def invoices(limit: int = 50):
+async def invoices(request: Request, limit: int = 50):
     """
     Fetch Sales Invoices from ERPNext.
     
@@ -35,25 +330,35 @@ def invoices(limit: int = 50):
     - Use ?limit=N to control number of results
     """
     try:
-        data = get_sales_invoices(limit=limit)
-        return {"count": len(data), "data": data}
+        data = await get_sales_invoices_async(limit=limit)
+        return json_response({"count": len(data), "data": data}, request=request)
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="ERPNext authentication failed")
         raise HTTPException(status_code=502, detail=f"ERPNext API error: {e}")
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="ERPNext is unavailable (circuit breaker open)")
+    except requests.exceptions.Timeout:
+        raise HTTPException(status_code=504, detail="ERPNext did not respond in time")
     except requests.exceptions.ConnectionError:
         raise HTTPException(status_code=502, detail="Cannot connect to ERPNext")
 
 
 @app.get("/invoices/overdue")
-def overdue_invoices(
+async def overdue_invoices(
+    request: Request,
+    response: Response,
     limit: int = Query(50, description="Max number of invoices to return"),
     customer: str = Query(None, description="Filter by customer name"),
     days_medium_min: int = Query(8, description="Min days for Medium risk"),
     days_medium_max: int = Query(14, description="Max days for Medium risk"),
-    days_high_min: int = Query(15, description="Min days for High risk")
+    days_high_min: int = Query(15, description="Min days for High risk"),
+    min_amount: float = Query(None, description="Min outstanding amount"),
+    max_amount: float = Query(None, description="Max outstanding amount"),
+    min_days: int = Query(None, description="Min days overdue"),
+    max_days: int = Query(None, description="Max days overdue")
 ):
     """
     Fetch overdue Sales Invoices with risk scoring.
@@ -63,27 +368,46 @@ def overdue_invoices(
     Risk levels:
     - Medium: 8 to 14 days overdue
     - High: >= 15 days overdue
+
+    Amount and days-overdue bounds are applied by ERPNext, so only
+    matching invoices are fetched.
+
+    Served from the latest snapshot; snapshot_age_seconds tells how old it is.
+    stale is true while ERPNext is failing and the last good result is served.
+    With ERP_SITES set, every site is queried concurrently: rows gain a
+    site column, "sites" holds per-site KPIs or errors and breaker states,
+    and partial is true if a site failed or missed its ERP_SITE_DEADLINE;
+    stale is then set only when every site's breaker is open.
     """
     try:
-        return get_overdue_invoices(
+        return json_response(await serve_snapshot(response, *overdue_snapshot(
             limit=limit,
             customer=customer,
             days_medium_min=days_medium_min,
             days_medium_max=days_medium_max,
-            days_high_min=days_high_min
-        )
+            days_high_min=days_high_min,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            min_days=min_days,
+            max_days=max_days
+        )), response, request)
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="ERPNext authentication failed")
         raise HTTPException(status_code=502, detail=f"ERPNext API error: {e}")
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="ERPNext is unavailable (circuit breaker open)")
+    except requests.exceptions.Timeout:
+        raise HTTPException(status_code=504, detail="ERPNext did not respond in time")
     except requests.exceptions.ConnectionError:
         raise HTTPException(status_code=502, detail="Cannot connect to ERPNext")
 
 
 @app.get("/stock-ledger")
-def stock_ledger(
+async def stock_ledger(
+    request: Request,
     limit: int = Query(100, description="Max number of entries to return"),
     item_code: str = Query(None, description="Filter by item code"),
     warehouse: str = Query(None, description="Filter by warehouse"),
@@ -97,63 +421,90 @@ def stock_ledger(
     - Use ?item_code=ITEM-001 to filter by item
     - Use ?warehouse=Stores to filter by warehouse
     - Use ?aggregate=true to get total qty per item across all warehouses
+      (summed by ERPNext, one row per item)
+    - Use ?item_code=ITEM-001 to load the warehouse breakdown of one item
     
     Fields returned: item_code, warehouse, actual_qty (current quantity)
-    When aggregated: item_code, total_qty, warehouses (list with breakdown)
+    When aggregated: item_code, total_qty, warehouse_count
     """
     try:
-        return get_bin_stock(
+        return json_response(await get_bin_stock_async(
             limit=limit,
             item_code=item_code,
             warehouse=warehouse,
             aggregate=aggregate
-        )
+        ), request=request)
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="ERPNext authentication failed")
         raise HTTPException(status_code=502, detail=f"ERPNext API error: {e}")
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="ERPNext is unavailable (circuit breaker open)")
+    except requests.exceptions.Timeout:
+        raise HTTPException(status_code=504, detail="ERPNext did not respond in time")
     except requests.exceptions.ConnectionError:
         raise HTTPException(status_code=502, detail="Cannot connect to ERPNext")
 
 
 @app.get("/inventory/low-stock")
-def low_stock_items(
-    limit: int = Query(100, description="Max entries to fetch from ERPNext"),
+async def low_stock_items(
+    request: Request,
+    response: Response,
+    limit: int = Query(None, description="Max qualifying bins to scan (default: all)"),
     warehouse: str = Query(None, description="Filter by warehouse"),
-    item_code: str = Query(None, description="Filter by item code")
+    item_code: str = Query(None, description="Filter by item code"),
+    high_below: float = Query(LOW_STOCK_HIGH_BELOW, description="High risk if actual_qty is below this"),
+    medium_max: float = Query(LOW_STOCK_MEDIUM_MAX, description="Medium risk up to and including this qty"),
+    top_n: int = Query(LOW_STOCK_TOP_N, description="Number of lowest-stock rows to return")
 ):
     """
     Fetch inventory items with low stock risk scoring using Bin DocType.
     
-    Risk levels based on actual_qty:
-    - High: actual_qty < 30 (critical stock level)
-    - Medium: 30 <= actual_qty < 60 (low stock warning)
-    - Ignored: actual_qty >= 60 (sufficient stock)
+    Risk levels based on actual_qty (thresholds configurable):
+    - High: actual_qty < high_below (critical stock level)
+    - Medium: high_below <= actual_qty <= medium_max (low stock warning)
+    - Ignored: actual_qty > medium_max (filtered out by ERPNext)
     
-    Returns items sorted by lowest quantity first.
+    Returns the top_n items with the lowest quantity first; high_count,
+    medium_count and total_count cover every qualifying bin.
     
     Fields returned: item_code, warehouse, actual_qty, risk_level
+    Served from the latest snapshot; snapshot_age_seconds tells how old it is.
+    stale is true while ERPNext is failing and the last good result is served.
+    With ERP_SITES set, every site is queried concurrently: rows gain a
+    site column, "sites" holds per-site KPIs or errors and breaker states,
+    and partial is true if a site failed or missed its ERP_SITE_DEADLINE;
+    stale is then set only when every site's breaker is open.
     """
     try:
-        return get_low_stock_items(
+        return json_response(await serve_snapshot(response, *low_stock_snapshot(
             limit=limit,
             warehouse=warehouse,
-            item_code=item_code
-        )
+            item_code=item_code,
+            high_below=high_below,
+            medium_max=medium_max,
+            top_n=top_n
+        )), response, request)
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="ERPNext authentication failed")
         raise HTTPException(status_code=502, detail=f"ERPNext API error: {e}")
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="ERPNext is unavailable (circuit breaker open)")
+    except requests.exceptions.Timeout:
+        raise HTTPException(status_code=504, detail="ERPNext did not respond in time")
     except requests.exceptions.ConnectionError:
         raise HTTPException(status_code=502, detail="Cannot connect to ERPNext")
 
 
 @app.get("/purchase-orders/delayed")
-def delayed_purchase_orders(
+async def delayed_purchase_orders(
+    request: Request,
+    response: Response,
     limit: int = Query(100, description="Max POs to fetch from ERPNext")
 ):
     """
@@ -166,24 +517,110 @@ def delayed_purchase_orders(
     Risk levels:
     - Medium: 7-14 days stuck
     - High: > 14 days stuck
+
+    Served from the latest snapshot; snapshot_age_seconds tells how old it is.
+    stale is true while ERPNext is failing and the last good result is served.
+    With ERP_SITES set, every site is queried concurrently: rows gain a
+    site column, "sites" holds per-site KPIs or errors and breaker states,
+    and partial is true if a site failed or missed its ERP_SITE_DEADLINE;
+    stale is then set only when every site's breaker is open.
+    """
+    try:
+        return json_response(
+            await serve_snapshot(response, *delayed_po_snapshot(limit=limit)), response, request
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code == 401:
+            raise HTTPException(status_code=401, detail="ERPNext authentication failed")
+        raise HTTPException(status_code=502, detail=f"ERPNext API error: {e}")
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="ERPNext is unavailable (circuit breaker open)")
+    except requests.exceptions.Timeout:
+        raise HTTPException(status_code=504, detail="ERPNext did not respond in time")
+    except requests.exceptions.ConnectionError:
+        raise HTTPException(status_code=502, detail="Cannot connect to ERPNext")
+
+
+@app.get("/risk/summary")
+async def risk_summary(
+    request: Request,
+    response: Response,
+    limit: int = Query(100, description="Max rows per risk domain")
+):
+    """
+    Fetch all three risk domains in one call.
+
+    Overdue invoices, low stock bins and delayed POs are fetched
+    concurrently, so latency is the slowest domain rather than the sum.
+    Each domain uses the same snapshot as its own endpoint; `stale` is
+    true if any of them is served from a last good result, `partial` if
+    any of them is missing a site (with ERP_SITES set).
+
+    Returns combined KPIs plus the full payload of each domain.
+    The ETag combines the three domain ETags.
     """
     try:
-        return get_delayed_purchase_orders(limit=limit)
+        (invoices, invoices_etag), (low_stock, low_stock_etag), (delayed_pos, delayed_pos_etag) = \
+            await asyncio.gather(
+                load_snapshot(*overdue_snapshot(limit=limit)),
+                load_snapshot(*low_stock_snapshot(top_n=limit)),
+                load_snapshot(*delayed_po_snapshot(limit=limit))
+            )
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="ERPNext authentication failed")
         raise HTTPException(status_code=502, detail=f"ERPNext API error: {e}")
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="ERPNext is unavailable (circuit breaker open)")
+    except requests.exceptions.Timeout:
+        raise HTTPException(status_code=504, detail="ERPNext did not respond in time")
     except requests.exceptions.ConnectionError:
         raise HTTPException(status_code=502, detail="Cannot connect to ERPNext")
 
+    set_mirror_freshness(response)
+    response.headers["ETag"] = content_etag([invoices_etag, low_stock_etag, delayed_pos_etag])
+    invoice_kpis = invoices.get("kpis", {})
 
+    return json_response({
+        "kpis": {
+            "overdue_invoices_count": invoice_kpis.get("overdue_invoices_count", invoices.get("count", 0)),
+            "total_outstanding_overdue_amount": invoice_kpis.get("total_outstanding_overdue_amount", 0),
+            "most_overdue_days": invoice_kpis.get("most_overdue_days", 0),
+            "low_stock_count": low_stock.get("total_count", low_stock.get("count", 0)),
+            "low_stock_high_count": low_stock.get("high_count", 0),
+            "delayed_po_count": delayed_pos.get("count", 0),
+            "delayed_po_high_count": delayed_pos.get("high_count", 0)
+        },
+        "stale": invoices["stale"] or low_stock["stale"] or delayed_pos["stale"],
+        "partial": any(domain.get("partial", False) for domain in (invoices, low_stock, delayed_pos)),
+        "overdue_invoices": invoices,
+        "low_stock": low_stock,
+        "delayed_purchase_orders": delayed_pos
+    }, response, request)
 
-if __name__ == "__main__":  # pragma: no cover
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8082)
 
+@app.get("/events")
+async def risk_events(request: Request):
+    """
+    Server-Sent Events stream of live risk changes.
+
+    Whenever a dashboard dataset snapshot is refreshed (every
+    RISK_SNAPSHOT_INTERVAL seconds), a `patch` event lists its changed rows:
+    invoice_overdue / invoice_cleared, stock_low / bin_replenished,
+    po_delayed / po_received, risk_escalated and updated. A `resync` event
+    asks the client to reload everything.
+    """
+    return StreamingResponse(
+        event_stream(request, events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
-    
\ No newline at end of file
+if __name__ == "__main__":  # pragma: no cover
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8082)
@@ -1,16 +1,27 @@
 # backend/test/test_api.py
+import asyncio
 import unittest
 from fastapi.testclient import TestClient
-from unittest.mock import patch, Mock
+from unittest.mock import patch, AsyncMock, Mock
 import requests
 
-from app import app
+from app import app, snapshots, events, delayed_po_snapshot, DASHBOARD_LIMIT
+from services import erpnext
+from services.breaker import CircuitBreaker, CircuitOpenError
+from services.records import DelayedPurchaseOrder
+from services.sites import Site
 
 client = TestClient(app)
 
+EMPTY_RESULT = {"count": 0, "high_count": 0, "medium_count": 0, "data": []}
+
 
 class TestAPI(unittest.TestCase):
 
+    def setUp(self):
+        # Each test mocks its own ERPNext data; never serve a previous test's snapshot
+        snapshots.clear()
+
     def test_health(self):
         response = client.get("/health")
         self.assertEqual(response.status_code, 200)
@@ -22,7 +33,372 @@ class TestAPI(unittest.TestCase):
         self.assertIn("location", response.headers)
         self.assertTrue(response.headers["location"].endswith("/static/dashboard.html"))
 
-    @patch('app.get_sales_invoices')
+    def test_cache_stats(self):
+        response = client.get("/cache/stats")
+        self.assertEqual(response.status_code, 200)
+        json_data = response.json()
+        for key in ["hits", "misses", "hit_ratio", "entries", "bytes"]:
+            self.assertIn(key, json_data)
+        self.assertIn("collapsed", json_data["single_flight"])
+        self.assertIn("state", json_data["circuit_breaker"])
+        self.assertIn("site_circuit_breakers", json_data)
+
+    @patch('app.get_delayed_purchase_orders_async')
+    def test_metrics_expose_route_and_serialization_histograms(self, mock_get_delayed_purchase_orders):
+        mock_get_delayed_purchase_orders.return_value = EMPTY_RESULT
+        client.get("/purchase-orders/delayed?limit=7")
+
+        response = client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertIn(
+            'risk_radar_request_seconds_count{method="GET",route="/purchase-orders/delayed",status="200"}',
+            response.text
+        )
+        self.assertIn('risk_radar_serialization_seconds_count{route="/purchase-orders/delayed"}', response.text)
+        self.assertIn("risk_radar_upstream_errors_total", response.text)
+
+    def test_profiling_is_off_by_default(self):
+        response = client.get("/health?profile=1", headers={"X-Profile": "1"})
+
+        self.assertNotIn("x-profile", response.headers)
+        self.assertEqual(client.get("/profiles/anything.folded").status_code, 404)
+
+    @patch('app.get_overdue_invoices_async')
+    def test_overdue_invoices_passes_range_filters(self, mock_get_overdue_invoices):
+        mock_get_overdue_invoices.return_value = EMPTY_RESULT
+
+        response = client.get("/invoices/overdue?min_amount=100&max_amount=900&min_days=10&max_days=60")
+
+        self.assertEqual(response.status_code, 200)
+        kwargs = mock_get_overdue_invoices.call_args.kwargs
+        self.assertEqual(kwargs["min_amount"], 100)
+        self.assertEqual(kwargs["max_amount"], 900)
+        self.assertEqual(kwargs["min_days"], 10)
+        self.assertEqual(kwargs["max_days"], 60)
+
+    @patch('app.get_delayed_purchase_orders_async')
+    def test_risk_endpoint_serves_snapshot(self, mock_get_delayed_purchase_orders):
+        mock_get_delayed_purchase_orders.return_value = {
+            "count": 0, "high_count": 0, "medium_count": 0, "data": []
+        }
+
+        first = client.get("/purchase-orders/delayed?limit=7")
+        second = client.get("/purchase-orders/delayed?limit=7")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertIn("snapshot_age_seconds", second.json())
+        # Second request is answered from the snapshot, not from ERPNext
+        mock_get_delayed_purchase_orders.assert_called_once_with(limit=7)
+
+    @patch('app.get_overdue_invoices_async')
+    def test_filtered_requests_are_not_refreshed_in_background(self, mock_get_overdue_invoices):
+        mock_get_overdue_invoices.return_value = EMPTY_RESULT
+        registered = snapshots.registered()
+
+        for customer in ["A", "B", "C"]:
+            self.assertEqual(client.get(f"/invoices/overdue?customer={customer}").status_code, 200)
+
+        self.assertEqual(snapshots.registered(), registered)
+
+    @patch('app.get_delayed_purchase_orders_async')
+    def test_risk_endpoint_answers_matching_etag_with_304(self, mock_get_delayed_purchase_orders):
+        mock_get_delayed_purchase_orders.return_value = EMPTY_RESULT
+
+        first = client.get("/purchase-orders/delayed?limit=7")
+        etag = first.headers["etag"]
+        second = client.get("/purchase-orders/delayed?limit=7", headers={"If-None-Match": etag})
+        stale = client.get("/purchase-orders/delayed?limit=7", headers={"If-None-Match": 'W/"other"'})
+
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b"")
+        self.assertEqual(second.headers["etag"], etag)
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale.headers["etag"], etag)
+
+    @patch('app.get_delayed_purchase_orders_async')
+    def test_profiled_request_bypasses_snapshot(self, mock_get_delayed_purchase_orders):
+        mock_get_delayed_purchase_orders.return_value = EMPTY_RESULT
+        client.get("/purchase-orders/delayed?limit=7")
+
+        with patch('app.profiling') as profiling:
+            profiling.get.return_value = True
+            client.get("/purchase-orders/delayed?limit=7")
+
+        self.assertEqual(mock_get_delayed_purchase_orders.await_count, 2)
+
+    @patch('app.get_bin_stock_async')
+    @patch('app.get_sales_invoices_async')
+    def test_live_endpoints_get_etag_and_serialization_metrics(self, mock_get_sales_invoices, mock_get_bin_stock):
+        mock_get_sales_invoices.return_value = [{"name": "SINV-001"}]
+        mock_get_bin_stock.return_value = {"count": 0, "data": []}
+
+        for url in ["/invoices", "/stock-ledger"]:
+            first = client.get(url)
+            second = client.get(url, headers={"If-None-Match": first.headers["etag"]})
+
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(second.status_code, 304)
+
+        metrics = client.get("/metrics").text
+        self.assertIn('risk_radar_serialization_seconds_count{route="/invoices"}', metrics)
+        self.assertIn('risk_radar_serialization_seconds_count{route="/stock-ledger"}', metrics)
+
+    @patch('app.get_delayed_purchase_orders_async')
+    @patch('app.get_low_stock_items_async')
+    @patch('app.get_overdue_invoices_async')
+    def test_risk_summary_etag_follows_domain_snapshots(self, mock_overdue, mock_low_stock, mock_delayed):
+        mock_overdue.return_value = EMPTY_RESULT
+        mock_low_stock.return_value = EMPTY_RESULT
+        mock_delayed.return_value = EMPTY_RESULT
+
+        etag = client.get("/risk/summary").headers["etag"]
+        self.assertEqual(client.get("/risk/summary", headers={"If-None-Match": etag}).status_code, 304)
+
+        snapshots.clear()
+        mock_delayed.return_value = {**EMPTY_RESULT, "count": 1}
+        changed = client.get("/risk/summary", headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["etag"], etag)
+
+    def test_dashboard_snapshot_refresh_publishes_patch(self):
+        key, _ = delayed_po_snapshot(limit=DASHBOARD_LIMIT)
+        before = {**EMPTY_RESULT, "data": [{"po": "PO-1", "stuck_days": 20, "risk_level": "High"}]}
+        after = {**EMPTY_RESULT, "data": []}
+        loaders = [AsyncMock(return_value=before), AsyncMock(return_value=after)]
+
+        async def scenario():
+            queue = events.subscribe()
+            try:
+                await snapshots.get(key, loaders[0])
+                snapshots.register(key, loaders[1])
+                await snapshots.refresh(key)
+                return queue.get_nowait()
+            finally:
+                events.unsubscribe(queue)
+
+        message = asyncio.run(scenario())
+        self.assertIn(b"event: patch", message)
+        self.assertIn(b'"change":"po_received"', message)
+        self.assertIn(b'"dataset":"delayed_purchase_orders"', message)
+
+    @patch('app.get_delayed_purchase_orders_async')
+    def test_large_risk_response_is_compressed(self, mock_get_delayed_purchase_orders):
+        rows = [DelayedPurchaseOrder(f"PO-{n}", "Supplier A", "2026-01-01", 30, "To Receive", 100.0, "SAR", "High")
+                for n in range(200)]
+        mock_get_delayed_purchase_orders.return_value = {
+            "count": len(rows), "high_count": len(rows), "medium_count": 0, "data": rows
+        }
+
+        response = client.get("/purchase-orders/delayed?limit=200", headers={"Accept-Encoding": "gzip"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["vary"])
+        self.assertEqual(response.json()["data"][199]["po"], "PO-199")
+
+    def test_small_response_is_not_compressed(self):
+        response = client.get("/health", headers={"Accept-Encoding": "gzip, br"})
+        self.assertNotIn("content-encoding", response.headers)
+
+    @patch('app.get_delayed_purchase_orders_async')
+    @patch('app.get_low_stock_items_async')
+    @patch('app.get_overdue_invoices_async')
+    def test_risk_summary(self, mock_overdue, mock_low_stock, mock_delayed):
+        mock_overdue.return_value = {
+            "kpis": {"overdue_invoices_count": 3, "total_outstanding_overdue_amount": 900, "most_overdue_days": 40},
+            "count": 3, "medium_count": 1, "high_count": 2, "data": []
+        }
+        mock_low_stock.return_value = {"count": 2, "high_count": 1, "medium_count": 1, "data": []}
+        mock_delayed.return_value = {"count": 1, "high_count": 1, "medium_count": 0, "data": []}
+
+        response = client.get("/risk/summary?limit=100")
+
+        self.assertEqual(response.status_code, 200)
+        json_data = response.json()
+        self.assertEqual(json_data["kpis"]["overdue_invoices_count"], 3)
+        self.assertEqual(json_data["kpis"]["low_stock_high_count"], 1)
+        self.assertEqual(json_data["kpis"]["delayed_po_count"], 1)
+        for key in ["overdue_invoices", "low_stock", "delayed_purchase_orders"]:
+            self.assertIn("data", json_data[key])
+        mock_overdue.assert_called_once()
+        mock_low_stock.assert_called_once_with(
+            limit=None, warehouse=None, item_code=None, high_below=30, medium_max=60, top_n=100
+        )
+        mock_delayed.assert_called_once_with(limit=100)
+
+    @patch('app.get_delayed_purchase_orders_async')
+    @patch('app.get_low_stock_items_async')
+    @patch('app.get_overdue_invoices_async')
+    def test_risk_summary_limit_applies_to_low_stock(self, mock_overdue, mock_low_stock, mock_delayed):
+        mock_overdue.return_value = EMPTY_RESULT
+        mock_low_stock.return_value = EMPTY_RESULT
+        mock_delayed.return_value = EMPTY_RESULT
+
+        client.get("/risk/summary?limit=7")
+
+        self.assertEqual(mock_low_stock.call_args.kwargs["top_n"], 7)
+
+    @patch('app.get_delayed_purchase_orders_async')
+    def test_failed_refresh_serves_last_good_snapshot_as_stale(self, mock_get_delayed_purchase_orders):
+        mock_get_delayed_purchase_orders.return_value = EMPTY_RESULT
+        fresh = client.get("/purchase-orders/delayed?limit=7")
+        self.assertFalse(fresh.json()["stale"])
+
+        mock_get_delayed_purchase_orders.side_effect = requests.exceptions.ReadTimeout()
+        asyncio.run(snapshots.refresh(delayed_po_snapshot(limit=7)[0]))
+        stale = client.get("/purchase-orders/delayed?limit=7", headers={"If-None-Match": fresh.headers["etag"]})
+
+        self.assertEqual(stale.status_code, 200)
+        self.assertTrue(stale.json()["stale"])
+        self.assertEqual(stale.json()["count"], 0)
+        self.assertNotEqual(stale.headers["etag"], fresh.headers["etag"])
+
+    @patch('app.get_delayed_purchase_orders_async')
+    @patch('app.get_low_stock_items_async')
+    @patch('app.get_overdue_invoices_async')
+    def test_open_breaker_marks_snapshot_stale(self, mock_overdue, mock_low_stock, mock_delayed):
+        mock_overdue.return_value = EMPTY_RESULT
+        mock_low_stock.return_value = EMPTY_RESULT
+        mock_delayed.return_value = EMPTY_RESULT
+        breaker = CircuitBreaker(failure_threshold=1)
+        breaker.record(0.1, requests.exceptions.ConnectionError())
+
+        with patch.object(erpnext, 'upstream_breaker', breaker):
+            response = client.get("/risk/summary?limit=7")
+
+        self.assertTrue(response.json()["stale"])
+        self.assertTrue(response.json()["delayed_purchase_orders"]["stale"])
+
+    @patch('app.get_delayed_purchase_orders_async')
+    def test_live_mode_falls_back_to_last_good_result(self, mock_get_delayed_purchase_orders):
+        mock_get_delayed_purchase_orders.return_value = {**EMPTY_RESULT, "count": 3}
+
+        with patch('app.SNAPSHOT_INTERVAL', 0):
+            fresh = client.get("/purchase-orders/delayed?limit=7")
+            mock_get_delayed_purchase_orders.side_effect = CircuitOpenError()
+            stale = client.get("/purchase-orders/delayed?limit=7")
+            mock_get_delayed_purchase_orders.side_effect = requests.exceptions.HTTPError(
+                response=Mock(status_code=401)
+            )
+            unauthorized = client.get("/purchase-orders/delayed?limit=7")
+
+        self.assertFalse(fresh.json()["stale"])
+        self.assertTrue(stale.json()["stale"])
+        self.assertEqual(stale.json()["count"], 3)
+        self.assertEqual(unauthorized.status_code, 401)
+
+    @patch('app.get_delayed_purchase_orders_async')
+    def test_upstream_timeout_returns_504(self, mock_get_delayed_purchase_orders):
+        mock_get_delayed_purchase_orders.side_effect = requests.exceptions.ReadTimeout()
+
+        response = client.get("/purchase-orders/delayed?limit=7")
+
+        self.assertEqual(response.status_code, 504)
+
+    @patch('app.get_sales_invoices_async')
+    def test_open_breaker_without_fallback_returns_503(self, mock_get_sales_invoices):
+        mock_get_sales_invoices.side_effect = CircuitOpenError()
+
+        response = client.get("/invoices")
+
+        self.assertEqual(response.status_code, 503)
+
+    @patch('app.get_overdue_invoices_async')
+    def test_risk_summary_connection_error_returns_502(self, mock_overdue):
+        mock_overdue.side_effect = requests.exceptions.ConnectionError()
+
+        with patch('app.get_low_stock_items_async', return_value=EMPTY_RESULT), \
+                patch('app.get_delayed_purchase_orders_async', return_value=EMPTY_RESULT):
+            response = client.get("/risk/summary")
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(response.json()["detail"], "Cannot connect to ERPNext")
+
+    @patch('app.get_delayed_purchase_orders_async')
+    def test_multi_site_endpoint_merges_sites(self, mock_get_delayed_purchase_orders):
+        async def per_site(limit):
+            site = erpnext.current_site.get().name
+            if site == "down":
+                raise requests.exceptions.ConnectionError()
+            stuck = {"acme": [9, 30], "globex": [20]}[site]
+            return {
+                "count": len(stuck),
+                "high_count": sum(days > 14 for days in stuck),
+                "medium_count": sum(days <= 14 for days in stuck),
+                "data": [{"po": f"PO-{days}", "stuck_days": days} for days in stuck]
+            }
+
+        mock_get_delayed_purchase_orders.side_effect = per_site
+        registry = [Site("acme", "http://acme.test"), Site("globex", "http://globex.test")]
+
+        with patch('app.SITES', registry):
+            response = client.get("/purchase-orders/delayed?limit=7")
+        with patch('app.SITES', registry + [Site("down", "http://down.test")]):
+            partial = client.get("/purchase-orders/delayed?limit=8")
+        with patch('app.SITES', [Site("down", "http://down.test")]):
+            failed = client.get("/purchase-orders/delayed?limit=9")
+
+        json_data = response.json()
+        self.assertEqual(
+            [(row["site"], row["stuck_days"]) for row in json_data["data"]],
+            [("acme", 30), ("globex", 20), ("acme", 9)]
+        )
+        self.assertEqual((json_data["count"], json_data["high_count"]), (3, 2))
+        self.assertEqual(json_data["sites"]["globex"]["count"], 1)
+        self.assertFalse(json_data["partial"])
+        self.assertTrue(partial.json()["partial"])
+        self.assertEqual(partial.json()["sites"]["down"]["status"], "error")
+        self.assertEqual(failed.status_code, 502)
+
+    @patch('app.get_delayed_purchase_orders_async')
+    def test_identical_multi_site_refreshes_keep_etag(self, mock_get_delayed_purchase_orders):
+        delays = iter([0, 0.02, 0, 0.01])
+
+        async def per_site(limit):
+            await asyncio.sleep(next(delays))
+            return EMPTY_RESULT
+
+        mock_get_delayed_purchase_orders.side_effect = per_site
+        registry = [Site("acme", "http://acme.test"), Site("globex", "http://globex.test")]
+
+        with patch('app.SITES', registry):
+            first = client.get("/purchase-orders/delayed?limit=7")
+            asyncio.run(snapshots.refresh(delayed_po_snapshot(limit=7)[0]))
+            second = client.get("/purchase-orders/delayed?limit=7", headers={"If-None-Match": first.headers["etag"]})
+
+        self.assertEqual(mock_get_delayed_purchase_orders.await_count, 4)
+        self.assertEqual(second.status_code, 304)
+
+    @patch('app.get_delayed_purchase_orders_async')
+    def test_open_breaker_of_one_site_keeps_merged_snapshot_fresh(self, mock_get_delayed_purchase_orders):
+        async def per_site(limit):
+            if erpnext.current_site.get().name == "globex":
+                raise CircuitOpenError()
+            return EMPTY_RESULT
+
+        mock_get_delayed_purchase_orders.side_effect = per_site
+        registry = [Site("acme", "http://acme.test"), Site("globex", "http://globex.test")]
+        breakers = {"acme": CircuitBreaker(failure_threshold=1), "globex": CircuitBreaker(failure_threshold=1)}
+        breakers["globex"].record(0.1, requests.exceptions.ConnectionError())
+
+        with patch('app.SITES', registry), patch.object(erpnext, 'site_breakers', breakers):
+            one_open = client.get("/purchase-orders/delayed?limit=7")
+            breakers["acme"].record(0.1, requests.exceptions.ConnectionError())
+            all_open = client.get("/purchase-orders/delayed?limit=7")
+
+        json_data = one_open.json()
+        self.assertFalse(json_data["stale"])
+        self.assertTrue(json_data["partial"])
+        self.assertEqual(json_data["sites"]["acme"]["breaker"], "closed")
+        self.assertEqual(json_data["sites"]["globex"]["breaker"], "open")
+        self.assertTrue(all_open.json()["stale"])
+        self.assertFalse(erpnext.upstream_breaker.is_open)
+
+    @patch('app.get_sales_invoices_async')
     def test_get_sales_invoices(self, mock_get_sales_invoices):
         # Mock return value with 2 fake invoices
         mock_get_sales_invoices.return_value = [
@@ -49,7 +425,7 @@ class TestAPI(unittest.TestCase):
         # Verify limit parameter was passed correctly
         mock_get_sales_invoices.assert_called_once_with(limit=2)
 
-    @patch('app.get_sales_invoices')
+    @patch('app.get_sales_invoices_async')
     def test_get_sales_invoices_default_limit(self, mock_get_sales_invoices):
         # Mock return value with empty list
         mock_get_sales_invoices.return_value = []
@@ -65,7 +441,7 @@ class TestAPI(unittest.TestCase):
         # Verify default limit parameter (50) was passed
         mock_get_sales_invoices.assert_called_once_with(limit=50)
 
-    @patch('app.get_sales_invoices')
+    @patch('app.get_sales_invoices_async')
     def test_invoices_value_error_returns_500(self, mock_get_sales_invoices):
         # Mock to raise ValueError
         mock_get_sales_invoices.side_effect = ValueError("Invalid data")
@@ -82,7 +458,7 @@ class TestAPI(unittest.TestCase):
         # Verify the service function was invoked
         mock_get_sales_invoices.assert_called_once_with(limit=10)
 
-    @patch('app.get_sales_invoices')
+    @patch('app.get_sales_invoices_async')
     def test_invoices_error_401(self, mock_get_sales_invoices):
         # Create a mock response with status_code 401
         mock_response = Mock()
@@ -105,7 +481,7 @@ class TestAPI(unittest.TestCase):
         # Verify the service function was invoked
         mock_get_sales_invoices.assert_called_once_with(limit=15)
 
-    @patch('app.get_sales_invoices')
+    @patch('app.get_sales_invoices_async')
     def test_invoices_erp_error_returns_502(self, mock_get_sales_invoices):
         # Create a mock response with status_code 500
         mock_response = Mock()
@@ -128,7 +504,7 @@ class TestAPI(unittest.TestCase):
         # Verify the service function was invoked
         mock_get_sales_invoices.assert_called_once_with(limit=25)
 
-    @patch('app.get_sales_invoices')
+    @patch('app.get_sales_invoices_async')
     def test_invoices_connection_error_returns_502(self, mock_get_sales_invoices):
         # Mock to raise ConnectionError
         mock_get_sales_invoices.side_effect = requests.exceptions.ConnectionError()
@@ -152,7 +528,7 @@ class TestAPI(unittest.TestCase):
 
 
 
-    @patch('app.get_overdue_invoices')
+    @patch('app.get_overdue_invoices_async')
     def test_overdue_invoices(self, mock_get_overdue_invoices):
         # Mock return value with count, medium_count, high_count, and data
         mock_get_overdue_invoices.return_value = {
@@ -186,7 +562,7 @@ class TestAPI(unittest.TestCase):
         # Verify service function was called (days_medium_min has default, not passed by API)
         mock_get_overdue_invoices.assert_called_once()
 
-    @patch('app.get_overdue_invoices')
+    @patch('app.get_overdue_invoices_async')
     def test_overdue_invoices_value_error_returns_500(self, mock_get_overdue_invoices):
         # Mock to raise ValueError
         mock_get_overdue_invoices.side_effect = ValueError("Invalid data")
@@ -203,7 +579,7 @@ class TestAPI(unittest.TestCase):
         # Verify the service function was invoked
         mock_get_overdue_invoices.assert_called_once()
 
-    @patch('app.get_overdue_invoices')
+    @patch('app.get_overdue_invoices_async')
     def test_overdue_invoices_http_error_401_returns_401(self, mock_get_overdue_invoices):
         # Create a mock response with status_code 401
         mock_response = Mock()
@@ -226,7 +602,7 @@ class TestAPI(unittest.TestCase):
         # Verify the service function was invoked
         mock_get_overdue_invoices.assert_called_once()
 
-    @patch('app.get_overdue_invoices')
+    @patch('app.get_overdue_invoices_async')
     def test_overdue_invoices_http_error_non_401_returns_502(self, mock_get_overdue_invoices):
         # Create a mock response with status_code 500
         mock_response = Mock()
@@ -249,7 +625,7 @@ class TestAPI(unittest.TestCase):
         # Verify the service function was invoked
         mock_get_overdue_invoices.assert_called_once()
 
-    @patch('app.get_overdue_invoices')
+    @patch('app.get_overdue_invoices_async')
     def test_overdue_invoices_connection_error_returns_502(self, mock_get_overdue_invoices):
         # Mock to raise ConnectionError
         mock_get_overdue_invoices.side_effect = requests.exceptions.ConnectionError()
@@ -266,27 +642,14 @@ class TestAPI(unittest.TestCase):
         # Verify the service function was invoked
         mock_get_overdue_invoices.assert_called_once()
 
-    @patch('app.get_bin_stock')
+    @patch('app.get_bin_stock_async')
     def test_stock_ledger(self, mock_get_bin_stock):
         # Mock return value
         mock_get_bin_stock.return_value = {
             "count": 2,
             "data": [
-                {
-                    "item_code": "ITEM-001",
-                    "total_qty": 120,
-                    "warehouses": [
-                        {"warehouse": "Stores", "actual_qty": 70},
-                        {"warehouse": "Finished Goods", "actual_qty": 50}
-                    ]
-                },
-                {
-                    "item_code": "ITEM-002",
-                    "total_qty": 20,
-                    "warehouses": [
-                        {"warehouse": "Stores", "actual_qty": 20}
-                    ]
-                }
+                {"item_code": "ITEM-001", "total_qty": 120, "warehouse_count": 2},
+                {"item_code": "ITEM-002", "total_qty": 20, "warehouse_count": 1}
             ]
         }
         
@@ -309,7 +672,7 @@ class TestAPI(unittest.TestCase):
             aggregate=True
         )
 
-    @patch('app.get_bin_stock')
+    @patch('app.get_bin_stock_async')
     def test_stock_ledger_value_error_returns_500(self, mock_get_bin_stock):
         # Mock to raise ValueError
         mock_get_bin_stock.side_effect = ValueError("Invalid data")
@@ -331,7 +694,7 @@ class TestAPI(unittest.TestCase):
             aggregate=True
         )
 
-    @patch('app.get_bin_stock')
+    @patch('app.get_bin_stock_async')
     def test_stock_ledger_http_error_401_returns_401(self, mock_get_bin_stock):
         # Create a mock response with status_code 401
         mock_response = Mock()
@@ -359,7 +722,7 @@ class TestAPI(unittest.TestCase):
             aggregate=True
         )
 
-    @patch('app.get_bin_stock')
+    @patch('app.get_bin_stock_async')
     def test_stock_ledger_http_error_non_401_returns_502(self, mock_get_bin_stock):
         # Create a mock response with status_code 500
         mock_response = Mock()
@@ -387,7 +750,7 @@ class TestAPI(unittest.TestCase):
             aggregate=True
         )
 
-    @patch('app.get_bin_stock')
+    @patch('app.get_bin_stock_async')
     def test_stock_ledger_connection_error_returns_502(self, mock_get_bin_stock):
         # Mock to raise ConnectionError
         mock_get_bin_stock.side_effect = requests.exceptions.ConnectionError()
@@ -409,7 +772,7 @@ class TestAPI(unittest.TestCase):
             aggregate=True
         )
 
-    @patch('app.get_low_stock_items')
+    @patch('app.get_low_stock_items_async')
     def test_inventory_low_stock(self, mock_get_low_stock_items):
         # Mock return value with 2 low stock items
         mock_get_low_stock_items.return_value = {
@@ -442,9 +805,11 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(len(json_data["data"]), 2)
         
         # Assert the mock was called with correct parameters
-        mock_get_low_stock_items.assert_called_once_with(limit=2, warehouse=None, item_code=None)
+        mock_get_low_stock_items.assert_called_once_with(
+            limit=2, warehouse=None, item_code=None, high_below=30, medium_max=60, top_n=50
+        )
 
-    @patch('app.get_low_stock_items')
+    @patch('app.get_low_stock_items_async')
     def test_inventory_low_stock_with_warehouse_filter(self, mock_get_low_stock_items):
         # Mock return value for warehouse-specific query
         mock_get_low_stock_items.return_value = {
@@ -468,9 +833,11 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(json_data["count"], 1)
         
         # Assert the mock was called with warehouse parameter
-        mock_get_low_stock_items.assert_called_once_with(limit=10, warehouse="Stores", item_code=None)
+        mock_get_low_stock_items.assert_called_once_with(
+            limit=10, warehouse="Stores", item_code=None, high_below=30, medium_max=60, top_n=50
+        )
 
-    @patch('app.get_low_stock_items')
+    @patch('app.get_low_stock_items_async')
     def test_inventory_low_stock_with_item_code_filter(self, mock_get_low_stock_items):
         # Mock return value for item_code-specific query
         mock_get_low_stock_items.return_value = {
@@ -494,9 +861,11 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(json_data["count"], 1)
         
         # Assert the mock was called with item_code parameter
-        mock_get_low_stock_items.assert_called_once_with(limit=15, warehouse=None, item_code="ITEM-123")
+        mock_get_low_stock_items.assert_called_once_with(
+            limit=15, warehouse=None, item_code="ITEM-123", high_below=30, medium_max=60, top_n=50
+        )
 
-    @patch('app.get_low_stock_items')
+    @patch('app.get_low_stock_items_async')
     def test_inventory_low_stock_value_error_returns_500(self, mock_get_low_stock_items):
         # Mock to raise ValueError
         mock_get_low_stock_items.side_effect = ValueError("Invalid data")
@@ -511,9 +880,11 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(json_data["detail"], "Invalid data")
         
         # Verify the service function was invoked
-        mock_get_low_stock_items.assert_called_once_with(limit=10, warehouse=None, item_code=None)
+        mock_get_low_stock_items.assert_called_once_with(
+            limit=10, warehouse=None, item_code=None, high_below=30, medium_max=60, top_n=50
+        )
 
-    @patch('app.get_low_stock_items')
+    @patch('app.get_low_stock_items_async')
     def test_inventory_low_stock_http_error_401_returns_401(self, mock_get_low_stock_items):
         # Create a mock response with status_code 401
         mock_response = Mock()
@@ -534,9 +905,11 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(json_data["detail"], "ERPNext authentication failed")
         
         # Verify the service function was invoked
-        mock_get_low_stock_items.assert_called_once_with(limit=15, warehouse=None, item_code=None)
+        mock_get_low_stock_items.assert_called_once_with(
+            limit=15, warehouse=None, item_code=None, high_below=30, medium_max=60, top_n=50
+        )
 
-    @patch('app.get_low_stock_items')
+    @patch('app.get_low_stock_items_async')
     def test_inventory_low_stock_http_error_non_401_returns_502(self, mock_get_low_stock_items):
         # Create a mock response with status_code 500
         mock_response = Mock()
@@ -557,9 +930,11 @@ class TestAPI(unittest.TestCase):
         self.assertIn("ERPNext API error", json_data["detail"])
         
         # Verify the service function was invoked
-        mock_get_low_stock_items.assert_called_once_with(limit=20, warehouse=None, item_code=None)
+        mock_get_low_stock_items.assert_called_once_with(
+            limit=20, warehouse=None, item_code=None, high_below=30, medium_max=60, top_n=50
+        )
 
-    @patch('app.get_low_stock_items')
+    @patch('app.get_low_stock_items_async')
     def test_inventory_low_stock_connection_error_returns_502(self, mock_get_low_stock_items):
         # Mock to raise ConnectionError
         mock_get_low_stock_items.side_effect = requests.exceptions.ConnectionError()
@@ -574,12 +949,14 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(json_data["detail"], "Cannot connect to ERPNext")
         
         # Verify the service function was invoked
-        mock_get_low_stock_items.assert_called_once_with(limit=25, warehouse=None, item_code=None)
+        mock_get_low_stock_items.assert_called_once_with(
+            limit=25, warehouse=None, item_code=None, high_below=30, medium_max=60, top_n=50
+        )
 
 
 
 
-    @patch('app.get_delayed_purchase_orders')
+    @patch('app.get_delayed_purchase_orders_async')
     def test_purchase_orders_delayed(self, mock_get_delayed_purchase_orders):
         # Mock return value with 2 delayed purchase orders
         mock_get_delayed_purchase_orders.return_value = {
@@ -614,7 +991,7 @@ class TestAPI(unittest.TestCase):
         # Assert the mock was called with correct parameters
         mock_get_delayed_purchase_orders.assert_called_once_with(limit=2)
 
-    @patch('app.get_delayed_purchase_orders')
+    @patch('app.get_delayed_purchase_orders_async')
     def test_purchase_orders_delayed_default_limit(self, mock_get_delayed_purchase_orders):
         # Mock return value with empty list
         mock_get_delayed_purchase_orders.return_value = {
@@ -633,7 +1010,7 @@ class TestAPI(unittest.TestCase):
         # Verify default limit parameter (100) was passed
         mock_get_delayed_purchase_orders.assert_called_once_with(limit=100)
 
-    @patch('app.get_delayed_purchase_orders')
+    @patch('app.get_delayed_purchase_orders_async')
     def test_purchase_orders_delayed_value_error_returns_500(self, mock_get_delayed_purchase_orders):
         # Mock to raise ValueError
         mock_get_delayed_purchase_orders.side_effect = ValueError("Invalid data")
@@ -650,7 +1027,7 @@ class TestAPI(unittest.TestCase):
         # Verify the service function was invoked
         mock_get_delayed_purchase_orders.assert_called_once_with(limit=10)
 
-    @patch('app.get_delayed_purchase_orders')
+    @patch('app.get_delayed_purchase_orders_async')
     def test_purchase_orders_delayed_http_error_401_returns_401(self, mock_get_delayed_purchase_orders):
         # Create a mock response with status_code 401
         mock_response = Mock()
@@ -673,7 +1050,7 @@ class TestAPI(unittest.TestCase):
         # Verify the service function was invoked
         mock_get_delayed_purchase_orders.assert_called_once_with(limit=15)
 
-    @patch('app.get_delayed_purchase_orders')
+    @patch('app.get_delayed_purchase_orders_async')
     def test_purchase_orders_delayed_http_error_non_401_returns_502(self, mock_get_delayed_purchase_orders):
         # Create a mock response with status_code 500
         mock_response = Mock()
@@ -696,7 +1073,7 @@ class TestAPI(unittest.TestCase):
         # Verify the service function was invoked
         mock_get_delayed_purchase_orders.assert_called_once_with(limit=20)
 
-    @patch('app.get_delayed_purchase_orders')
+    @patch('app.get_delayed_purchase_orders_async')
     def test_purchase_orders_delayed_connection_error_returns_502(self, mock_get_delayed_purchase_orders):
         # Mock to raise ConnectionError
         mock_get_delayed_purchase_orders.side_effect = requests.exceptions.ConnectionError()
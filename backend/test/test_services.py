@@ -0,0 +1,1354 @@
+# backend/test/test_services.py
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+from unittest.mock import patch, AsyncMock, Mock
+
+import httpx
+import numpy as np
+import orjson
+import requests
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from benchmarks import loadgen, standin, synthetic
+from services import erpnext
+from services import events
+from services import http
+from services import metrics
+from services import profiling
+from services import scoring
+from services import sites
+from services.breaker import CircuitBreaker, CircuitOpenError
+from services.cache import ResponseCache
+from services.mirror import LocalMirror
+from services.records import BinRecord, LowStockItem, SalesInvoiceRecord
+from services.singleflight import SingleFlight
+from services.snapshots import SnapshotStore
+from services import sync
+from services.sync import InvoiceWorkingSet
+
+
+def fake_response(data):
+    response = Mock()
+    response.status_code = 200
+    response.json.return_value = {"data": data}
+    response.content = orjson.dumps({"data": data})
+    response.raise_for_status.return_value = None
+    return response
+
+
+class TestSharedSession(unittest.TestCase):
+
+    def setUp(self):
+        erpnext.close_session()
+        erpnext.response_cache.clear()
+        self.env = patch.multiple(
+            erpnext,
+            ERP_URL="http://erp.test",
+            API_KEY="key",
+            API_SECRET="secret"
+        )
+        self.env.start()
+
+    def tearDown(self):
+        erpnext.close_session()
+        self.env.stop()
+
+    def test_session_is_created_once(self):
+        first = erpnext.get_session()
+        second = erpnext.get_session()
+        self.assertIs(first, second)
+        self.assertEqual(first.headers["Authorization"], "token key:secret")
+
+    def test_session_adapter_is_pooled_with_retries(self):
+        adapter = erpnext.get_session().get_adapter("https://erp.test")
+        self.assertEqual(adapter._pool_maxsize, erpnext.POOL_SIZE)
+        self.assertEqual(adapter.max_retries.total, erpnext.MAX_RETRIES)
+        self.assertIn(503, adapter.max_retries.status_forcelist)
+
+    def test_fetchers_share_session_and_set_timeouts(self):
+        session = erpnext.get_session()
+        with patch.object(session, "get", return_value=fake_response([])) as mock_get:
+            erpnext.get_sales_invoices(limit=5)
+            erpnext.get_delayed_purchase_orders(limit=5)
+
+        self.assertEqual(mock_get.call_count, 2)
+        for call in mock_get.call_args_list:
+            self.assertEqual(
+                call.kwargs["timeout"],
+                (erpnext.CONNECT_TIMEOUT, erpnext.READ_TIMEOUT)
+            )
+        self.assertTrue(mock_get.call_args_list[0].args[0].endswith("/api/resource/Sales Invoice"))
+
+    def test_fetch_list_serves_repeat_queries_from_cache(self):
+        session = erpnext.get_session()
+        params = {"fields": '["name"]', "limit_page_length": 5}
+        with patch.object(session, "get", return_value=fake_response([{"name": "BIN-1"}])) as mock_get:
+            first = erpnext.fetch_list("Bin", params)
+            second = erpnext.fetch_list("Bin", dict(params))
+            erpnext.fetch_list("Bin", params, use_cache=False)
+
+        self.assertEqual(first, second)
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(erpnext.response_cache.stats()["hits"], 1)
+
+    def test_fetch_list_requires_erp_url(self):
+        with patch.object(erpnext, "ERP_URL", ""):
+            with self.assertRaises(ValueError):
+                erpnext.fetch_list("Bin", {})
+
+
+class TestAsyncClient(unittest.TestCase):
+
+    def setUp(self):
+        self.env = patch.multiple(
+            erpnext,
+            ERP_URL="http://erp.test",
+            API_KEY="key",
+            API_SECRET="secret",
+            RETRY_BACKOFF=0,
+            upstream_breaker=CircuitBreaker()
+        )
+        self.env.start()
+        erpnext.response_cache.clear()
+
+    def tearDown(self):
+        self.env.stop()
+
+    def run_with_transport(self, handler, coro_factory):
+        async def runner():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            with patch.object(erpnext, "get_async_client", return_value=client):
+                try:
+                    return await coro_factory()
+                finally:
+                    await client.aclose()
+        return asyncio.run(runner())
+
+    def test_client_of_previous_loop_is_closed(self):
+        other_loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=other_loop.run_forever)
+        thread.start()
+
+        async def client():
+            return erpnext.get_async_client()
+
+        try:
+            with patch.multiple(erpnext, _async_client=None, _async_client_loop=None):
+                old = asyncio.run_coroutine_threadsafe(client(), other_loop).result()
+                new = asyncio.run(client())
+                # Wait for the close handed to the other loop
+                asyncio.run_coroutine_threadsafe(asyncio.sleep(0), other_loop).result()
+
+            self.assertIsNot(old, new)
+            self.assertTrue(old.is_closed)
+            self.assertFalse(new.is_closed)
+        finally:
+            other_loop.call_soon_threadsafe(other_loop.stop)
+            thread.join()
+            other_loop.close()
+
+    def test_async_fetcher_scores_rows(self):
+        def handler(request):
+            self.assertEqual(request.url.path, "/api/resource/Purchase Order")
+            return httpx.Response(200, json={"data": [{
+                "name": "PO-1",
+                "supplier": "Supplier A",
+                "transaction_date": "2000-01-01",
+                "status": "To Receive",
+                "per_received": 0
+            }]})
+
+        result = self.run_with_transport(
+            handler, lambda: erpnext.get_delayed_purchase_orders_async(limit=5)
+        )
+        self.assertEqual(result["count"], 1)
+        self.assertEqual(result["data"][0]["risk_level"], "High")
+
+    def test_async_http_error_is_raised_as_requests_error(self):
+        def handler(request):
+            return httpx.Response(401, json={})
+
+        with self.assertRaises(requests.exceptions.HTTPError) as ctx:
+            self.run_with_transport(handler, lambda: erpnext.afetch_list("Bin", {}))
+        self.assertEqual(ctx.exception.response.status_code, 401)
+
+    def test_async_retries_on_unavailable(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                return httpx.Response(503, json={})
+            return httpx.Response(200, json={"data": [{"name": "BIN-1"}]})
+
+        rows = self.run_with_transport(handler, lambda: erpnext.afetch_list("Bin", {}))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(rows, [{"name": "BIN-1"}])
+
+    def test_async_connection_error_is_raised_as_requests_error(self):
+        def handler(request):
+            raise httpx.ConnectError("refused")
+
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.run_with_transport(handler, lambda: erpnext.afetch_list("Bin", {}))
+
+    def test_async_call_deadline_covers_retries(self):
+        async def handler(request):
+            await asyncio.sleep(0.05)
+            return httpx.Response(503, json={})
+
+        with patch.object(erpnext, "CALL_DEADLINE", 0.02):
+            with self.assertRaises(requests.exceptions.ReadTimeout):
+                self.run_with_transport(handler, lambda: erpnext.afetch_list("Bin", {}))
+        self.assertEqual(erpnext.upstream_breaker.failures, 1)
+
+    def test_open_breaker_fails_fast_without_calling_erpnext(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(502, json={})
+
+        with patch.object(erpnext, "upstream_breaker", CircuitBreaker(failure_threshold=1)):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                self.run_with_transport(handler, lambda: erpnext.afetch_list("Bin", {}))
+            with self.assertRaises(CircuitOpenError):
+                self.run_with_transport(handler, lambda: erpnext.afetch_list("Bin", {}))
+            self.assertEqual(erpnext.upstream_breaker.stats()["rejected"], 1)
+        self.assertEqual(len(calls), erpnext.MAX_RETRIES + 1)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def sample(self, name, **labels):
+        return metrics.registry.get_sample_value(name, labels) or 0
+
+    def test_error_status_labels(self):
+        self.assertEqual(metrics.error_status(requests.exceptions.HTTPError(response=Mock(status_code=503))), "503")
+        self.assertEqual(metrics.error_status(CircuitOpenError()), "circuit_open")
+        self.assertEqual(metrics.error_status(requests.exceptions.ConnectTimeout()), "timeout")
+        self.assertEqual(metrics.error_status(requests.exceptions.ConnectionError()), "connection")
+
+    def test_fetch_records_upstream_phase_and_rows(self):
+        def handler(request):
+            if request.url.params.get("fail"):
+                return httpx.Response(404, json={})
+            return httpx.Response(200, json={"data": [{"name": "PO-1"}, {"name": "PO-2"}]})
+
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            with patch.object(erpnext, "get_async_client", return_value=client):
+                try:
+                    await erpnext.afetch_list("Metrics Doc", {}, use_cache=False)
+                    with self.assertRaises(requests.exceptions.HTTPError):
+                        await erpnext.afetch_list("Metrics Doc", {"fail": 1}, use_cache=False)
+                finally:
+                    await client.aclose()
+
+        before = {
+            "calls": self.sample("risk_radar_upstream_seconds_count", doctype="Metrics Doc"),
+            "rows": self.sample("risk_radar_rows_fetched_total", doctype="Metrics Doc"),
+            "errors": self.sample("risk_radar_upstream_errors_total", doctype="Metrics Doc", status="404")
+        }
+        with patch.multiple(erpnext, ERP_URL="http://erp.test", upstream_breaker=CircuitBreaker()):
+            asyncio.run(scenario())
+
+        self.assertEqual(self.sample("risk_radar_upstream_seconds_count", doctype="Metrics Doc") - before["calls"], 2)
+        self.assertEqual(self.sample("risk_radar_rows_fetched_total", doctype="Metrics Doc") - before["rows"], 2)
+        self.assertEqual(
+            self.sample("risk_radar_upstream_errors_total", doctype="Metrics Doc", status="404") - before["errors"], 1
+        )
+
+    def test_scoring_records_phase_and_kept_rows(self):
+        today = date(2026, 1, 31)
+        pos = [
+            {"name": "PO-1", "transaction_date": "2026-01-01", "per_received": 0},
+            {"name": "PO-2", "transaction_date": "2026-01-30", "per_received": 0}
+        ]
+        scored = self.sample("risk_radar_scoring_seconds_count", dataset="delayed_purchase_orders")
+        kept = self.sample("risk_radar_rows_kept_total", dataset="delayed_purchase_orders")
+
+        erpnext._score_delayed_purchase_orders(pos, today)
+
+        self.assertEqual(self.sample("risk_radar_scoring_seconds_count", dataset="delayed_purchase_orders") - scored, 1)
+        self.assertEqual(self.sample("risk_radar_rows_kept_total", dataset="delayed_purchase_orders") - kept, 1)
+
+
+class TestRequestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_client(self):
+        async def endpoint(request):
+            await asyncio.sleep(0.03)
+            total = sum(i * i for i in range(200_000))
+            return PlainTextResponse(str(total))
+
+        app = Starlette(routes=[Route("/slow", endpoint)])
+        app.add_middleware(profiling.ProfilingMiddleware, directory=self.directory, interval=0.001)
+        return TestClient(app)
+
+    def test_only_requested_profiles_are_taken(self):
+        client = self.make_client()
+
+        plain = client.get("/slow")
+        profiled = client.get("/slow?profile=1")
+        by_header = client.get("/slow", headers={"X-Profile": "1"})
+
+        self.assertNotIn("x-profile", plain.headers)
+        self.assertEqual(len(list(self.directory.glob("*.folded"))), 2)
+        self.assertNotEqual(profiled.headers["x-profile"], by_header.headers["x-profile"])
+
+    def test_profile_is_folded_stacks_of_running_and_awaiting_code(self):
+        response = self.make_client().get("/slow?profile=1")
+        folded = profiling.load_profile(response.headers["x-profile"], self.directory)
+
+        lines = folded.splitlines()
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+        self.assertTrue(any(line.startswith("[await];") and "endpoint" in line for line in lines))
+        self.assertTrue(any(not line.startswith("[await]") and "endpoint" in line for line in lines))
+
+    def test_profiled_requests_run_with_profiling_flag(self):
+        async def endpoint(request):
+            return PlainTextResponse(str(profiling.profiling.get()))
+
+        app = Starlette(routes=[Route("/flag", endpoint)])
+        app.add_middleware(profiling.ProfilingMiddleware, directory=self.directory, interval=0.001)
+        client = TestClient(app)
+
+        self.assertEqual(client.get("/flag").text, "False")
+        self.assertEqual(client.get("/flag?profile=1").text, "True")
+
+    def test_old_profiles_are_pruned_and_names_validated(self):
+        for n in range(3):
+            profiling.save_profile(f"p{n}.folded", "a;b 1\n", self.directory, keep=2)
+
+        self.assertEqual(sorted(p.name for p in self.directory.iterdir()), ["p1.folded", "p2.folded"])
+        self.assertEqual(profiling.load_profile("p2.folded", self.directory), "a;b 1\n")
+        self.assertIsNone(profiling.load_profile("../p2.folded", self.directory))
+
+
+class TestSyntheticDatasets(unittest.TestCase):
+
+    def setUp(self):
+        self.today = date(2026, 1, 31)
+
+    def test_list_query_filters_orders_and_pages(self):
+        invoices = synthetic.generate("Sales Invoice", 2_000, today=self.today)
+        params = erpnext._overdue_invoice_params(self.today)
+
+        rows = invoices.query({**params, "limit_page_length": 0})
+        page = invoices.query({**params, "limit_start": 10, "limit_page_length": 5, "as_dict": 0})
+
+        self.assertTrue(rows)
+        self.assertTrue(all(
+            row["due_date"] < "2026-01-31" and row["status"] != "Paid" and row["outstanding_amount"] > 0
+            for row in rows
+        ))
+        self.assertEqual([row["due_date"] for row in rows], sorted(row["due_date"] for row in rows))
+        self.assertEqual(page, [list(row.values()) for row in rows[10:15]])
+        self.assertEqual(len(invoices.query(params)), synthetic.DEFAULT_PAGE_LENGTH)
+
+    def test_grouped_aggregates(self):
+        bins = synthetic.generate("Bin", 300, today=self.today)
+
+        totals = bins.query(erpnext._bin_totals_params(limit=0))
+
+        self.assertEqual(len(totals), 100)
+        self.assertEqual({row["warehouse_count"] for row in totals}, {3})
+        self.assertEqual(sum(row["total_qty"] for row in totals), bins.columns["actual_qty"].sum())
+        self.assertEqual([row["total_qty"] for row in totals], sorted(row["total_qty"] for row in totals))
+
+
+class TestStandIn(unittest.TestCase):
+
+    def setUp(self):
+        erpnext.response_cache.clear()
+        self.datasets = standin.build_datasets(invoices=3_000, bins=600, purchase_orders=500)
+
+    def run_against(self, app, coro_factory):
+        async def runner():
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+            with patch.object(erpnext, "get_async_client", return_value=client):
+                try:
+                    return await coro_factory()
+                finally:
+                    await client.aclose()
+
+        with patch.multiple(
+            erpnext, ERP_URL="http://standin", RETRY_BACKOFF=0, PAGE_SIZE=500, upstream_breaker=CircuitBreaker()
+        ):
+            return asyncio.run(runner())
+
+    def test_fetchers_run_over_the_real_http_path(self):
+        app = standin.create_app(self.datasets)
+
+        overdue = self.run_against(app, lambda: erpnext.get_overdue_invoices_async(limit=10))
+        totals = self.run_against(app, lambda: erpnext.get_bin_stock_async(limit=5))
+
+        self.assertEqual(overdue["count"], 10)
+        self.assertGreater(overdue["kpis"]["overdue_invoices_count"], 500)
+        self.assertEqual(totals["count"], 5)
+        self.assertEqual(totals["data"][0]["warehouse_count"], 3)
+
+    def test_injected_errors_and_auth(self):
+        failing = standin.create_app(self.datasets, standin.Faults(error_rate=1, error_status=503))
+        with self.assertRaises(requests.exceptions.HTTPError) as ctx:
+            self.run_against(failing, lambda: erpnext.get_delayed_purchase_orders_async(limit=5))
+        self.assertEqual(ctx.exception.response.status_code, 503)
+
+        locked = standin.create_app(self.datasets, api_key="key", api_secret="secret")
+        client = TestClient(locked)
+        self.assertEqual(client.get("/api/resource/Bin").status_code, 401)
+        ok = client.get("/api/resource/Bin", headers={"Authorization": "token key:secret"})
+        self.assertEqual(len(ok.json()["data"]), synthetic.DEFAULT_PAGE_LENGTH)
+        self.assertEqual(client.get("/api/resource/Item", headers={"Authorization": "token key:secret"}).status_code, 404)
+        self.assertEqual(client.get("/standin/stats").json()["unauthorized"], 1)
+
+    def test_latency_is_injected(self):
+        faults = standin.Faults(latency=0.05)
+        app = standin.create_app(self.datasets, faults)
+
+        started = time.perf_counter()
+        self.run_against(app, lambda: erpnext.afetch_list("Bin", {"fields": '["name"]'}))
+        self.assertGreaterEqual(time.perf_counter() - started, 0.05)
+
+
+class TestLoadGenerator(unittest.TestCase):
+
+    def test_mix_is_validated(self):
+        self.assertEqual(loadgen.parse_mix("overdue=3,low_stock"), {"overdue": 3.0, "low_stock": 1.0})
+        with self.assertRaises(ValueError):
+            loadgen.parse_mix("invoices=1")
+
+    def test_summary_percentiles_and_error_rate(self):
+        latencies = [n / 1000 for n in range(1, 101)]
+
+        summary = loadgen.summarize(latencies, errors=2, elapsed=2)
+
+        self.assertEqual(summary["rps"], 50)
+        self.assertEqual(summary["error_rate"], 0.02)
+        self.assertEqual((summary["p50_ms"], summary["p95_ms"], summary["p99_ms"]), (50, 95, 99))
+        self.assertIsNone(loadgen.summarize([], 0, 1)["p99_ms"])
+
+    def test_thresholds(self):
+        overall = {"p95_ms": 120, "p99_ms": 300, "error_rate": 0.02, "rps": 80}
+
+        self.assertEqual(loadgen.check_thresholds(overall, max_p95_ms=200, min_rps=50), [])
+        failures = loadgen.check_thresholds(overall, max_p99_ms=250, max_error_rate=0.01, min_rps=100)
+        self.assertEqual(len(failures), 3)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = CircuitBreaker(
+            failure_threshold=2, slow_call_seconds=5, reset_timeout=30, clock=lambda: self.now
+        )
+
+    def fail(self):
+        self.breaker.before_call()
+        self.breaker.record(0.1, requests.exceptions.ConnectionError())
+
+    def test_opens_after_consecutive_failures(self):
+        self.fail()
+        self.assertEqual(self.breaker.state, "closed")
+        self.fail()
+        self.assertEqual(self.breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.assertEqual(self.breaker.stats(), {
+            "state": "open", "consecutive_failures": 2, "trips": 1, "rejected": 1
+        })
+
+    def test_half_open_trial_closes_or_reopens(self):
+        self.fail()
+        self.fail()
+        self.now = 31
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, "half_open")
+        self.breaker.record(0.1, requests.exceptions.ReadTimeout())
+        self.assertEqual(self.breaker.state, "open")
+
+        self.now = 62
+        self.breaker.before_call()
+        self.breaker.record(0.1)
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertEqual(self.breaker.failures, 0)
+
+    def test_slow_calls_count_and_client_errors_do_not(self):
+        forbidden = requests.exceptions.HTTPError(response=Mock(status_code=403))
+        self.breaker.record(0.1, forbidden)
+        self.breaker.record(0.1, forbidden)
+        self.assertEqual(self.breaker.state, "closed")
+
+        self.breaker.record(6)
+        self.breaker.record(6)
+        self.assertEqual(self.breaker.state, "open")
+
+
+class TestSites(unittest.TestCase):
+
+    PO_ROW = {
+        "name": "PO-1",
+        "supplier": "Supplier A",
+        "transaction_date": "2000-01-01",
+        "status": "To Receive",
+        "per_received": 0
+    }
+
+    def setUp(self):
+        self.env = patch.multiple(erpnext, ERP_URL="", API_KEY=None, API_SECRET=None, RETRY_BACKOFF=0, site_breakers={})
+        self.env.start()
+        erpnext.response_cache.clear()
+
+    def tearDown(self):
+        self.env.stop()
+        erpnext.response_cache.clear()
+
+    def test_load_sites_reads_per_site_settings(self):
+        loaded = sites.load_sites({
+            "ERP_SITES": "acme, globex-ksa",
+            "ERP_SITE_ACME_URL": "https://acme.example/",
+            "ERP_SITE_ACME_API_KEY": "k1",
+            "ERP_SITE_ACME_API_SECRET": "s1",
+            "ERP_SITE_GLOBEX_KSA_URL": "https://globex.example",
+            "ERP_SITE_GLOBEX_KSA_DEADLINE": "2.5"
+        })
+
+        self.assertEqual([site.name for site in loaded], ["acme", "globex-ksa"])
+        self.assertEqual(loaded[0].url, "https://acme.example")
+        self.assertEqual((loaded[0].api_key, loaded[0].api_secret), ("k1", "s1"))
+        self.assertEqual(loaded[1].deadline, 2.5)
+        self.assertNotIn("s1", repr(loaded[0]))
+        self.assertEqual(sites.load_sites({}), [])
+        with self.assertRaises(ValueError):
+            sites.load_sites({"ERP_SITES": "acme"})
+        with self.assertRaises(ValueError):
+            sites.load_sites({"ERP_SITES": "acme,acme", "ERP_SITE_ACME_URL": "https://acme.example"})
+
+    def test_fan_out_uses_each_sites_credentials_and_deadline(self):
+        seen = []
+
+        async def handler(request):
+            seen.append((request.url.host, request.headers["authorization"]))
+            if request.url.host == "slow.test":
+                await asyncio.sleep(1)
+            return httpx.Response(200, json={"data": [self.PO_ROW]})
+
+        registry = [
+            sites.Site("acme", "http://acme.test", "k1", "s1"),
+            sites.Site("other", "http://other.test", "k2", "s2"),
+            sites.Site("slow", "http://slow.test", "k3", "s3", deadline=0.05)
+        ]
+
+        async def runner():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            with patch.object(erpnext, "get_async_client", return_value=client):
+                try:
+                    return await sites.fan_out(
+                        registry, lambda: erpnext.get_delayed_purchase_orders_async(limit=5)
+                    )
+                finally:
+                    await client.aclose()
+
+        started = time.monotonic()
+        results = asyncio.run(runner())
+
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual([result.status for result in results], ["ok", "ok", "timeout"])
+        self.assertIsInstance(results[2].error, requests.exceptions.ReadTimeout)
+        # Same query on two sites: separate cache entries, not one shared response
+        self.assertIn(("acme.test", "token k1:s1"), seen)
+        self.assertIn(("other.test", "token k2:s2"), seen)
+        self.assertEqual(set(erpnext.site_breakers), {"acme", "other", "slow"})
+        self.assertIsNone(erpnext.current_site.get())
+
+    def test_open_breaker_of_one_site_does_not_stop_the_others(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.host)
+            return httpx.Response(200, json={"data": [self.PO_ROW]})
+
+        breaker = CircuitBreaker(failure_threshold=1)
+        breaker.record(0.1, requests.exceptions.ConnectionError())
+        erpnext.site_breakers["globex"] = breaker
+        registry = [
+            sites.Site("acme", "http://acme.test", "k1", "s1"),
+            sites.Site("globex", "http://globex.test", "k2", "s2")
+        ]
+
+        async def runner():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            with patch.object(erpnext, "get_async_client", return_value=client):
+                try:
+                    return await sites.fan_out(
+                        registry, lambda: erpnext.get_delayed_purchase_orders_async(limit=5)
+                    )
+                finally:
+                    await client.aclose()
+
+        acme, globex = asyncio.run(runner())
+
+        self.assertEqual(acme.status, "ok")
+        self.assertIsInstance(globex.error, CircuitOpenError)
+        self.assertEqual(calls, ["acme.test"])
+        self.assertFalse(erpnext.site_breaker(None).is_open)
+
+    def test_site_without_credentials_is_reported_not_raised(self):
+        results = asyncio.run(sites.fan_out(
+            [sites.Site("acme", "http://acme.test")], lambda: erpnext.afetch_list("Bin", {})
+        ))
+
+        self.assertEqual(results[0].status, "error")
+        self.assertIn("acme", str(results[0].error))
+
+    def result(self, name, value=None, error=None):
+        return sites.SiteResult(sites.Site(name, f"http://{name}.test"), value, error)
+
+    def test_merge_ranks_rows_across_sites(self):
+        def payload(days, outstanding, invoice):
+            return {
+                "kpis": {
+                    "overdue_invoices_count": len(days),
+                    "total_outstanding_overdue_amount": outstanding,
+                    "most_overdue_days": max(days),
+                    "most_overdue_invoice_id": invoice,
+                    "most_overdue_customer": "C"
+                },
+                "count": len(days),
+                "medium_count": 0,
+                "high_count": len(days),
+                "data": [{"invoice_id": f"{invoice}-{d}", "days_overdue": d} for d in days]
+            }
+
+        merged = sites.merge_overdue_invoices([
+            self.result("acme", payload([40, 20], 100.0, "A")),
+            self.result("globex", payload([30, 25, 16], 50.0, "G")),
+            self.result("down", error=requests.exceptions.ConnectionError("refused"))
+        ], limit=3)
+
+        self.assertEqual(
+            [(row["site"], row["days_overdue"]) for row in merged["data"]],
+            [("acme", 40), ("globex", 30), ("globex", 25)]
+        )
+        self.assertEqual(merged["count"], 3)
+        self.assertEqual(merged["high_count"], 5)
+        self.assertEqual(merged["kpis"]["total_outstanding_overdue_amount"], 150.0)
+        self.assertEqual(merged["kpis"]["most_overdue_site"], "acme")
+        self.assertTrue(merged["partial"])
+        self.assertEqual(merged["sites"]["globex"]["kpis"]["most_overdue_days"], 30)
+        self.assertEqual(merged["sites"]["down"]["status"], "error")
+
+    def test_merge_records_and_all_failed(self):
+        merged = sites.merge_low_stock([
+            self.result("acme", {"total_count": 1, "high_count": 1, "medium_count": 0, "data": [
+                LowStockItem(item_code="I1", warehouse="Stores - SD", actual_qty=9, risk_level="High")
+            ]}),
+            self.result("globex", {"total_count": 1, "high_count": 1, "medium_count": 0, "data": [
+                LowStockItem(item_code="I1", warehouse="Stores - SD", actual_qty=3, risk_level="High")
+            ]})
+        ], top_n=5)
+
+        self.assertEqual([(row["site"], row["actual_qty"]) for row in merged["data"]], [("globex", 3), ("acme", 9)])
+        self.assertFalse(merged["partial"])
+        self.assertEqual(events.row_key(merged["data"][0], ("item_code", "warehouse")), "globex|I1|Stores - SD")
+
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            sites.merge_delayed_purchase_orders([self.result("acme", error=requests.exceptions.ReadTimeout())])
+
+
+class TestOverduePagination(unittest.TestCase):
+
+    def make_invoice(self, n, days_ago, amount=100):
+        due = date.today() - timedelta(days=days_ago)
+        return {
+            "name": f"INV-{n:03d}",
+            "customer": "Customer A",
+            "due_date": due.isoformat(),
+            "status": "Overdue",
+            "outstanding_amount": amount
+        }
+
+    def test_iter_pages_walks_limit_start(self):
+        pages = [[{"name": "A"}, {"name": "B"}], [{"name": "C"}]]
+        with patch.object(erpnext, "fetch_list", side_effect=pages) as mock_fetch:
+            result = list(erpnext.iter_pages("Bin", {"order_by": "name asc"}, page_size=2))
+
+        self.assertEqual(result, pages)
+        starts = [call.args[1]["limit_start"] for call in mock_fetch.call_args_list]
+        self.assertEqual(starts, [0, 2])
+
+    def test_kpis_cover_every_page_while_limit_caps_rows(self):
+        ledger = [self.make_invoice(n, days_ago=40 - n) for n in range(30)]
+        pages = [ledger[i:i + 10] for i in range(0, 30, 10)] + [[]]
+
+        with patch.object(erpnext, "ERP_URL", "http://erp.test"), \
+                patch.object(erpnext, "PAGE_SIZE", 10), \
+                patch.object(erpnext, "fetch_list", side_effect=pages):
+            result = erpnext.get_overdue_invoices(limit=5)
+
+        scored = [inv for inv in ledger if (40 - int(inv["name"][-3:])) >= 8]
+        self.assertEqual(result["count"], 5)
+        self.assertEqual(result["kpis"]["overdue_invoices_count"], len(scored))
+        self.assertEqual(result["kpis"]["total_outstanding_overdue_amount"], 100 * len(scored))
+        self.assertEqual(result["kpis"]["most_overdue_days"], 40)
+        self.assertEqual(result["high_count"] + result["medium_count"], len(scored))
+
+
+class TestBatchScoring(unittest.TestCase):
+
+    def test_date_column_marks_missing_and_bad_dates(self):
+        ordinals = scoring.date_column(["2026-01-01", None, "not-a-date"])
+        self.assertEqual(ordinals[0], scoring.day_ordinal(date(2026, 1, 1)))
+        self.assertEqual(list(ordinals[1:]), [-1, -1])
+
+    def test_overdue_buckets_follow_thresholds(self):
+        today = date(2026, 1, 31)
+        due = scoring.date_column([
+            (today - timedelta(days=d)).isoformat() for d in (3, 8, 14, 15, 40)
+        ] + [None])
+        days, buckets = scoring.score_overdue(due, today, 8, 14, 15)
+
+        self.assertEqual(list(days[:5]), [3, 8, 14, 15, 40])
+        self.assertEqual(
+            list(buckets),
+            [scoring.NONE, scoring.MEDIUM, scoring.MEDIUM, scoring.HIGH, scoring.HIGH, scoring.NONE]
+        )
+
+        amounts = scoring.float_column([1, 2, 3, None, 5, 6])
+        medium, high, outstanding, worst = scoring.overdue_kpis(days, amounts, buckets)
+        self.assertEqual((medium, high, outstanding, worst), (2, 2, 10.0, 4))
+
+    def test_delayed_purchase_orders_sorted_and_received_skipped(self):
+        today = date.today()
+        pos = [
+            {"name": "PO-1", "transaction_date": (today - timedelta(days=10)).isoformat(), "per_received": 0},
+            {"name": "PO-2", "transaction_date": (today - timedelta(days=30)).isoformat(), "per_received": 50},
+            {"name": "PO-3", "transaction_date": (today - timedelta(days=30)).isoformat(), "per_received": 100},
+            {"name": "PO-4", "transaction_date": (today - timedelta(days=3)).isoformat(), "per_received": None},
+            {"name": "PO-5", "transaction_date": None}
+        ]
+        result = erpnext._score_delayed_purchase_orders(pos, today)
+
+        self.assertEqual([po["po"] for po in result["data"]], ["PO-2", "PO-1"])
+        self.assertEqual([po["risk_level"] for po in result["data"]], ["High", "Medium"])
+        self.assertEqual((result["high_count"], result["medium_count"]), (1, 1))
+        self.assertIsInstance(result["data"][0]["stuck_days"], int)
+
+
+class TestRecords(unittest.TestCase):
+
+    def test_record_reads_like_a_dict(self):
+        inv = SalesInvoiceRecord.from_dict({"name": "INV-1", "due_date": "2026-01-01", "extra": 1})
+
+        self.assertFalse(hasattr(inv, "__dict__"))
+        self.assertEqual(inv["name"], "INV-1")
+        self.assertEqual(inv.get("due_date"), "2026-01-01")
+        self.assertIsNone(inv.get("customer"))
+        self.assertEqual(inv.get("extra", "missing"), "missing")
+        self.assertEqual(dict(inv)["name"], "INV-1")
+        with self.assertRaises(KeyError):
+            inv["extra"]
+
+    def test_fetch_list_decodes_records_and_caches_them(self):
+        response = fake_response([{"name": "B1", "item_code": "I", "warehouse": "W", "actual_qty": 3}])
+        erpnext.response_cache.clear()
+        with patch.object(erpnext, "ERP_URL", "http://erp.test"), \
+                patch.object(erpnext, "get_session") as mock_session:
+            mock_session.return_value.get.return_value = response
+            first = erpnext.fetch_list("Bin", {"limit_start": 0}, record=BinRecord)
+            second = erpnext.fetch_list("Bin", {"limit_start": 0}, record=BinRecord)
+
+        self.assertIsInstance(first[0], BinRecord)
+        self.assertIs(first, second)
+        self.assertEqual(mock_session.return_value.get.call_count, 1)
+        erpnext.response_cache.clear()
+
+
+class TestListShapedDecoding(unittest.TestCase):
+
+    def setUp(self):
+        erpnext.response_cache.clear()
+
+    def fetch(self, rows, params, record):
+        with patch.object(erpnext, "ERP_URL", "http://erp.test"), \
+                patch.object(erpnext, "get_session") as mock_session:
+            mock_session.return_value.get.return_value = fake_response(rows)
+            result = erpnext.fetch_list("Bin", params, use_cache=False, record=record)
+        return result, mock_session.return_value.get.call_args.kwargs["params"]
+
+    def test_record_queries_request_list_rows(self):
+        params = {"fields": '["name", "item_code", "warehouse", "actual_qty"]'}
+        rows, sent = self.fetch([["B1", "ITEM-1", "Stores - SD", 4.0]], params, BinRecord)
+
+        self.assertEqual(sent["as_dict"], 0)
+        self.assertEqual(rows, [BinRecord(name="B1", item_code="ITEM-1", warehouse="Stores - SD", actual_qty=4.0)])
+
+    def test_out_of_order_fields_are_mapped_by_name(self):
+        params = {"fields": '["actual_qty", "warehouse", "item_code as item_code", "name"]'}
+        rows, _ = self.fetch([[4.0, "Stores - SD", "ITEM-1", "B1"]], params, BinRecord)
+
+        self.assertEqual(rows[0].item_code, "ITEM-1")
+        self.assertEqual(rows[0].actual_qty, 4.0)
+        self.assertIsNone(rows[0].modified)
+
+    def test_plain_queries_keep_dict_rows(self):
+        rows, sent = self.fetch([{"name": "B1"}], {"fields": '["name"]'}, None)
+
+        self.assertNotIn("as_dict", sent)
+        self.assertEqual(rows, [{"name": "B1"}])
+
+
+class TestResponseEncoding(unittest.TestCase):
+
+    def test_negotiate_prefers_brotli_then_gzip(self):
+        self.assertEqual(http.negotiate_encoding("gzip, deflate, br"), "br" if http.brotli else "gzip")
+        self.assertEqual(http.negotiate_encoding("gzip, br;q=0"), "gzip")
+        self.assertIsNone(http.negotiate_encoding("identity"))
+        self.assertIsNone(http.negotiate_encoding("gzip;q=0"))
+
+    def test_etag_matching_is_weak(self):
+        etag = http.content_etag({"count": 1})
+        self.assertEqual(etag, http.content_etag({"count": 1}))
+        self.assertNotEqual(etag, http.content_etag({"count": 2}))
+        self.assertTrue(http.etag_matches(f'"x", {etag.removeprefix("W/")}', etag))
+        self.assertTrue(http.etag_matches("*", etag))
+        self.assertFalse(http.etag_matches(None, etag))
+
+    def test_orjson_response_serializes_records_and_numpy(self):
+        body = http.ORJSONResponse({"data": [BinRecord(name="B1")], "total": np.float64(2.5)}).body
+        self.assertEqual(orjson.loads(body)["data"][0]["name"], "B1")
+        self.assertEqual(orjson.loads(body)["total"], 2.5)
+
+
+class TestRiskEvents(unittest.TestCase):
+
+    def test_diff_reports_row_level_changes(self):
+        old = {"data": [
+            {"po": "PO-1", "stuck_days": 10, "risk_level": "Medium"},
+            {"po": "PO-2", "stuck_days": 20, "risk_level": "High"},
+            {"po": "PO-3", "stuck_days": 8, "risk_level": "Medium"}
+        ]}
+        new = {"data": [
+            {"po": "PO-1", "stuck_days": 15, "risk_level": "High"},
+            {"po": "PO-3", "stuck_days": 9, "risk_level": "Medium"},
+            {"po": "PO-4", "stuck_days": 7, "risk_level": "Medium"}
+        ]}
+
+        changes = {c["key"]: c for c in events.diff_dataset("delayed_purchase_orders", old, new)}
+
+        self.assertEqual(changes["PO-1"]["change"], "risk_escalated")
+        self.assertEqual(changes["PO-2"], {"op": "remove", "change": "po_received", "key": "PO-2"})
+        self.assertEqual(changes["PO-3"]["change"], "updated")
+        self.assertEqual(changes["PO-4"]["change"], "po_delayed")
+        self.assertEqual(events.diff_dataset("delayed_purchase_orders", new, new), [])
+
+    def test_low_stock_rows_are_keyed_by_item_and_warehouse(self):
+        row = LowStockItem("ITEM-1", "Stores - SD", 5, "High")
+        changes = events.diff_dataset("low_stock", {"data": [row]}, {"data": []})
+        self.assertEqual(changes, [{"op": "remove", "change": "bin_replenished", "key": "ITEM-1|Stores - SD"}])
+
+    def test_slow_subscriber_is_told_to_resync(self):
+        broker = events.EventBroker(queue_size=2)
+
+        async def scenario():
+            queue = broker.subscribe()
+            for n in range(3):
+                broker.publish("patch", {"n": n})
+            return [queue.get_nowait() for _ in range(queue.qsize())]
+
+        messages = asyncio.run(scenario())
+        self.assertEqual(len(messages), 1)
+        self.assertIn(b"event: resync", messages[0])
+
+    def test_stream_yields_published_events_until_disconnect(self):
+        broker = events.EventBroker()
+        request = Mock()
+        request.is_disconnected = AsyncMock(side_effect=[False, True])
+
+        async def scenario():
+            stream = events.event_stream(request, broker)
+            received = [await stream.__anext__()]
+            broker.publish("patch", {"dataset": "low_stock", "changes": []})
+            received.append(await stream.__anext__())
+            with self.assertRaises(StopAsyncIteration):
+                await stream.__anext__()
+            return received
+
+        received = asyncio.run(scenario())
+        self.assertEqual(received[0], b"retry: 3000\n\n")
+        self.assertTrue(received[1].startswith(b"id: 1\nevent: patch\ndata: {"))
+        self.assertEqual(broker.subscribers, 0)
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_identical_calls_share_one_execution(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return ["row"]
+
+        async def scenario():
+            results = await asyncio.gather(*(flights.do("q", fetch) for _ in range(10)))
+            results.append(await flights.do("q", fetch))
+            return results
+
+        results = asyncio.run(scenario())
+        self.assertEqual(results, [["row"]] * 11)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(flights.stats(), {"calls": 11, "executions": 2, "collapsed": 9, "in_flight": 0})
+
+    def test_errors_reach_every_waiter(self):
+        flights = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise requests.exceptions.ConnectionError()
+
+        async def scenario():
+            return await asyncio.gather(*(flights.do("q", failing) for _ in range(3)), return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        self.assertTrue(all(isinstance(r, requests.exceptions.ConnectionError) for r in results))
+        self.assertEqual(flights.stats()["executions"], 1)
+
+    def test_cancelled_caller_does_not_cancel_shared_request(self):
+        flights = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        async def scenario():
+            leader = asyncio.ensure_future(flights.do("q", fetch))
+            follower = asyncio.ensure_future(flights.do("q", fetch))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        self.assertEqual(asyncio.run(scenario()), "done")
+
+    def test_afetch_list_collapses_identical_queries(self):
+        requests_seen = []
+
+        async def handler(request):
+            requests_seen.append(request)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"data": [{"name": "SINV-1"}]})
+
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            with patch.object(erpnext, "get_async_client", return_value=client):
+                try:
+                    return await asyncio.gather(*(
+                        erpnext.afetch_list("Sales Invoice", {"fields": '["name"]'}, use_cache=False)
+                        for _ in range(5)
+                    ))
+                finally:
+                    await client.aclose()
+
+        with patch.multiple(erpnext, ERP_URL="http://erp.test", upstream_flights=SingleFlight()):
+            results = asyncio.run(scenario())
+            stats = erpnext.upstream_flights.stats()
+
+        self.assertEqual(len(requests_seen), 1)
+        self.assertEqual(results, [[{"name": "SINV-1"}]] * 5)
+        self.assertEqual(stats["collapsed"], 4)
+
+
+class TestBinStockAggregation(unittest.TestCase):
+
+    def test_aggregate_asks_erpnext_to_group_by_item(self):
+        grouped = [
+            {"item_code": "ITEM-002", "total_qty": 20.0, "warehouse_count": 1},
+            {"item_code": "ITEM-001", "total_qty": 120.0, "warehouse_count": 2}
+        ]
+        with patch.object(erpnext, "ERP_URL", "http://erp.test"), \
+                patch.object(erpnext, "fetch_list", return_value=grouped) as mock_fetch:
+            result = erpnext.get_bin_stock(limit=10, warehouse="Stores - SD")
+
+        params = mock_fetch.call_args.args[1]
+        self.assertEqual(params["group_by"], "item_code")
+        self.assertIn("sum(actual_qty) as total_qty", params["fields"])
+        self.assertIn('["warehouse", "=", "Stores - SD"]', params["filters"])
+        self.assertEqual(result["count"], 2)
+        self.assertEqual(result["data"][1], {"item_code": "ITEM-001", "total_qty": 120.0, "warehouse_count": 2})
+
+    def test_item_code_returns_warehouse_breakdown(self):
+        rows = [
+            {"name": "B1", "item_code": "ITEM-001", "warehouse": "Stores - SD", "actual_qty": 70},
+            {"name": "B2", "item_code": "ITEM-001", "warehouse": "Finished Goods - SD", "actual_qty": 50}
+        ]
+        with patch.object(erpnext, "ERP_URL", "http://erp.test"), \
+                patch.object(erpnext, "fetch_list", return_value=rows) as mock_fetch:
+            result = erpnext.get_bin_stock(item_code="ITEM-001")
+
+        self.assertNotIn("group_by", mock_fetch.call_args.args[1])
+        self.assertEqual(result, {"count": 2, "data": rows})
+
+
+class TestLowStockTopN(unittest.TestCase):
+
+    def test_thresholds_are_pushed_into_filters(self):
+        params = erpnext._low_stock_params(medium_max=45)
+        self.assertIn('["actual_qty", "<=", 45]', params["filters"])
+        self.assertIn('["actual_qty", ">=", 0]', params["filters"])
+        self.assertNotIn("limit_page_length", params)
+
+    def test_counts_cover_every_page_while_top_n_caps_rows(self):
+        bins = [
+            {"item_code": f"ITEM-{n:03d}", "warehouse": "Stores - SD", "actual_qty": n}
+            for n in range(0, 60, 2)
+        ]
+        pages = [bins[i:i + 10] for i in range(0, 30, 10)] + [[]]
+
+        with patch.object(erpnext, "ERP_URL", "http://erp.test"), \
+                patch.object(erpnext, "PAGE_SIZE", 10), \
+                patch.object(erpnext, "fetch_list", side_effect=pages):
+            result = erpnext.get_low_stock_items(high_below=20, medium_max=58, top_n=5)
+
+        self.assertEqual(result["count"], 5)
+        self.assertEqual([row["actual_qty"] for row in result["data"]], [0, 2, 4, 6, 8])
+        self.assertEqual(result["high_count"], 10)
+        self.assertEqual(result["medium_count"], 20)
+        self.assertEqual(result["total_count"], 30)
+
+    def test_unmonitored_warehouse_skips_erpnext(self):
+        with patch.object(erpnext, "ERP_URL", "http://erp.test"), \
+                patch.object(erpnext, "fetch_list") as mock_fetch:
+            result = erpnext.get_low_stock_items(warehouse="Elsewhere")
+
+        self.assertEqual(result["count"], 0)
+        mock_fetch.assert_not_called()
+
+    def test_empty_results_do_not_share_rows(self):
+        with patch.object(erpnext, "ERP_URL", "http://erp.test"):
+            first = erpnext.get_low_stock_items(warehouse="Elsewhere")
+            first["data"].append("row")
+            second = erpnext.get_low_stock_items(warehouse="Elsewhere")
+
+        self.assertEqual(second["data"], [])
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.cache = ResponseCache(
+            max_entries=2,
+            max_bytes=100,
+            default_ttl=10,
+            ttls={"Bin": 5},
+            clock=lambda: self.now
+        )
+
+    def test_entries_expire_after_doctype_ttl(self):
+        key = ResponseCache.make_key("Bin", {"limit_start": 0})
+        self.cache.put(key, ["row"], 10)
+        self.now = 4
+        self.assertEqual(self.cache.get(key), ["row"])
+        self.now = 6
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_key_depends_on_page(self):
+        first = ResponseCache.make_key("Bin", {"limit_start": 0})
+        second = ResponseCache.make_key("Bin", {"limit_start": 500})
+        self.assertNotEqual(first, second)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        keys = [ResponseCache.make_key("Sales Invoice", {"page": n}) for n in range(3)]
+        self.cache.put(keys[0], [0], 10)
+        self.cache.put(keys[1], [1], 10)
+        self.cache.get(keys[0])
+        self.cache.put(keys[2], [2], 10)
+
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertEqual(self.cache.get(keys[0]), [0])
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_size_is_bounded_by_bytes(self):
+        keys = [ResponseCache.make_key("Sales Invoice", {"page": n}) for n in range(2)]
+        self.cache.put(keys[0], [0], 60)
+        self.cache.put(keys[1], [1], 60)
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["bytes"], 60)
+
+    def test_hit_ratio(self):
+        key = ResponseCache.make_key("Bin", {})
+        self.cache.get(key)
+        self.cache.put(key, [], 1)
+        self.cache.get(key)
+        self.assertEqual(self.cache.stats()["hit_ratio"], 0.5)
+
+
+class TestSnapshotStore(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.store = SnapshotStore(max_age=10, max_keys=2, clock=lambda: self.now)
+        self.calls = 0
+
+    async def loader(self):
+        self.calls += 1
+        return {"version": self.calls}
+
+    def test_fresh_snapshot_is_served_without_loading(self):
+        async def scenario():
+            await self.store.get("overdue", self.loader)
+            self.now = 5
+            return await self.store.get("overdue", self.loader)
+
+        value, age = asyncio.run(scenario())
+        self.assertEqual(value, {"version": 1})
+        self.assertEqual(age, 5)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_snapshot_is_served_then_revalidated(self):
+        async def scenario():
+            await self.store.get("overdue", self.loader)
+            self.now = 15
+            stale, _ = await self.store.get("overdue", self.loader)
+            await asyncio.sleep(0)
+            fresh, age = await self.store.get("overdue", self.loader)
+            return stale, fresh, age
+
+        stale, fresh, age = asyncio.run(scenario())
+        self.assertEqual(stale, {"version": 1})
+        self.assertEqual(fresh, {"version": 2})
+        self.assertEqual(age, 0)
+
+    def test_failed_refresh_keeps_previous_value(self):
+        async def failing():
+            raise requests.exceptions.ConnectionError()
+
+        async def scenario():
+            await self.store.get("overdue", self.loader)
+            self.store.register("overdue", failing)
+            await self.store.refresh_all()
+            return await self.store.get("overdue", self.loader)
+
+        value, _ = asyncio.run(scenario())
+        self.assertEqual(value, {"version": 1})
+        self.assertTrue(self.store.failed("overdue"))
+
+        asyncio.run(self.store.refresh("overdue"))
+        self.assertFalse(self.store.failed("overdue"))
+
+    def test_etag_tracks_content_not_refreshes(self):
+        async def same():
+            return {"version": 1}
+
+        async def scenario():
+            self.assertIsNone(self.store.etag("overdue"))
+            await self.store.get("overdue", self.loader)
+            first = self.store.etag("overdue")
+            self.store.register("overdue", same)
+            await self.store.refresh("overdue")
+            unchanged = self.store.etag("overdue")
+            self.store.register("overdue", self.loader)
+            await self.store.refresh("overdue")
+            return first, unchanged, self.store.etag("overdue")
+
+        first, unchanged, changed = asyncio.run(scenario())
+        self.assertEqual(first, unchanged)
+        self.assertNotEqual(first, changed)
+
+    def test_keys_are_bounded(self):
+        async def scenario():
+            for key in ["a", "b", "c"]:
+                await self.store.get(key, self.loader)
+
+        asyncio.run(scenario())
+        self.assertNotIn("a", self.store._snapshots)
+        self.assertEqual(len(self.store._snapshots), 2)
+
+    def test_reads_do_not_register_background_refreshes(self):
+        async def scenario():
+            self.store.register("dashboard", self.loader)
+            for key in ["a", "b", "c"]:
+                await self.store.get(key, self.loader)
+            self.calls = 0
+            await self.store.refresh_all()
+
+        asyncio.run(scenario())
+        self.assertEqual(self.store.registered(), ["dashboard"])
+        self.assertEqual(self.calls, 1)
+        # Ad-hoc keys are evicted before registered ones
+        self.assertIn("dashboard", self.store._snapshots)
+        self.assertNotIn("a", self.store._loaders)
+
+    def test_background_refreshes_are_capped(self):
+        store = SnapshotStore(max_refreshed=2)
+        for key in ["a", "b", "c"]:
+            store.register(key, self.loader)
+
+        self.assertEqual(store.registered(), ["b", "c"])
+
+
+class TestOverdueFilterPushdown(unittest.TestCase):
+
+    def test_amount_and_day_bounds_become_erpnext_filters(self):
+        today = date(2024, 3, 31)
+        range_filters = erpnext._overdue_range_filters(
+            today, min_amount=100, max_amount=500, min_days=10, max_days=30
+        )
+        params = erpnext._overdue_invoice_params(today, "Customer A", range_filters)
+
+        self.assertIn('["outstanding_amount", ">=", 100]', params["filters"])
+        self.assertIn('["outstanding_amount", "<=", 500]', params["filters"])
+        self.assertIn('["due_date", "<=", "2024-03-21"]', params["filters"])
+        self.assertIn('["due_date", ">=", "2024-03-01"]', params["filters"])
+        self.assertIn('["customer", "=", "Customer A"]', params["filters"])
+
+    def test_fetcher_sends_bounds_upstream(self):
+        with patch.object(erpnext, "ERP_URL", "http://erp.test"), \
+                patch.object(erpnext, "fetch_list", return_value=[]) as mock_fetch:
+            erpnext.get_overdue_invoices(min_amount=250)
+
+        self.assertIn('["outstanding_amount", ">=", 250]', mock_fetch.call_args.args[1]["filters"])
+
+    def test_local_paths_apply_the_same_bounds(self):
+        row = {"name": "INV-1", "due_date": "2000-01-01", "outstanding_amount": 50}
+        self.assertTrue(sync.matches_filters(row, [["outstanding_amount", "<=", 100]]))
+        self.assertFalse(sync.matches_filters(row, [["outstanding_amount", ">=", 100]]))
+
+
+class TestInvoiceWorkingSet(unittest.TestCase):
+
+    def invoice(self, name, modified, status="Overdue", docstatus=1, outstanding=100, due_days_ago=20):
+        return {
+            "name": name,
+            "customer": "Customer A",
+            "due_date": (date.today() - timedelta(days=due_days_ago)).isoformat(),
+            "status": status,
+            "docstatus": docstatus,
+            "outstanding_amount": outstanding,
+            "modified": modified
+        }
+
+    def test_first_sync_is_full_load_then_deltas(self):
+        working_set = InvoiceWorkingSet()
+        self.assertNotIn("modified", working_set.sync_params()["filters"])
+
+        working_set.apply([self.invoice("INV-1", "2024-01-01 10:00:00.000000")])
+        self.assertIn('["modified", ">=", "2024-01-01 10:00:00.000000"]', working_set.sync_params()["filters"])
+
+    def test_paid_and_cancelled_invoices_are_evicted(self):
+        working_set = InvoiceWorkingSet()
+        working_set.apply([
+            self.invoice("INV-1", "2024-01-01 10:00:00"),
+            self.invoice("INV-2", "2024-01-01 10:00:01"),
+            self.invoice("INV-3", "2024-01-01 10:00:02")
+        ])
+        working_set.apply([
+            self.invoice("INV-1", "2024-01-02 09:00:00", status="Paid", outstanding=0),
+            self.invoice("INV-2", "2024-01-02 09:00:01", status="Cancelled", docstatus=2)
+        ])
+
+        self.assertEqual(list(working_set.rows), ["INV-3"])
+        self.assertEqual(working_set.watermark, "2024-01-02 09:00:01")
+
+    def test_overdue_invoices_score_from_working_set(self):
+        first_load = [
+            self.invoice("INV-1", "2024-01-01 10:00:00", due_days_ago=30),
+            self.invoice("INV-2", "2024-01-01 10:00:01", due_days_ago=10)
+        ]
+        delta = [self.invoice("INV-1", "2024-01-02 10:00:00", status="Paid", outstanding=0)]
+
+        with patch.multiple(erpnext, ERP_URL="http://erp.test", INVOICE_SYNC=True,
+                            invoice_working_set=InvoiceWorkingSet()), \
+                patch.object(erpnext, "fetch_list", side_effect=[first_load, delta]) as mock_fetch:
+            first = erpnext.get_overdue_invoices(limit=10)
+            second = erpnext.get_overdue_invoices(limit=10)
+
+        self.assertEqual(first["kpis"]["overdue_invoices_count"], 2)
+        self.assertEqual(second["kpis"]["overdue_invoices_count"], 1)
+        self.assertEqual(second["data"][0]["invoice_id"], "INV-2")
+        self.assertFalse(mock_fetch.call_args_list[1].kwargs["use_cache"])
+
+
+class TestLocalMirror(unittest.TestCase):
+
+    def setUp(self):
+        self.mirror = LocalMirror(":memory:")
+
+    def tearDown(self):
+        self.mirror.close()
+
+    def test_apply_keeps_open_documents_and_filters_locally(self):
+        self.mirror.apply("Sales Invoice", [
+            {"name": "INV-1", "customer": "A", "due_date": "2000-01-01", "status": "Overdue",
+             "outstanding_amount": 10, "docstatus": 1, "modified": "2024-01-01 00:00:01"},
+            {"name": "INV-2", "customer": "B", "due_date": "2000-01-02", "status": "Overdue",
+             "outstanding_amount": 10, "docstatus": 1, "modified": "2024-01-01 00:00:02"},
+            {"name": "INV-3", "customer": "A", "due_date": "2000-01-03", "status": "Paid",
+             "outstanding_amount": 0, "docstatus": 1, "modified": "2024-01-01 00:00:03"}
+        ])
+
+        rows = self.mirror.overdue_invoices(date.today(), customer="A")
+        self.assertEqual([row["name"] for row in rows], ["INV-1"])
+        self.assertIn('"modified", ">=", "2024-01-01 00:00:03"', self.mirror.sync_params("Sales Invoice")["filters"])
+
+    def test_low_stock_query_applies_warehouse_and_threshold(self):
+        self.mirror.apply("Bin", [
+            {"name": "B1", "item_code": "I1", "warehouse": "Stores - SD", "actual_qty": 80},
+            {"name": "B2", "item_code": "I2", "warehouse": "Stores - SD", "actual_qty": 5},
+            {"name": "B3", "item_code": "I3", "warehouse": "Other", "actual_qty": 1}
+        ])
+
+        rows = self.mirror.low_stock_bins(["Stores - SD"], max_qty=60)
+        self.assertEqual([row["name"] for row in rows], ["B2"])
+
+    def test_freshness_requires_every_doctype_synced(self):
+        self.mirror.mark_synced("Sales Invoice")
+        self.assertIsNone(self.mirror.freshness())
+        self.mirror.mark_synced("Bin")
+        self.mirror.mark_synced("Purchase Order")
+        self.assertLess(self.mirror.freshness(), 5)
+
+    def test_fetchers_read_from_mirror_after_first_sync(self):
+        pages = {
+            "Sales Invoice": [],
+            "Bin": [{"name": "B1", "item_code": "I1", "warehouse": "Stores - SD", "actual_qty": 3}],
+            "Purchase Order": []
+        }
+
+        def fake_fetch(doctype, params, use_cache=True, record=None):
+            return pages[doctype] if params["limit_start"] == 0 else []
+
+        with patch.multiple(erpnext, ERP_URL="http://erp.test", local_mirror=self.mirror), \
+                patch.object(erpnext, "fetch_list", side_effect=fake_fetch) as mock_fetch:
+            first = erpnext.get_low_stock_items()
+            calls_after_first = mock_fetch.call_count
+            second = erpnext.get_low_stock_items()
+
+        self.assertEqual(first["data"][0]["item_code"], "I1")
+        self.assertEqual(second, first)
+        self.assertEqual(mock_fetch.call_count, calls_after_first)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -86,8 +86,13 @@ def test_get_bin_stock_real():
         # ERPNext allows negative stock → just validate type
         assert isinstance(item["total_qty"], (int, float))
 
-        assert "warehouses" in item
-        assert isinstance(item["warehouses"], list)
+        assert "warehouse_count" in item
+        assert item["warehouse_count"] >= 1
+
+        # Warehouse breakdown is loaded per item and adds up to the total
+        breakdown = get_bin_stock(item_code=item["item_code"])
+        assert breakdown["count"] == item["warehouse_count"]
+        assert sum(row["actual_qty"] for row in breakdown["data"]) == pytest.approx(item["total_qty"])
 
 
 
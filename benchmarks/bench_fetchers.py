@@ -0,0 +1,212 @@
+"""
+Benchmark: the four risk fetchers end-to-end over synthetic datasets.
+
+Run from the repository root (or `make bench`):
+
+    python -m benchmarks.bench_fetchers
+    python -m benchmarks.bench_fetchers --sizes 1000,100000 --compare benchmarks/results/<old>.json
+
+get_overdue_invoices, get_bin_stock, get_low_stock_items and
+get_delayed_purchase_orders run against benchmarks.synthetic datasets
+of each size, served through a requests transport adapter mounted on
+the shared ERPNext session, so paging, decoding, scoring and the
+response cache run exactly as in production (the cache is cleared
+before every run). For each fetcher and size the results record:
+
+- wall_ms: best wall time of --repeat runs
+- transport_ms: part of wall_ms spent answering queries in the fake
+  transport (not radar code)
+- alloc_peak_mb: peak Python memory allocated during one run
+  (tracemalloc)
+- max_rss_mb: peak resident size of the process so far
+
+Results are written as JSON (with the git commit) to --output;
+--compare prints the wall time ratio against an earlier results file and
+exits non-zero if any ratio exceeds --max-regression (timings under
+NOISE_FLOOR_MS are not flagged).
+"""
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from unittest.mock import patch
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+from benchmarks import synthetic
+from services import erpnext
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+REPEAT = 3
+BASE_URL = "http://erp.bench"
+RESULTS_DIR = Path(__file__).parent / "results"
+# Timings below this are too noisy to flag as regressions
+NOISE_FLOOR_MS = 5
+
+FETCHERS = {
+    "get_overdue_invoices": lambda size: erpnext.get_overdue_invoices(limit=50),
+    "get_bin_stock": lambda size: erpnext.get_bin_stock(limit=100),
+    "get_low_stock_items": lambda size: erpnext.get_low_stock_items(),
+    "get_delayed_purchase_orders": lambda size: erpnext.get_delayed_purchase_orders(limit=size)
+}
+
+
+class SyntheticAdapter(BaseAdapter):
+    """requests transport answering /api/resource/<doctype> from Datasets."""
+
+    def __init__(self, datasets: dict):
+        super().__init__()
+        self.datasets = datasets
+        self.seconds = 0.0
+        self.requests = 0
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        url = urlsplit(request.url)
+        doctype = unquote(url.path.rsplit("/", 1)[-1])
+
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        dataset = self.datasets.get(doctype)
+        if dataset is None:
+            response.status_code = 404
+            response._content = b'{"exc_type": "DoesNotExistError"}'
+        else:
+            response.status_code = 200
+            response._content = dataset.list_body(dict(parse_qsl(url.query)))
+        response.headers["Content-Type"] = "application/json"
+
+        self.seconds += time.perf_counter() - started
+        self.requests += 1
+        return response
+
+    def close(self):
+        pass
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def max_rss_mb():
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def measure(fetch, size: int, adapter: SyntheticAdapter, repeat: int):
+    """Best wall time, its transport share and the allocation peak of fetch(size)."""
+    best = None
+    for _ in range(repeat):
+        erpnext.response_cache.clear()
+        adapter.seconds = 0.0
+        started = time.perf_counter()
+        fetch(size)
+        elapsed = time.perf_counter() - started
+        if best is None or elapsed < best[0]:
+            best = (elapsed, adapter.seconds)
+
+    erpnext.response_cache.clear()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    fetch(size)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    return {
+        "wall_ms": round(best[0] * 1000, 2),
+        "transport_ms": round(best[1] * 1000, 2),
+        "alloc_peak_mb": round(peak / (1024 * 1024), 2),
+        "max_rss_mb": max_rss_mb()
+    }
+
+
+def run(sizes, repeat: int):
+    results = []
+    with patch.multiple(
+        erpnext, ERP_URL=BASE_URL, API_KEY="bench", API_SECRET="bench", INVOICE_SYNC=False, local_mirror=None
+    ):
+        erpnext.close_session()
+        session = erpnext.get_session()
+        for size in sizes:
+            datasets = {doctype: synthetic.generate(doctype, size) for doctype in synthetic.DOCTYPES}
+            adapter = SyntheticAdapter(datasets)
+            session.mount(BASE_URL, adapter)
+            for name, fetch in FETCHERS.items():
+                adapter.requests = 0
+                row = {"fetcher": name, "rows": size, **measure(fetch, size, adapter, repeat)}
+                row["upstream_requests"] = adapter.requests // (repeat + 1)
+                results.append(row)
+                print(f"  {name:<28} {size:>9,} rows  {row['wall_ms']:>10.1f} ms"
+                      f"  (transport {row['transport_ms']:.1f} ms)"
+                      f"  alloc {row['alloc_peak_mb']:.1f} MB  rss {row['max_rss_mb']:.0f} MB")
+    erpnext.close_session()
+    return results
+
+
+def compare(results, baseline_path: Path, max_regression: float):
+    """Print wall time ratios against a previous run; return False on regression."""
+    baseline = {
+        (row["fetcher"], row["rows"]): row
+        for row in json.loads(baseline_path.read_text())["results"]
+    }
+    ok = True
+    print(f"compared with {baseline_path}")
+    for row in results:
+        old = baseline.get((row["fetcher"], row["rows"]))
+        if old is None or not old["wall_ms"]:
+            continue
+        ratio = row["wall_ms"] / old["wall_ms"]
+        regressed = ratio > max_regression and row["wall_ms"] >= NOISE_FLOOR_MS
+        flag = "  REGRESSION" if regressed else ""
+        ok = ok and not flag
+        print(f"  {row['fetcher']:<28} {row['rows']:>9,} rows  {ratio:5.2f}x{flag}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma-separated row counts")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="timed runs per measurement (best is kept)")
+    parser.add_argument("--output", type=Path, help="results file (default: benchmarks/results/fetchers-<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="earlier results file to compare with")
+    parser.add_argument("--max-regression", type=float, default=1.25, help="max allowed wall time ratio")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    commit = git_commit()
+    print(f"fetchers, best of {args.repeat}")
+    results = run(sizes, args.repeat)
+
+    output = args.output or RESULTS_DIR / f"fetchers-{commit or 'unknown'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "commit": commit,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "results": results
+    }, indent=2))
+    print(f"results written to {output}")
+
+    if args.compare and not compare(results, args.compare, args.max_regression):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
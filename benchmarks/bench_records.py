@@ -0,0 +1,104 @@
+"""
+Benchmark: memory held by 100k Sales Invoice rows as dicts vs records.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_records
+
+Both representations share the same field values, so the numbers
+compare only the per-row container overhead.
+"""
+import gc
+import sys
+import tracemalloc
+from datetime import date, timedelta
+
+from services.records import OverdueInvoice, SalesInvoiceRecord
+
+ROWS = 100_000
+TODAY = date(2026, 1, 31)
+
+
+def make_rows(n: int):
+    return [
+        {
+            "name": f"ACC-SINV-{i:07d}",
+            "customer": f"Customer {i % 500}",
+            "posting_date": (TODAY - timedelta(days=60 + i % 90)).isoformat(),
+            "due_date": (TODAY - timedelta(days=i % 90)).isoformat(),
+            "status": "Overdue",
+            "outstanding_amount": float(i % 9000),
+            "grand_total": float(i % 9000),
+            "currency": "SAR",
+            "docstatus": 1,
+            "modified": "2026-01-30 10:00:00.000000"
+        }
+        for i in range(n)
+    ]
+
+
+def scored_dict(inv):
+    return {
+        "invoice_id": inv["name"],
+        "customer": inv["customer"],
+        "posting_date": inv["posting_date"],
+        "due_date": inv["due_date"],
+        "days_overdue": 10,
+        "status": inv["status"],
+        "outstanding_amount": inv["outstanding_amount"],
+        "grand_total": inv["grand_total"],
+        "currency": inv["currency"],
+        "risk_level": "Medium"
+    }
+
+
+def scored_record(inv):
+    return OverdueInvoice(
+        invoice_id=inv.name,
+        customer=inv.customer,
+        posting_date=inv.posting_date,
+        due_date=inv.due_date,
+        days_overdue=10,
+        status=inv.status,
+        outstanding_amount=inv.outstanding_amount,
+        grand_total=inv.grand_total,
+        currency=inv.currency,
+        risk_level="Medium"
+    )
+
+
+def measure(build):
+    """Bytes allocated and still held by the result of build()."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, held
+
+
+def main():
+    source = make_rows(ROWS)
+
+    # Upstream rows: copy the dicts so both sides allocate their containers
+    dicts, dict_bytes = measure(lambda: [dict(row) for row in source])
+    records, record_bytes = measure(lambda: [SalesInvoiceRecord.from_dict(row) for row in source])
+
+    # Scored response rows built from each representation
+    _, scored_dict_bytes = measure(lambda: [scored_dict(inv) for inv in dicts])
+    _, scored_record_bytes = measure(lambda: [scored_record(inv) for inv in records])
+
+    print(f"{ROWS} rows")
+    print(f"  one dict  : {sys.getsizeof(dicts[0]):>5} B   one record: {sys.getsizeof(records[0]):>5} B")
+    for label, old, new in (
+        ("upstream rows", dict_bytes, record_bytes),
+        ("scored rows", scored_dict_bytes, scored_record_bytes)
+    ):
+        print(
+            f"  {label:<14} dicts {old / 2**20:7.1f} MiB   records {new / 2**20:7.1f} MiB"
+            f"   ({1 - new / old:.0%} less)"
+        )
+
+
+if __name__ == "__main__":
+    main()
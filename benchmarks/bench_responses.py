@@ -0,0 +1,83 @@
+"""
+Benchmark: serializing and compressing a 5k-row /invoices/overdue body.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_responses
+
+"stdlib" is FastAPI's default path (jsonable_encoder + json.dumps);
+"orjson" is services.http.ORJSONResponse as used by json_response.
+"""
+import gzip
+import time
+from datetime import date, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from services import http
+from services.records import OverdueInvoice
+
+ROWS = 5_000
+REPEAT = 20
+TODAY = date(2026, 1, 31)
+
+
+def make_payload(n: int):
+    data = [
+        OverdueInvoice(
+            invoice_id=f"ACC-SINV-{i:07d}",
+            customer=f"Customer {i % 500}",
+            posting_date=(TODAY - timedelta(days=60 + i % 90)).isoformat(),
+            due_date=(TODAY - timedelta(days=8 + i % 90)).isoformat(),
+            days_overdue=8 + i % 90,
+            status="Overdue",
+            outstanding_amount=float(i % 9000) + 0.5,
+            grand_total=float(i % 9000) + 0.5,
+            currency="SAR",
+            risk_level="High" if i % 90 >= 7 else "Medium"
+        )
+        for i in range(n)
+    ]
+    return {
+        "kpis": {"overdue_invoices_count": n, "total_outstanding_overdue_amount": 0, "most_overdue_days": 97},
+        "count": n,
+        "medium_count": 0,
+        "high_count": n,
+        "data": data,
+        "snapshot_age_seconds": 1.5
+    }
+
+
+def best_of(fn):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    payload = make_payload(ROWS)
+
+    stdlib_body, stdlib_time = best_of(lambda: JSONResponse(jsonable_encoder(payload)).body)
+    orjson_body, orjson_time = best_of(lambda: http.ORJSONResponse(payload).body)
+
+    print(f"{ROWS} rows, best of {REPEAT}")
+    print(f"  serialize  stdlib {stdlib_time * 1000:7.1f} ms   orjson {orjson_time * 1000:7.1f} ms"
+          f"   ({stdlib_time / orjson_time:.0f}x)")
+    print(f"  identity   {len(orjson_body):>9,} bytes")
+
+    encodings = ["gzip"] + (["br"] if http.brotli else [])
+    for encoding in encodings:
+        body, elapsed = best_of(lambda: http.compress(orjson_body, encoding))
+        print(f"  {encoding:<9}  {len(body):>9,} bytes   {elapsed * 1000:6.1f} ms"
+              f"   ({len(body) / len(orjson_body):.1%} of identity)")
+
+    assert gzip.decompress(http.compress(orjson_body, "gzip")) == orjson_body
+
+
+if __name__ == "__main__":
+    main()
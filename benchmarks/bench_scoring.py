@@ -0,0 +1,105 @@
+"""
+Benchmark: row-by-row vs vectorized overdue invoice scoring.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_scoring
+
+The row-by-row baseline is the loop get_overdue_invoices used before
+services.scoring; it is kept here only as the reference to compare with.
+"""
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from services import scoring
+
+SIZES = (10_000, 100_000, 1_000_000)
+TODAY = date(2026, 1, 31)
+
+
+def make_invoices(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [
+        {
+            "name": f"ACC-SINV-{i:07d}",
+            "customer": f"Customer {i % 500}",
+            "due_date": (TODAY - timedelta(days=rng.randint(1, 120))).isoformat(),
+            "outstanding_amount": round(rng.uniform(10, 50_000), 2)
+        }
+        for i in range(n)
+    ]
+
+
+def loop_score(rows, days_medium_min=8, days_medium_max=14, days_high_min=15):
+    """Previous per-row scoring: counts, outstanding total, most overdue days."""
+    medium = high = 0
+    total = 0
+    most_overdue = 0
+    for inv in rows:
+        due_date_str = inv.get("due_date")
+        if not due_date_str:
+            continue
+        try:
+            due_date = datetime.strptime(due_date_str, "%Y-%m-%d").date()
+        except ValueError:
+            continue
+        days_overdue = (TODAY - due_date).days
+        if days_overdue >= days_high_min:
+            high += 1
+        elif days_medium_min <= days_overdue <= days_medium_max:
+            medium += 1
+        else:
+            continue
+        total += inv.get("outstanding_amount") or 0
+        most_overdue = max(most_overdue, days_overdue)
+    return medium, high, total, most_overdue
+
+
+def vectorized_score(due_days, amounts, days_medium_min=8, days_medium_max=14, days_high_min=15):
+    days_overdue, buckets = scoring.score_overdue(
+        due_days, TODAY, days_medium_min, days_medium_max, days_high_min
+    )
+    medium, high, total, worst = scoring.overdue_kpis(days_overdue, amounts, buckets)
+    return medium, high, total, int(days_overdue[worst]) if worst is not None else 0
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    # speedup compares like for like (the loop parses dates inside its own
+    # timing); kernel is the NumPy scoring step alone
+    print(f"{'rows':>10} {'loop (s)':>10} {'columns (s)':>12} {'numpy (s)':>10} {'speedup':>8} {'kernel':>8}")
+    for n in SIZES:
+        rows = make_invoices(n)
+
+        expected, loop_time = timed(loop_score, rows)
+
+        # Column extraction is timed separately: one pass over the rows per
+        # column, then date parsing / float conversion into NumPy arrays,
+        # as the scorers do with decoded records.
+        (due_days, amounts), column_time = timed(
+            lambda: (
+                scoring.date_column([inv["due_date"] for inv in rows]),
+                scoring.float_column([inv["outstanding_amount"] for inv in rows])
+            )
+        )
+        result, numpy_time = timed(vectorized_score, due_days, amounts)
+
+        assert result[:2] == expected[:2] and result[3] == expected[3]
+        assert np.isclose(result[2], expected[2])
+
+        print(
+            f"{n:>10} {loop_time:>10.3f} {column_time:>12.3f} {numpy_time:>10.4f} "
+            f"{loop_time / (column_time + numpy_time):>7.1f}x {loop_time / numpy_time:>7.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Concurrent load generator for the risk API.
+
+Drives /invoices/overdue, /inventory/low-stock, /purchase-orders/delayed
+and /stock-ledger with a weighted request mix from --concurrency
+workers for --duration seconds, then reports throughput, p50/p95/p99
+latency and error rate per endpoint and overall.
+
+Against a running API:
+
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --concurrency 50 --duration 30
+
+Or self-contained (`make loadtest`): --spawn starts the ERPNext
+stand-in (benchmarks.standin) and one uvicorn worker of app.py pointed
+at it, runs the test and stops both:
+
+    python -m benchmarks.loadgen --spawn --rows 100000 --concurrency 50 --mix overdue=3,low_stock=1
+
+--max-p95-ms, --max-p99-ms, --max-error-rate and --min-rps turn the run
+into a check: the exit status is 1 if any threshold is exceeded.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import httpx
+
+ENDPOINTS = {
+    "overdue": "/invoices/overdue?limit=100",
+    "low_stock": "/inventory/low-stock?top_n=50",
+    "delayed": "/purchase-orders/delayed?limit=100",
+    "stock_ledger": "/stock-ledger?limit=100"
+}
+DEFAULT_MIX = "overdue=1,low_stock=1,delayed=1,stock_ledger=1"
+
+API_PORT = 8010
+STANDIN_PORT = 8011
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_mix(mix: str):
+    """"overdue=3,low_stock=1" -> {"overdue": 3.0, "low_stock": 1.0}."""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r}; choose from {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(sorted_values, p: float):
+    """Nearest-rank percentile of an ascending list (p in 0-100)."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, errors: int, elapsed: float):
+    """Throughput, latency percentiles (ms) and error rate of one sample set."""
+    latencies = sorted(latencies)
+    total = len(latencies)
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None)
+    }
+
+
+async def run_load(url: str, weights: dict, concurrency: int, duration: float, timeout: float, seed: int = 7):
+    """Run the load test; return {"overall": ..., "endpoints": {...}}."""
+    names = list(weights)
+    mix_weights = list(weights.values())
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    rng = random.Random(seed)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                name = rng.choices(names, mix_weights)[0]
+                started = time.perf_counter()
+                try:
+                    response = await client.get(ENDPOINTS[name])
+                    await response.aread()
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                samples[name].append(time.perf_counter() - started)
+                errors[name] += failed
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    every = [latency for name in names for latency in samples[name]]
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "concurrency": concurrency,
+        "overall": summarize(every, sum(errors.values()), elapsed),
+        "endpoints": {name: summarize(samples[name], errors[name], elapsed) for name in names}
+    }
+
+
+def check_thresholds(overall: dict, max_p95_ms=None, max_p99_ms=None, max_error_rate=None, min_rps=None):
+    """Return the list of exceeded thresholds (empty if the run passes)."""
+    failures = []
+    if max_p95_ms is not None and (overall["p95_ms"] or 0) > max_p95_ms:
+        failures.append(f"p95 {overall['p95_ms']} ms > {max_p95_ms} ms")
+    if max_p99_ms is not None and (overall["p99_ms"] or 0) > max_p99_ms:
+        failures.append(f"p99 {overall['p99_ms']} ms > {max_p99_ms} ms")
+    if max_error_rate is not None and overall["error_rate"] > max_error_rate:
+        failures.append(f"error rate {overall['error_rate']:.2%} > {max_error_rate:.2%}")
+    if min_rps is not None and overall["rps"] < min_rps:
+        failures.append(f"throughput {overall['rps']} req/s < {min_rps} req/s")
+    return failures
+
+
+def print_report(report: dict):
+    print(f"{report['concurrency']} workers, {report['elapsed_s']} s")
+    print(f"  {'endpoint':<14} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8}")
+    rows = list(report["endpoints"].items()) + [("overall", report["overall"])]
+    for name, stats in rows:
+        print(f"  {name:<14} {stats['requests']:>9} {stats['rps']:>8} {stats['p50_ms'] or 0:>9} "
+              f"{stats['p95_ms'] or 0:>9} {stats['p99_ms'] or 0:>9} {stats['error_rate']:>8.2%}")
+
+
+def wait_until_up(url: str, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+@contextmanager
+def spawned_stack(rows: int, standin_args: list):
+    """Start the ERPNext stand-in and one API worker; yield the API URL."""
+    standin_url = f"http://127.0.0.1:{STANDIN_PORT}"
+    api_url = f"http://127.0.0.1:{API_PORT}"
+    env = {**os.environ, "ERP_URL": standin_url, "ERP_API_KEY": "bench", "ERP_API_SECRET": "bench"}
+
+    processes = [subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.standin", "--port", str(STANDIN_PORT), "--rows", str(rows), *standin_args],
+        cwd=ROOT
+    )]
+    try:
+        wait_until_up(f"{standin_url}/standin/stats")
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--port", str(API_PORT), "--log-level", "warning"],
+            cwd=ROOT,
+            env=env
+        ))
+        wait_until_up(f"{api_url}/health")
+        yield api_url
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load generator for the risk API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API base URL")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent workers")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--warmup", type=float, default=2, help="unmeasured seconds before the run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weighted endpoints, e.g. overdue=3,low_stock=1")
+    parser.add_argument("--timeout", type=float, default=30, help="per-request timeout (counted as error)")
+    parser.add_argument("--output", type=Path, help="write the report as JSON")
+    parser.add_argument("--max-p95-ms", type=float)
+    parser.add_argument("--max-p99-ms", type=float)
+    parser.add_argument("--max-error-rate", type=float, help="e.g. 0.01 for 1%%")
+    parser.add_argument("--min-rps", type=float)
+    parser.add_argument("--spawn", action="store_true", help="start the stand-in and an API worker")
+    parser.add_argument("--rows", type=int, default=10_000, help="stand-in rows per doctype (with --spawn)")
+    parser.add_argument("--standin-args", default="", help="extra stand-in options (with --spawn)")
+    args = parser.parse_args(argv)
+
+    weights = parse_mix(args.mix)
+
+    def load(url):
+        if args.warmup > 0:
+            asyncio.run(run_load(url, weights, args.concurrency, args.warmup, args.timeout))
+        return asyncio.run(run_load(url, weights, args.concurrency, args.duration, args.timeout))
+
+    if args.spawn:
+        with spawned_stack(args.rows, args.standin_args.split()) as url:
+            report = load(url)
+    else:
+        report = load(args.url)
+
+    print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    failures = check_thresholds(
+        report["overall"], args.max_p95_ms, args.max_p99_ms, args.max_error_rate, args.min_rps
+    )
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
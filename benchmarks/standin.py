@@ -0,0 +1,174 @@
+"""
+Local stand-in for the ERPNext REST API.
+
+Serves GET /api/resource/<doctype> for Sales Invoice, Bin and Purchase
+Order from benchmarks.synthetic datasets, honoring fields, filters,
+order_by, group_by, limit_start, limit_page_length and as_dict. Response
+latency, slow responses and error responses can be injected, so the
+radar's real HTTP path can be load-tested and benchmarked without the
+docker-compose ERPNext stack.
+
+Run from the repository root (or `make standin`):
+
+    python -m benchmarks.standin --rows 100000 --latency 0.05 --error-rate 0.01
+
+then point the API at it:
+
+    ERP_URL=http://127.0.0.1:8001 ERP_API_KEY=bench ERP_API_SECRET=bench uvicorn app:app
+
+GET /standin/stats returns request and injected fault counters.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import orjson
+from fastapi import FastAPI, Request, Response
+
+from benchmarks import synthetic
+
+
+class Faults:
+    """Injected latency and failures, drawn from a seeded RNG."""
+
+    def __init__(
+        self,
+        latency: float = 0,
+        jitter: float = 0,
+        error_rate: float = 0,
+        error_status: int = 503,
+        slow_rate: float = 0,
+        slow_seconds: float = 30,
+        seed: int = 7
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_rate = slow_rate
+        self.slow_seconds = slow_seconds
+        self._rng = random.Random(seed)
+
+    def delay(self):
+        """Seconds to wait before answering, and whether it is an injected slow call."""
+        if self.slow_rate and self._rng.random() < self.slow_rate:
+            return self.slow_seconds, True
+        return max(self.latency + self._rng.uniform(-self.jitter, self.jitter), 0), False
+
+    def error(self):
+        """True if this request should fail with error_status."""
+        return bool(self.error_rate) and self._rng.random() < self.error_rate
+
+
+def create_app(datasets: dict, faults: Faults = None, api_key: str = None, api_secret: str = None):
+    """
+    Build the stand-in ASGI app.
+
+    With api_key set, requests without a matching
+    `Authorization: token key:secret` header get 401 like ERPNext (the
+    secret is only checked if api_secret is set too).
+    """
+    faults = faults or Faults()
+
+    def authorized(header: str):
+        if not api_key:
+            return True
+        key, _, secret = (header or "").removeprefix("token ").partition(":")
+        return key == api_key and (api_secret is None or secret == api_secret)
+
+    stats = {"requests": 0, "rows": 0, "errors": 0, "slow": 0, "unauthorized": 0}
+    app = FastAPI(title="ERPNext stand-in")
+
+    def error(status_code: int, exc_type: str, message: str):
+        return Response(
+            orjson.dumps({"exc_type": exc_type, "message": message}),
+            status_code=status_code,
+            media_type="application/json"
+        )
+
+    @app.get("/api/resource/{doctype}")
+    async def resource_list(doctype: str, request: Request):
+        stats["requests"] += 1
+        if not authorized(request.headers.get("authorization")):
+            stats["unauthorized"] += 1
+            return error(401, "AuthenticationError", "Invalid API key")
+
+        seconds, slow = faults.delay()
+        stats["slow"] += slow
+        if seconds:
+            await asyncio.sleep(seconds)
+        if faults.error():
+            stats["errors"] += 1
+            return error(faults.error_status, "InjectedError", "Injected failure")
+
+        dataset = datasets.get(doctype)
+        if dataset is None:
+            return error(404, "DoesNotExistError", f"DocType {doctype} not found")
+        try:
+            rows = dataset.query(dict(request.query_params))
+        except (KeyError, ValueError) as e:
+            return error(417, "DataError", str(e))
+
+        stats["rows"] += len(rows)
+        return Response(orjson.dumps({"data": rows}), media_type="application/json")
+
+    @app.get("/standin/stats")
+    async def standin_stats():
+        return {**stats, "rows_per_doctype": {doctype: d.size for doctype, d in datasets.items()}}
+
+    return app
+
+
+def build_datasets(invoices: int, bins: int, purchase_orders: int, seed: int = 7):
+    """Generate the three synthetic datasets."""
+    sizes = {"Sales Invoice": invoices, "Bin": bins, "Purchase Order": purchase_orders}
+    return {doctype: synthetic.generate(doctype, n, seed=seed) for doctype, n in sizes.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local ERPNext REST stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--rows", type=int, default=10_000, help="rows per doctype")
+    parser.add_argument("--invoices", type=int, help="Sales Invoice rows (default: --rows)")
+    parser.add_argument("--bins", type=int, help="Bin rows (default: --rows)")
+    parser.add_argument("--purchase-orders", type=int, help="Purchase Order rows (default: --rows)")
+    parser.add_argument("--latency", type=float, default=0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0, help="+/- seconds of random latency")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="status of injected failures")
+    parser.add_argument("--slow-rate", type=float, default=0, help="fraction of requests that stall")
+    parser.add_argument("--slow-seconds", type=float, default=30, help="stall duration")
+    parser.add_argument("--api-key", help="require this API key (any key is accepted by default)")
+    parser.add_argument("--api-secret", help="require this API secret")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    datasets = build_datasets(
+        args.invoices or args.rows, args.bins or args.rows, args.purchase_orders or args.rows, args.seed
+    )
+    print(f"generated {sum(d.size for d in datasets.values()):,} rows in {time.perf_counter() - started:.1f}s")
+
+    faults = Faults(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        slow_rate=args.slow_rate,
+        slow_seconds=args.slow_seconds,
+        seed=args.seed
+    )
+
+    import uvicorn
+    uvicorn.run(
+        create_app(datasets, faults, args.api_key, args.api_secret),
+        host=args.host,
+        port=args.port,
+        log_level="warning"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Synthetic ERPNext datasets and a minimal Frappe list-query engine.
+
+generate(doctype, n) builds a seeded Sales Invoice, Bin or Purchase
+Order table of n rows, dated relative to today, with the fields the
+risk fetchers request. Dataset.list_body(params) answers a
+/api/resource/<doctype> query the way Frappe does, honoring fields
+(including "sum(x) as y" aggregates with group_by), filters, order_by,
+limit_start, limit_page_length and as_dict.
+
+Columns are NumPy arrays and the filtered, ordered row index of recent
+queries is cached, so walking a 1M-row table page by page does not
+re-filter it for every page.
+"""
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+import orjson
+
+DOCTYPES = ("Sales Invoice", "Bin", "Purchase Order")
+
+# Rows per page when a query has no limit_page_length (Frappe default)
+DEFAULT_PAGE_LENGTH = 20
+
+WAREHOUSES = np.array(["Finished Goods - SD", "Stores - SD", "Work In Progress - SD"])
+INVOICE_STATUSES = np.array(["Paid", "Unpaid", "Overdue", "Partly Paid"])
+PO_STATUSES = np.array(["To Receive", "To Receive and Bill", "To Bill", "Completed"])
+
+
+def _names(prefix: str, n: int, width: int = 7):
+    return np.char.add(prefix, np.char.zfill(np.arange(n).astype(str), width))
+
+
+def _dates(today: date, days_ago):
+    return np.datetime_as_string(np.datetime64(today, "D") - days_ago.astype("timedelta64[D]"), unit="D")
+
+
+def _modified(today: date, rng, n: int):
+    seconds = rng.integers(0, 30 * 86400, n).astype("timedelta64[s]")
+    stamps = np.datetime64(today, "s") - seconds
+    return np.char.replace(np.datetime_as_string(stamps, unit="s"), "T", " ")
+
+
+def _sales_invoices(n: int, rng, today: date):
+    grand_total = np.round(rng.uniform(100, 50_000, n), 2)
+    status = INVOICE_STATUSES[rng.choice(4, n, p=[0.3, 0.2, 0.4, 0.1])]
+    outstanding = np.where(status == "Paid", 0.0, np.round(grand_total * rng.uniform(0.1, 1, n), 2))
+    due_days_ago = rng.integers(-30, 150, n)
+    return {
+        "name": _names("ACC-SINV-", n),
+        "customer": np.char.add("Customer ", rng.integers(0, max(n // 20, 1), n).astype(str)),
+        "posting_date": _dates(today, due_days_ago + 30),
+        "due_date": _dates(today, due_days_ago),
+        "status": status,
+        "outstanding_amount": outstanding,
+        "grand_total": grand_total,
+        "currency": np.full(n, "SAR"),
+        "docstatus": rng.choice(np.array([0, 1, 2]), n, p=[0.05, 0.9, 0.05]),
+        "modified": _modified(today, rng, n)
+    }
+
+
+def _bins(n: int, rng, today: date):
+    # About three warehouses per item
+    return {
+        "name": _names("BIN-", n),
+        "item_code": np.char.add("ITEM-", np.char.zfill((np.arange(n) // 3).astype(str), 6)),
+        "warehouse": WAREHOUSES[np.arange(n) % len(WAREHOUSES)],
+        "actual_qty": np.round(rng.exponential(80, n)),
+        "docstatus": np.zeros(n, dtype=np.int64),
+        "modified": _modified(today, rng, n)
+    }
+
+
+def _purchase_orders(n: int, rng, today: date):
+    return {
+        "name": _names("PUR-ORD-", n),
+        "supplier": np.char.add("Supplier ", rng.integers(0, max(n // 50, 1), n).astype(str)),
+        "transaction_date": _dates(today, rng.integers(0, 60, n)),
+        "status": PO_STATUSES[rng.choice(4, n, p=[0.4, 0.2, 0.1, 0.3])],
+        "grand_total": np.round(rng.uniform(500, 200_000, n), 2),
+        "currency": np.full(n, "SAR"),
+        "per_received": rng.choice(np.array([0.0, 25.0, 50.0, 100.0]), n, p=[0.6, 0.1, 0.1, 0.2]),
+        "docstatus": rng.choice(np.array([0, 1, 2]), n, p=[0.05, 0.9, 0.05]),
+        "modified": _modified(today, rng, n)
+    }
+
+
+GENERATORS = {
+    "Sales Invoice": _sales_invoices,
+    "Bin": _bins,
+    "Purchase Order": _purchase_orders
+}
+
+
+def generate(doctype: str, n: int, seed: int = 7, today: date = None):
+    """Build a Dataset of n synthetic rows of doctype."""
+    rng = np.random.default_rng(seed)
+    return Dataset(GENERATORS[doctype](n, rng, today or date.today()))
+
+
+def _compare(column, op: str, value):
+    if op == "=":
+        return column == value
+    if op == "!=":
+        return column != value
+    if op == "<":
+        return column < value
+    if op == "<=":
+        return column <= value
+    if op == ">":
+        return column > value
+    if op == ">=":
+        return column >= value
+    if op == "in":
+        return np.isin(column, value)
+    if op == "not in":
+        return ~np.isin(column, value)
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+
+def parse_filters(filters):
+    """Normalize Frappe filters (list of lists or dict) to [field, op, value]."""
+    if isinstance(filters, str):
+        filters = orjson.loads(filters) if filters else []
+    if isinstance(filters, dict):
+        return [
+            [field, *value] if isinstance(value, list) else [field, "=", value]
+            for field, value in filters.items()
+        ]
+    # [doctype, field, op, value] is accepted too
+    return [f[-3:] for f in filters or []]
+
+
+def parse_order_by(order_by: str):
+    """"due_date asc, name desc" -> [("due_date", False), ("name", True)]."""
+    keys = []
+    for part in (order_by or "").split(","):
+        words = part.split()
+        if words:
+            keys.append((words[0].split(".")[-1].strip("`"), len(words) > 1 and words[1].lower() == "desc"))
+    return keys
+
+
+def parse_field(field: str):
+    """"sum(actual_qty) as total_qty" -> ("total_qty", "sum", "actual_qty")."""
+    expr, _, alias = field.partition(" as ")
+    expr = expr.strip()
+    if "(" in expr:
+        func, _, arg = expr.partition("(")
+        return (alias.strip() or expr), func.strip().lower(), arg.rstrip(")").strip()
+    return (alias.strip() or expr), None, expr
+
+
+class Dataset:
+    """Columnar table answering Frappe list queries."""
+
+    def __init__(self, columns: dict, cache_size: int = 8):
+        self.columns = columns
+        self.size = len(next(iter(columns.values())))
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+
+    def query(self, params: dict):
+        """Rows for a list query: lists in field order, or dicts with as_dict."""
+        fields = [parse_field(f) for f in orjson.loads(params.get("fields") or '["name"]')]
+        columns, order = self._resolve(params, fields)
+
+        start = int(params.get("limit_start") or 0)
+        length = int(params.get("limit_page_length", DEFAULT_PAGE_LENGTH) or 0)
+        page = order[start:start + length] if length else order[start:]
+
+        values = [columns[name][page].tolist() for name, _, _ in fields]
+        if str(params.get("as_dict", "1")) in ("0", "false", "False"):
+            return [list(row) for row in zip(*values)]
+        names = [name for name, _, _ in fields]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    def list_body(self, params: dict):
+        """Serialized {"data": rows} response body for a list query."""
+        return orjson.dumps({"data": self.query(params)})
+
+    def _resolve(self, params, fields):
+        """(columns, ordered row index) for the filter/group/order part of a query."""
+        group_by = params.get("group_by")
+        key = (params.get("filters"), params.get("order_by"), group_by, params.get("fields") if group_by else None)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        mask = np.ones(self.size, dtype=bool)
+        for field, op, value in parse_filters(params.get("filters")):
+            mask &= _compare(self.columns[field], op, value)
+        index = np.flatnonzero(mask)
+
+        if group_by:
+            columns = self._aggregate(index, group_by.strip(), fields)
+            index = np.arange(len(columns[group_by.strip()]))
+        else:
+            columns = self.columns
+
+        order_keys = parse_order_by(params.get("order_by"))
+        if order_keys:
+            ranks = []
+            for field, descending in reversed(order_keys):
+                _, rank = np.unique(columns[field][index], return_inverse=True)
+                ranks.append(-rank if descending else rank)
+            index = index[np.lexsort(ranks)]
+
+        self._cache[key] = (columns, index)
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return columns, index
+
+    def _aggregate(self, index, group_by: str, fields):
+        groups, inverse = np.unique(self.columns[group_by][index], return_inverse=True)
+        columns = {group_by: groups}
+        for name, func, arg in fields:
+            if func is None:
+                continue
+            if func == "count":
+                columns[name] = np.bincount(inverse, minlength=len(groups))
+            elif func == "sum":
+                columns[name] = np.bincount(inverse, weights=self.columns[arg][index], minlength=len(groups))
+            else:
+                raise ValueError(f"Unsupported aggregate: {func}")
+        return columns
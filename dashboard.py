@@ -2,48 +2,79 @@
 ERPNext Risk Radar - Dashboard Server
 Run this file to start the dashboard: python dashboard.py
 """
-from fastapi import FastAPI, HTTPException, Query
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from services.erpnext import get_sales_invoices, get_overdue_invoices, get_low_stock_items, get_delayed_purchase_orders
+from services.erpnext import (
+    get_sales_invoices_async,
+    get_overdue_invoices_async,
+    get_low_stock_items_async,
+    get_delayed_purchase_orders_async,
+    close_async_client
+)
+from services.breaker import CircuitOpenError
+from services.http import CompressionMiddleware, ORJSONResponse, json_response
 import requests
 import os
 
-app = FastAPI(title="ERPNext Risk Radar Dashboard")
+# Responses of at least this many bytes are brotli/gzip compressed
+COMPRESS_MIN_SIZE = int(os.getenv("RISK_COMPRESS_MIN_SIZE", "1024"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release pooled ERPNext connections on shutdown
+    await close_async_client()
+
+
+app = FastAPI(
+    title="ERPNext Risk Radar Dashboard",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESS_MIN_SIZE)
 
 # Static directory path
 static_dir = os.path.join(os.path.dirname(__file__), "static")
 
 
 @app.get("/")
-def dashboard():
+async def dashboard():
     """Serve the dashboard HTML"""
     return FileResponse(os.path.join(static_dir, "dashboard.html"))
 
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 
 @app.get("/invoices")
-def invoices(limit: int = 50):
+async def invoices(request: Request, limit: int = 50):
     """Fetch Sales Invoices from ERPNext."""
     try:
-        data = get_sales_invoices(limit=limit)
-        return {"count": len(data), "data": data}
+        data = await get_sales_invoices_async(limit=limit)
+        return json_response({"count": len(data), "data": data}, request=request)
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="ERPNext authentication failed")
         raise HTTPException(status_code=502, detail=f"ERPNext API error: {e}")
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="ERPNext is unavailable (circuit breaker open)")
+    except requests.exceptions.Timeout:
+        raise HTTPException(status_code=504, detail="ERPNext did not respond in time")
     except requests.exceptions.ConnectionError:
         raise HTTPException(status_code=502, detail="Cannot connect to ERPNext")
 
 
 @app.get("/invoices/overdue")
-def overdue_invoices(
+async def overdue_invoices(
+    request: Request,
     limit: int = Query(50, description="Max number of invoices to return"),
     customer: str = Query(None, description="Filter by customer name"),
     days_medium_max: int = Query(14, description="Max days for Medium risk"),
@@ -51,47 +82,63 @@ def overdue_invoices(
 ):
     """Fetch overdue Sales Invoices with risk scoring."""
     try:
-        return get_overdue_invoices(
+        return json_response(await get_overdue_invoices_async(
             limit=limit,
             customer=customer,
             days_medium_max=days_medium_max,
             days_high_min=days_high_min
-        )
+        ), request=request)
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="ERPNext authentication failed")
         raise HTTPException(status_code=502, detail=f"ERPNext API error: {e}")
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="ERPNext is unavailable (circuit breaker open)")
+    except requests.exceptions.Timeout:
+        raise HTTPException(status_code=504, detail="ERPNext did not respond in time")
     except requests.exceptions.ConnectionError:
         raise HTTPException(status_code=502, detail="Cannot connect to ERPNext")
 
 
 @app.get("/inventory/low-stock")
-def low_stock_items(
-    limit: int = Query(100, description="Max entries to fetch from ERPNext"),
+async def low_stock_items(
+    request: Request,
+    limit: int = Query(None, description="Max qualifying bins to scan (default: all)"),
     warehouse: str = Query(None, description="Filter by warehouse"),
-    item_code: str = Query(None, description="Filter by item code")
+    item_code: str = Query(None, description="Filter by item code"),
+    high_below: float = Query(30, description="High risk if actual_qty is below this"),
+    medium_max: float = Query(60, description="Medium risk up to and including this qty"),
+    top_n: int = Query(50, description="Number of lowest-stock rows to return")
 ):
     """Fetch inventory items with low stock risk scoring using Bin DocType."""
     try:
-        return get_low_stock_items(
+        return json_response(await get_low_stock_items_async(
             limit=limit,
             warehouse=warehouse,
-            item_code=item_code
-        )
+            item_code=item_code,
+            high_below=high_below,
+            medium_max=medium_max,
+            top_n=top_n
+        ), request=request)
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="ERPNext authentication failed")
         raise HTTPException(status_code=502, detail=f"ERPNext API error: {e}")
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="ERPNext is unavailable (circuit breaker open)")
+    except requests.exceptions.Timeout:
+        raise HTTPException(status_code=504, detail="ERPNext did not respond in time")
     except requests.exceptions.ConnectionError:
         raise HTTPException(status_code=502, detail="Cannot connect to ERPNext")
 
 
 @app.get("/purchase-orders/delayed")
-def delayed_purchase_orders(
+async def delayed_purchase_orders(
+    request: Request,
     limit: int = Query(100, description="Max POs to fetch from ERPNext")
 ):
     """
@@ -107,16 +154,78 @@ def delayed_purchase_orders(
     - High: > 14 days stuck
     """
     try:
-        return get_delayed_purchase_orders(limit=limit)
+        return json_response(await get_delayed_purchase_orders_async(limit=limit), request=request)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code == 401:
+            raise HTTPException(status_code=401, detail="ERPNext authentication failed")
+        raise HTTPException(status_code=502, detail=f"ERPNext API error: {e}")
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="ERPNext is unavailable (circuit breaker open)")
+    except requests.exceptions.Timeout:
+        raise HTTPException(status_code=504, detail="ERPNext did not respond in time")
+    except requests.exceptions.ConnectionError:
+        raise HTTPException(status_code=502, detail="Cannot connect to ERPNext")
+
+
+@app.get("/risk/summary")
+async def risk_summary(
+    request: Request,
+    limit: int = Query(100, description="Max rows per risk domain")
+):
+    """
+    Fetch all three risk domains concurrently in one call.
+
+    Same payload as app.py's /risk/summary, loaded live from ERPNext
+    (this server keeps no snapshots).
+    """
+    try:
+        invoices, low_stock, delayed_pos = await asyncio.gather(
+            get_overdue_invoices_async(limit=limit),
+            get_low_stock_items_async(top_n=limit),
+            get_delayed_purchase_orders_async(limit=limit)
+        )
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="ERPNext authentication failed")
         raise HTTPException(status_code=502, detail=f"ERPNext API error: {e}")
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="ERPNext is unavailable (circuit breaker open)")
+    except requests.exceptions.Timeout:
+        raise HTTPException(status_code=504, detail="ERPNext did not respond in time")
     except requests.exceptions.ConnectionError:
         raise HTTPException(status_code=502, detail="Cannot connect to ERPNext")
 
+    invoice_kpis = invoices.get("kpis", {})
+    return json_response({
+        "kpis": {
+            "overdue_invoices_count": invoice_kpis.get("overdue_invoices_count", invoices.get("count", 0)),
+            "total_outstanding_overdue_amount": invoice_kpis.get("total_outstanding_overdue_amount", 0),
+            "most_overdue_days": invoice_kpis.get("most_overdue_days", 0),
+            "low_stock_count": low_stock.get("total_count", low_stock.get("count", 0)),
+            "low_stock_high_count": low_stock.get("high_count", 0),
+            "delayed_po_count": delayed_pos.get("count", 0),
+            "delayed_po_high_count": delayed_pos.get("high_count", 0)
+        },
+        "overdue_invoices": invoices,
+        "low_stock": low_stock,
+        "delayed_purchase_orders": delayed_pos
+    }, request=request)
+
+
+@app.get("/events")
+async def risk_events():
+    """
+    No live risk feed on this server (it keeps no snapshots to diff).
+
+    204 tells the dashboard's EventSource to stop reconnecting, so the
+    page falls back to its periodic full refresh.
+    """
+    return Response(status_code=204)
+
 
 # Mount static files AFTER defining all routes
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
@@ -0,0 +1,102 @@
+"""
+Circuit breaker for ERPNext calls.
+
+After `failure_threshold` consecutive failures (connection errors,
+timeouts, 5xx responses or calls slower than `slow_call_seconds`) the
+breaker opens and calls fail fast with CircuitOpenError for
+`reset_timeout` seconds. Then a single trial call is let through
+(half-open): success closes the breaker, failure opens it again.
+"""
+import threading
+import time
+
+import requests
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling ERPNext while the breaker is open."""
+
+
+def is_upstream_failure(exc):
+    """True for errors that mean ERPNext is down or degraded (not 4xx)."""
+    if isinstance(exc, requests.exceptions.HTTPError):
+        response = exc.response
+        return response is None or response.status_code >= 500
+    return isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+class CircuitBreaker:
+    """Thread-safe consecutive-failure circuit breaker."""
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        slow_call_seconds: float = 10,
+        reset_timeout: float = 30,
+        clock=time.monotonic
+    ):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def is_open(self):
+        """True while calls are being rejected (open or probing)."""
+        return self.state != CLOSED
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go to ERPNext now."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self._clock() - self.opened_at >= self.reset_timeout:
+                # Let one trial call through; another one only if it never
+                # reports back within reset_timeout
+                self.state = HALF_OPEN
+                self.opened_at = self._clock()
+                return
+            self.rejected += 1
+            raise CircuitOpenError("ERPNext circuit breaker is open")
+
+    def record(self, duration: float, exc: Exception = None):
+        """Record the outcome of a call that before_call allowed."""
+        failed = (exc is not None and is_upstream_failure(exc)) or duration > self.slow_call_seconds
+        with self._lock:
+            if not failed:
+                self.state = CLOSED
+                self.failures = 0
+                return
+
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.trips += 1
+                self.state = OPEN
+                self.opened_at = self._clock()
+
+    def reset(self):
+        """Close the breaker and clear its counters."""
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self.rejected = 0
+            self.trips = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "trips": self.trips,
+                "rejected": self.rejected
+            }
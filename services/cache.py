@@ -0,0 +1,111 @@
+"""
+In-process response cache for ERPNext list queries.
+
+Entries expire after a per-doctype TTL and the cache is bounded both by
+entry count and by the size of the cached response bodies; the least
+recently used entries are evicted first.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """Thread-safe TTL + LRU cache of decoded ERPNext list pages."""
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_bytes: int = 32 * 1024 * 1024,
+        default_ttl: float = 30,
+        ttls: dict = None,
+        clock=time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(doctype: str, params: dict):
+        """
+        Build a cache key from the doctype and every query parameter
+        (fields, filters, order_by, limit_start, limit_page_length, ...).
+        """
+        return (doctype,) + tuple(sorted((k, str(v)) for k, v in params.items()))
+
+    def ttl_for(self, doctype: str):
+        """Return the TTL in seconds for a doctype."""
+        return self.ttls.get(doctype, self.default_ttl)
+
+    def get(self, key):
+        """Return the cached rows for key, or None on a miss/expiry."""
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, size, rows = entry
+            if expires_at <= now:
+                self._drop(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return rows
+
+    def put(self, key, rows, size: int):
+        """Store rows for key; size is the response body length in bytes."""
+        ttl = self.ttl_for(key[0])
+        if ttl <= 0 or size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+            self._entries[key] = (self._clock() + ttl, size, rows)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes
+            }
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
@@ -1,35 +1,589 @@
 import os
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+import httpx
+import numpy as np
+import orjson
 import requests
-from datetime import date, datetime
+from contextlib import contextmanager
+from datetime import date, timedelta
+from operator import itemgetter
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from services import metrics, scoring
+from services.breaker import CircuitBreaker, CircuitOpenError
+from services.cache import ResponseCache
+from services.singleflight import SingleFlight
+from services.mirror import LocalMirror, MIRRORED_DOCTYPES
+from services.records import (
+    BinRecord,
+    DelayedPurchaseOrder,
+    LowStockItem,
+    OverdueInvoice,
+    PurchaseOrderRecord,
+    SalesInvoiceRecord
+)
+from services.sync import InvoiceWorkingSet
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 ERP_URL = os.getenv("ERP_URL", "").rstrip("/")
 API_KEY = os.getenv("ERP_API_KEY")
 API_SECRET = os.getenv("ERP_API_SECRET")
 
+# HTTP client tuning (shared connection pool for every fetcher)
+POOL_SIZE = int(os.getenv("ERP_POOL_SIZE", "10"))
+CONNECT_TIMEOUT = float(os.getenv("ERP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("ERP_READ_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("ERP_MAX_RETRIES", "3"))
+RETRY_BACKOFF = float(os.getenv("ERP_RETRY_BACKOFF", "0.5"))
+RETRY_STATUSES = (429, 502, 503, 504)
+# Upper bound in seconds for one async list call, retries included
+CALL_DEADLINE = float(os.getenv("ERP_CALL_DEADLINE", "60"))
 
-def get_headers():
-    """Build authorization headers for ERPNext API."""
-    if not API_KEY or not API_SECRET:
-        raise ValueError("Missing ERP_API_KEY or ERP_API_SECRET in .env")
+# Circuit breaker: open after ERP_BREAKER_FAILURES consecutive failed or
+# slow (> ERP_BREAKER_SLOW_CALL seconds) calls, retry after ERP_BREAKER_RESET
+BREAKER_FAILURES = int(os.getenv("ERP_BREAKER_FAILURES", "5"))
+BREAKER_SLOW_CALL = float(os.getenv("ERP_BREAKER_SLOW_CALL", "10"))
+BREAKER_RESET = float(os.getenv("ERP_BREAKER_RESET", "30"))
+
+# Rows requested per page when walking a full list with limit_start
+PAGE_SIZE = int(os.getenv("ERP_PAGE_SIZE", "500"))
+
+# Upstream response cache: per-doctype TTLs in seconds, e.g.
+# ERP_CACHE_TTLS="Sales Invoice=60,Bin=30" (a TTL of 0 disables caching)
+CACHE_DEFAULT_TTL = float(os.getenv("ERP_CACHE_TTL", "30"))
+CACHE_TTLS = {
+    doctype.strip(): float(ttl)
+    for doctype, ttl in (
+        item.split("=", 1) for item in os.getenv("ERP_CACHE_TTLS", "").split(",") if "=" in item
+    )
+}
+CACHE_MAX_ENTRIES = int(os.getenv("ERP_CACHE_MAX_ENTRIES", "256"))
+CACHE_MAX_BYTES = int(os.getenv("ERP_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+response_cache = ResponseCache(
+    max_entries=CACHE_MAX_ENTRIES,
+    max_bytes=CACHE_MAX_BYTES,
+    default_ttl=CACHE_DEFAULT_TTL,
+    ttls=CACHE_TTLS
+)
+
+# Identical concurrent async list queries share one upstream request
+upstream_flights = SingleFlight()
+
+upstream_breaker = CircuitBreaker(
+    failure_threshold=BREAKER_FAILURES,
+    slow_call_seconds=BREAKER_SLOW_CALL,
+    reset_timeout=BREAKER_RESET
+)
+
+# ERPNext site the fetchers talk to (a services.sites.Site, see use_site);
+# None means the ERP_URL / ERP_API_KEY site
+current_site = contextvars.ContextVar("erpnext_site", default=None)
+
+# Circuit breakers of the other sites, by site name (created on first call)
+site_breakers = {}
+
+# Score overdue invoices from a locally synced working set
+# (full load once, then `modified` deltas) instead of re-reading the ledger.
+# Like the mirror below it holds the ERP_URL site only: sites from
+# ERP_SITES (services.sites) are always queried directly.
+INVOICE_SYNC = os.getenv("ERP_INVOICE_SYNC", "").lower() in ("1", "true", "yes")
+
+invoice_working_set = InvoiceWorkingSet()
+
+# Optional SQLite mirror: when ERP_MIRROR_PATH is set the risk fetchers
+# query the mirror, which is re-synced every ERP_MIRROR_INTERVAL seconds
+# (ERP_URL site only, see above)
+MIRROR_PATH = os.getenv("ERP_MIRROR_PATH")
+MIRROR_INTERVAL = float(os.getenv("ERP_MIRROR_INTERVAL", "60"))
+
+local_mirror = LocalMirror(MIRROR_PATH) if MIRROR_PATH else None
+
+# Record type each synced doctype is decoded into
+DOCTYPE_RECORDS = {
+    "Sales Invoice": SalesInvoiceRecord,
+    "Bin": BinRecord,
+    "Purchase Order": PurchaseOrderRecord
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+_async_client = None
+_async_client_loop = None
+
+
+@contextmanager
+def use_site(site):
+    """Run the fetchers in this block (and tasks started in it) against site."""
+    token = current_site.set(site)
+    try:
+        yield site
+    finally:
+        current_site.reset(token)
+
+
+def _erp_url():
+    """Base URL of the current ERPNext site."""
+    site = current_site.get()
+    return site.url if site is not None else ERP_URL
+
+
+def _is_primary_site():
+    """True outside use_site; the local mirror and invoice working set hold this site only."""
+    return current_site.get() is None
+
+
+def _token_headers(api_key: str, api_secret: str):
     return {
-        "Authorization": f"token {API_KEY}:{API_SECRET}",
+        "Authorization": f"token {api_key}:{api_secret}",
         "Accept": "application/json"
     }
 
 
-def get_sales_invoices(limit: int = 50):
-    
+def get_headers():
+    """Build authorization headers for the current ERPNext site."""
+    site = current_site.get()
+    if site is None:
+        if not API_KEY or not API_SECRET:
+            raise ValueError("Missing ERP_API_KEY or ERP_API_SECRET in .env")
+        return _token_headers(API_KEY, API_SECRET)
+    if not site.api_key or not site.api_secret:
+        raise ValueError(f"Missing API key or secret of ERPNext site {site.name}")
+    return _token_headers(site.api_key, site.api_secret)
+
+
+def _default_headers():
     """
-    Fetch Sales Invoices from ERPNext.
-    
-    Returns submitted invoices sorted by due_date (oldest first).
+    Headers the shared session and client send by default: those of the
+    ERP_URL site. Calls under use_site pass their site's headers instead
+    (see _site_headers), so a multi-site setup needs no ERP_API_KEY.
+    """
+    if _is_primary_site() or (API_KEY and API_SECRET):
+        with use_site(None):
+            return get_headers()
+    return {"Accept": "application/json"}
+
+
+def _site_headers():
+    """Per-request headers: None for the ERP_URL site, else the site's own."""
+    return None if _is_primary_site() else get_headers()
+
+
+def site_breaker(site):
+    """Circuit breaker of an ERPNext site (None: the ERP_URL site)."""
+    if site is None:
+        return upstream_breaker
+    breaker = site_breakers.get(site.name)
+    if breaker is None:
+        breaker = site_breakers.setdefault(site.name, CircuitBreaker(
+            failure_threshold=BREAKER_FAILURES,
+            slow_call_seconds=BREAKER_SLOW_CALL,
+            reset_timeout=BREAKER_RESET
+        ))
+    return breaker
+
+
+def get_session():
+    """
+    Return the shared ERPNext HTTP session.
+
+    The session is created on first use and reused by every fetcher, so
+    TCP/TLS connections are pooled and kept alive between calls.
+    Idempotent GETs are retried with exponential backoff on connection
+    errors and on 429/502/503/504 responses.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=MAX_RETRIES,
+                backoff_factor=RETRY_BACKOFF,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset(["GET"]),
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(
+                pool_connections=POOL_SIZE,
+                pool_maxsize=POOL_SIZE,
+                max_retries=retry
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(_default_headers())
+            _session = session
+    return _session
+
+
+def close_session():
+    """Close the shared session and drop its pooled connections."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_async_client():
+    """
+    Return the shared asyncio ERPNext client for the running event loop.
+
+    Uses the same pool size and timeouts as the sync session. A client is
+    bound to the loop it was created on, so a new one is built if the
+    loop changes (e.g. between test runs) and the old one is closed.
+    """
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        if _async_client is not None:
+            _discard_async_client(_async_client, _async_client_loop)
+        _async_client = httpx.AsyncClient(
+            headers=_default_headers(),
+            limits=httpx.Limits(
+                max_connections=POOL_SIZE,
+                max_keepalive_connections=POOL_SIZE
+            ),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            transport=httpx.AsyncHTTPTransport(retries=MAX_RETRIES)
+        )
+        _async_client_loop = loop
+    return _async_client
+
+
+def _discard_async_client(client, loop):
     """
-    if not ERP_URL:
+    Close a client left behind by another event loop.
+
+    Its connections can only be closed on that loop, so the close is
+    handed to it; if the loop is already closed its transports are gone
+    and the client is simply dropped.
+    """
+    if not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+
+async def close_async_client():
+    """Close the shared async client (called on app shutdown)."""
+    global _async_client, _async_client_loop
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+        _async_client_loop = None
+
+
+def _field_names(params: dict):
+    """Column names of a list query, in the order ERPNext returns them."""
+    fields = orjson.loads(params.get("fields") or '["name"]')
+    # "sum(actual_qty) as total_qty" -> "total_qty"
+    return [field.rsplit(" as ", 1)[-1].strip() for field in fields]
+
+
+def _record_getter(names, record):
+    """
+    Build a function mapping one list-shaped row to record constructor
+    arguments, or None if the record fields cannot be filled positionally.
+    """
+    positions = [names.index(name) if name in names else None for name in record.__slots__]
+    # Trailing fields that were not requested keep their None default
+    while positions and positions[-1] is None:
+        positions.pop()
+    if not positions or None in positions:
+        return None
+    if len(positions) == 1:
+        index = positions[0]
+        return lambda row: (row[index],)
+    return itemgetter(*positions)
+
+
+def _decode_rows(content: bytes, params: dict, record=None):
+    """
+    Decode the "data" rows of a list response with orjson.
+
+    With a record type the request was made with as_dict=0, so each row
+    is a list of values in field order and becomes one record without an
+    intermediate dict. Dict rows (servers that ignore as_dict) are
+    converted with Record.from_dict.
+    """
+    rows = orjson.loads(content).get("data") or []
+    if record is None or not rows:
+        return rows
+
+    if isinstance(rows[0], dict):
+        return [record.from_dict(row) for row in rows]
+
+    names = _field_names(params)
+    getter = _record_getter(names, record)
+    if getter is None:
+        return [record.from_dict(dict(zip(names, row))) for row in rows]
+    return [record(*getter(row)) for row in rows]
+
+
+def _list_params(params: dict, record=None):
+    """Ask for list-shaped rows when they are decoded into records."""
+    if record is None:
+        return params
+    return {**params, "as_dict": 0}
+
+
+def _cache_key(doctype: str, params: dict, record=None):
+    key = ResponseCache.make_key(doctype, params)
+    if record is not None:
+        key += (record.__name__,)
+    site = current_site.get()
+    return key + (("site", site.name),) if site is not None else key
+
+
+def fetch_list(doctype: str, params: dict, use_cache: bool = True, record=None):
+    """
+    Fetch one page of a DocType list from ERPNext using the shared session.
+
+    Returns the "data" rows of the response, converted to `record`
+    instances (see services.records) when a record type is given; such
+    queries request list-shaped rows, so field names are not repeated
+    on every row. Results are served from response_cache while fresh;
+    cached rows are shared and must be treated as read-only.
+
+    Each attempt is bounded by CONNECT_TIMEOUT / READ_TIMEOUT; while
+    the site's circuit breaker (see site_breaker) is open,
+    CircuitOpenError is raised without a call.
+    """
+    if not _erp_url():
+        raise ValueError("Missing ERP_URL in .env")
+
+    params = _list_params(params, record)
+    key = _cache_key(doctype, params, record)
+    if use_cache:
+        rows = response_cache.get(key)
+        if rows is not None:
+            return rows
+
+    url = f"{_erp_url()}/api/resource/{doctype}"
+
+    started = _before_upstream(doctype)
+    try:
+        response = get_session().get(
+            url,
+            params=params,
+            headers=_site_headers(),
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+        )
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        _after_upstream(doctype, started, e)
+        raise
+    _after_upstream(doctype, started)
+
+    rows = _decode_rows(response.content, params, record)
+    metrics.ROWS_FETCHED.labels(doctype).inc(len(rows))
+    if use_cache:
+        response_cache.put(key, rows, len(response.content))
+    return rows
+
+
+async def afetch_list(doctype: str, params: dict, use_cache: bool = True, record=None):
+    """
+    Async counterpart of fetch_list using the shared httpx client.
+
+    httpx errors are re-raised as the matching requests exceptions so
+    callers handle both paths the same way. Concurrent calls for the same
+    query wait on a single upstream request (see upstream_flights).
+    """
+    if not _erp_url():
         raise ValueError("Missing ERP_URL in .env")
-    
+
+    params = _list_params(params, record)
+    key = _cache_key(doctype, params, record)
+    if use_cache:
+        rows = response_cache.get(key)
+        if rows is not None:
+            return rows
+
+    return await upstream_flights.do(
+        key, lambda: _arequest_list(doctype, params, key, use_cache, record)
+    )
+
+
+async def _arequest_list(doctype: str, params: dict, key, use_cache: bool, record=None):
+    """
+    Send one list request for afetch_list and cache the decoded rows.
+
+    The whole call, retries included, must finish within CALL_DEADLINE;
+    its outcome and duration are recorded on the site's circuit breaker
+    and in the upstream metrics.
+    """
+    url = f"{_erp_url()}/api/resource/{doctype}"
+    client = get_async_client()
+
+    started = _before_upstream(doctype)
+    try:
+        response = await _aget_with_retries(client, url, params, _site_headers())
+    except requests.exceptions.RequestException as e:
+        _after_upstream(doctype, started, e)
+        raise
+    _after_upstream(doctype, started)
+
+    rows = _decode_rows(response.content, params, record)
+    metrics.ROWS_FETCHED.labels(doctype).inc(len(rows))
+    if use_cache:
+        response_cache.put(key, rows, len(response.content))
+    return rows
+
+
+def _before_upstream(doctype: str):
+    """Check the site's circuit breaker before an ERPNext call; return its start time."""
+    try:
+        site_breaker(current_site.get()).before_call()
+    except CircuitOpenError as e:
+        metrics.UPSTREAM_ERRORS.labels(doctype, metrics.error_status(e)).inc()
+        raise
+    return time.monotonic()
+
+
+def _after_upstream(doctype: str, started: float, exc: Exception = None):
+    """Record the outcome of an ERPNext call on the site's circuit breaker and in metrics."""
+    duration = time.monotonic() - started
+    site_breaker(current_site.get()).record(duration, exc)
+    metrics.UPSTREAM_SECONDS.labels(doctype).observe(duration)
+    if exc is not None:
+        metrics.UPSTREAM_ERRORS.labels(doctype, metrics.error_status(exc)).inc()
+
+
+async def _aget_with_retries(client, url: str, params: dict, headers: dict = None):
+    """GET url, retrying RETRY_STATUSES, as requests exceptions on failure."""
+    try:
+        async with asyncio.timeout(CALL_DEADLINE):
+            for attempt in range(MAX_RETRIES + 1):
+                response = await client.get(url, params=params, headers=headers)
+                if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                    break
+                await asyncio.sleep(RETRY_BACKOFF * (2 ** attempt))
+        response.raise_for_status()
+    except TimeoutError as e:
+        raise requests.exceptions.ReadTimeout(f"ERPNext call exceeded {CALL_DEADLINE}s deadline") from e
+    except httpx.HTTPStatusError as e:
+        raise requests.exceptions.HTTPError(str(e), response=e.response) from e
+    except httpx.ConnectTimeout as e:
+        raise requests.exceptions.ConnectTimeout(str(e)) from e
+    except httpx.TimeoutException as e:
+        raise requests.exceptions.ReadTimeout(str(e)) from e
+    except httpx.TransportError as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+    return response
+
+
+def iter_pages(doctype: str, params: dict, page_size: int = None, use_cache: bool = True, record=None):
+    """
+    Lazily yield successive pages of a DocType list.
+
+    Walks limit_start in steps of page_size and stops after the first
+    short page, so only one page is held in memory at a time.
+    """
+    page_size = page_size or PAGE_SIZE
+    start = 0
+
+    while True:
+        page = fetch_list(doctype, {
+            **params,
+            "limit_start": start,
+            "limit_page_length": page_size
+        }, use_cache=use_cache, record=record)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        start += page_size
+
+
+async def aiter_pages(doctype: str, params: dict, page_size: int = None, use_cache: bool = True, record=None):
+    """Async counterpart of iter_pages."""
+    page_size = page_size or PAGE_SIZE
+    start = 0
+
+    while True:
+        page = await afetch_list(doctype, {
+            **params,
+            "limit_start": start,
+            "limit_page_length": page_size
+        }, use_cache=use_cache, record=record)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        start += page_size
+
+
+def sync_invoices():
+    """
+    Bring invoice_working_set up to date.
+
+    The first call loads every open invoice; later calls only fetch
+    invoices modified since the last watermark.
+    """
+    params = invoice_working_set.sync_params()
+    for page in iter_pages("Sales Invoice", params, use_cache=False, record=SalesInvoiceRecord):
+        invoice_working_set.apply(page)
+    invoice_working_set.mark_synced()
+
+
+async def sync_invoices_async():
+    """Async version of sync_invoices."""
+    params = invoice_working_set.sync_params()
+    async for page in aiter_pages("Sales Invoice", params, use_cache=False, record=SalesInvoiceRecord):
+        invoice_working_set.apply(page)
+    invoice_working_set.mark_synced()
+
+
+def sync_mirror():
+    """Apply full or delta syncs of every mirrored doctype to local_mirror."""
+    for doctype in MIRRORED_DOCTYPES:
+        params = local_mirror.sync_params(doctype)
+        for page in iter_pages(doctype, params, use_cache=False, record=DOCTYPE_RECORDS[doctype]):
+            local_mirror.apply(doctype, page)
+        local_mirror.mark_synced(doctype)
+
+
+async def sync_mirror_async():
+    """Async version of sync_mirror."""
+    for doctype in MIRRORED_DOCTYPES:
+        params = local_mirror.sync_params(doctype)
+        async for page in aiter_pages(doctype, params, use_cache=False, record=DOCTYPE_RECORDS[doctype]):
+            local_mirror.apply(doctype, page)
+        local_mirror.mark_synced(doctype)
+
+
+async def run_mirror_sync(interval: float):
+    """Re-sync local_mirror every `interval` seconds until cancelled."""
+    while True:
+        try:
+            await sync_mirror_async()
+        except Exception:
+            logger.warning("Local mirror sync failed", exc_info=True)
+        await asyncio.sleep(interval)
+
+
+def _ensure_mirror():
+    """Run a blocking first sync if the mirror has never been filled."""
+    if local_mirror.freshness() is None:
+        sync_mirror()
+
+
+async def _ensure_mirror_async():
+    if local_mirror.freshness() is None:
+        await sync_mirror_async()
+
+
+def _sales_invoice_params(limit: int):
+    """Build list query params for submitted Sales Invoices."""
     fields = [
         "name",
         "customer",
@@ -40,58 +594,73 @@ def get_sales_invoices(limit: int = 50):
         "grand_total",
         "currency"
     ]
-    
+
     filters = [
         ["docstatus", "=", 1]  # Only submitted invoices
     ]
-    
-    params = {
+
+    return {
         "fields": str(fields).replace("'", '"'),
         "filters": str(filters).replace("'", '"'),
         "order_by": "due_date asc",
         "limit_page_length": limit
     }
-    
-    url = f"{ERP_URL}/api/resource/Sales Invoice"
-    
-    response = requests.get(url, headers=get_headers(), params=params)
-    response.raise_for_status()
-    
-    data = response.json()
-    return data.get("data", [])
 
 
-from datetime import date, datetime
-import requests
+def get_sales_invoices(limit: int = 50):
 
-from datetime import date, datetime
-import requests
+    """
+    Fetch Sales Invoices from ERPNext.
 
-def get_overdue_invoices(
-    limit: int = 50,
-    customer: str = None,
-    days_medium_min: int = 8,
-    days_medium_max: int = 14,
-    days_high_min: int = 15
-):
+    Returns submitted invoices sorted by due_date (oldest first).
     """
-    Fetch overdue Sales Invoices from ERPNext with risk scoring.
+    if not _erp_url():
+        raise ValueError("Missing ERP_URL in .env")
 
-    Overdue invoices:
-    - docstatus = 1 (Submitted)
-    - status != Paid
-    - due_date < today
-    - outstanding_amount > 0
+    return fetch_list("Sales Invoice", _sales_invoice_params(limit))
 
-    Risk levels:
-    - Medium: 8–14 days overdue
-    - High: 15+ days overdue
-    """
 
-    if not ERP_URL:
+async def get_sales_invoices_async(limit: int = 50):
+    """Async version of get_sales_invoices."""
+    if not _erp_url():
         raise ValueError("Missing ERP_URL in .env")
 
-    today = date.today()
+    return await afetch_list("Sales Invoice", _sales_invoice_params(limit))
+
+
+def _overdue_range_filters(
+    today: date,
+    min_amount: float = None,
+    max_amount: float = None,
+    min_days: int = None,
+    max_days: int = None
+):
+    """
+    Translate outstanding amount and days-overdue bounds into
+    Sales Invoice filters on outstanding_amount and due_date.
+    """
+    filters = []
+
+    if min_amount is not None:
+        filters.append(["outstanding_amount", ">=", min_amount])
+    if max_amount is not None:
+        filters.append(["outstanding_amount", "<=", max_amount])
+
+    # days_overdue >= min_days  <=>  due_date <= today - min_days
+    if min_days is not None:
+        filters.append(["due_date", "<=", (today - timedelta(days=min_days)).isoformat()])
+    if max_days is not None:
+        filters.append(["due_date", ">=", (today - timedelta(days=max_days)).isoformat()])
+
+    return filters
+
+
+def _overdue_invoice_params(today: date, customer: str = None, range_filters: list = None):
+    """
+    Build list query params for overdue Sales Invoices.
+
+    Paging (limit_start / limit_page_length) is added by iter_pages.
+    """
     today_str = today.isoformat()
 
     fields = [
@@ -115,203 +684,375 @@ def get_overdue_invoices(
     if customer:
         filters.append(["customer", "=", customer])
 
-    params = {
+    filters.extend(range_filters or [])
+
+    return {
         "fields": str(fields).replace("'", '"'),
         "filters": str(filters).replace("'", '"'),
-        "order_by": "due_date asc",
-        "limit_page_length": limit
+        "order_by": "due_date asc"
     }
 
-    url = f"{ERP_URL}/api/resource/Sales Invoice"
 
-    response = requests.get(url, headers=get_headers(), params=params)
-    response.raise_for_status()
+class OverdueInvoiceScorer:
+    """
+    Incremental risk scorer for overdue Sales Invoice rows.
 
-    raw_data = response.json().get("data", [])
+    Rows are fed page by page, so the whole ledger is scored in constant
+    memory. KPIs and risk counts cover every scored row; only the first
+    `limit` risky rows (most overdue first) are kept for the response.
+    """
 
-    result = []
-    medium_count = 0
-    high_count = 0
+    def __init__(
+        self,
+        today: date,
+        limit: int,
+        days_medium_min: int,
+        days_medium_max: int,
+        days_high_min: int
+    ):
+        self.today = today
+        self.limit = limit
+        self.days_medium_min = days_medium_min
+        self.days_medium_max = days_medium_max
+        self.days_high_min = days_high_min
 
-    for inv in raw_data:
-        due_date_str = inv.get("due_date")
-        if not due_date_str:
-            continue
+        self.data = []
+        self.medium_count = 0
+        self.high_count = 0
+        self.total_outstanding = 0
+        self.most_overdue = None
 
-        try:
-            due_date = datetime.strptime(due_date_str, "%Y-%m-%d").date()
-        except ValueError:
-            continue
-
-        days_overdue = (today - due_date).days
-
-        # Risk rules:
-        if days_overdue >= days_high_min:
-            risk_level = "High"
-            high_count += 1
-
-        elif days_medium_min <= days_overdue <= days_medium_max:
-            risk_level = "Medium"
-            medium_count += 1
-
-        else:
-            # Ignore invoices overdue < 8 days
-            continue
-
-        result.append({
-            "invoice_id": inv.get("name"),
-            "customer": inv.get("customer"),
-            "posting_date": inv.get("posting_date"),
-            "due_date": due_date_str,
-            "days_overdue": days_overdue,
-            "status": inv.get("status"),
-            "outstanding_amount": inv.get("outstanding_amount"),
-            "grand_total": inv.get("grand_total"),
-            "currency": inv.get("currency"),
-            "risk_level": risk_level
-        })
-
-    # Calculate KPIs
-    total_outstanding_overdue = sum(inv["outstanding_amount"] for inv in result)
-    
-    # Find most overdue invoice
-    most_overdue_invoice = None
-    if result:
-        most_overdue_invoice = max(result, key=lambda x: x["days_overdue"])
+    def add_rows(self, rows):
+        """Score a batch of raw invoice rows (one page) in vectorized form."""
+        with metrics.SCORING_SECONDS.labels("overdue_invoices").time():
+            self._score(list(rows))
 
-    return {
-        # KPIs at the top
-        "kpis": {
-            "overdue_invoices_count": len(result),
-            "total_outstanding_overdue_amount": total_outstanding_overdue,
-            "most_overdue_days": most_overdue_invoice["days_overdue"] if most_overdue_invoice else 0,
-            "most_overdue_invoice_id": most_overdue_invoice["invoice_id"] if most_overdue_invoice else None,
-            "most_overdue_customer": most_overdue_invoice["customer"] if most_overdue_invoice else None
-        },
-        "count": len(result),
-        "medium_count": medium_count,
-        "high_count": high_count,
-        "data": result
-    }
+    def _score(self, rows):
+        if not rows:
+            return
 
-def get_bin_stock(
-    limit: int = 100,
-    item_code: str = None,
-    warehouse: str = None,
-    aggregate: bool = True
+        due_days = scoring.date_column([inv.get("due_date") for inv in rows])
+        amounts = scoring.float_column([inv.get("outstanding_amount") for inv in rows])
+
+        days_overdue, buckets = scoring.score_overdue(
+            due_days, self.today, self.days_medium_min, self.days_medium_max, self.days_high_min
+        )
+        medium, high, outstanding, worst = scoring.overdue_kpis(days_overdue, amounts, buckets)
+        metrics.ROWS_KEPT.labels("overdue_invoices").inc(medium + high)
+
+        self.medium_count += medium
+        self.high_count += high
+        self.total_outstanding += outstanding
+
+        if worst is not None and (
+            self.most_overdue is None or days_overdue[worst] > self.most_overdue["days_overdue"]
+        ):
+            self.most_overdue = {
+                "days_overdue": int(days_overdue[worst]),
+                "invoice_id": rows[worst].get("name"),
+                "customer": rows[worst].get("customer")
+            }
+
+        room = self.limit - len(self.data)
+        if room <= 0:
+            return
+
+        for i in np.flatnonzero(buckets)[:room]:
+            inv = rows[i]
+            self.data.append(OverdueInvoice(
+                invoice_id=inv.get("name"),
+                customer=inv.get("customer"),
+                posting_date=inv.get("posting_date"),
+                due_date=inv.get("due_date"),
+                days_overdue=int(days_overdue[i]),
+                status=inv.get("status"),
+                outstanding_amount=inv.get("outstanding_amount"),
+                grand_total=inv.get("grand_total"),
+                currency=inv.get("currency"),
+                risk_level=scoring.RISK_LABELS[buckets[i]]
+            ))
+
+    def result(self):
+        """Build the /invoices/overdue response payload."""
+        most_overdue = self.most_overdue
+
+        return {
+            # KPIs at the top (computed over the full ledger)
+            "kpis": {
+                "overdue_invoices_count": self.medium_count + self.high_count,
+                "total_outstanding_overdue_amount": self.total_outstanding,
+                "most_overdue_days": most_overdue["days_overdue"] if most_overdue else 0,
+                "most_overdue_invoice_id": most_overdue["invoice_id"] if most_overdue else None,
+                "most_overdue_customer": most_overdue["customer"] if most_overdue else None
+            },
+            "count": len(self.data),
+            "medium_count": self.medium_count,
+            "high_count": self.high_count,
+            "data": self.data
+        }
+
+
+def get_overdue_invoices(
+    limit: int = 50,
+    customer: str = None,
+    days_medium_min: int = 8,
+    days_medium_max: int = 14,
+    days_high_min: int = 15,
+    min_amount: float = None,
+    max_amount: float = None,
+    min_days: int = None,
+    max_days: int = None
 ):
     """
-    Fetch current stock quantity per item using the Bin DocType.
-    
-    The Bin DocType stores the current stock quantity per item/warehouse.
-    
-    Args:
-        limit: Maximum number of entries to return (pagination)
-        item_code: Filter by specific item code
-        warehouse: Filter by specific warehouse
-        aggregate: If True, aggregate results by item_code to return total qty across all warehouses
-    
-    Returns:
-        JSON response with count and stock data
+    Fetch overdue Sales Invoices from ERPNext with risk scoring.
+
+    Overdue invoices:
+    - docstatus = 1 (Submitted)
+    - status != Paid
+    - due_date < today
+    - outstanding_amount > 0
+
+    Risk levels:
+    - Medium: 8–14 days overdue
+    - High: 15+ days overdue
+
+    Every page of the ledger is scored, so KPIs and risk counts are
+    exact; `limit` only caps the number of rows returned in "data".
+    min_amount / max_amount and min_days / max_days are sent to ERPNext
+    as outstanding_amount and due_date filters, so only matching rows
+    are transferred.
+    With ERP_MIRROR_PATH set, rows come from the local SQLite mirror;
+    with ERP_INVOICE_SYNC enabled, from the incrementally synced invoice
+    working set. Both hold the ERP_URL site only; under use_site the
+    site is always queried directly.
     """
-    if not ERP_URL:
+
+    if not _erp_url():
         raise ValueError("Missing ERP_URL in .env")
-    
+
+    today = date.today()
+
+    scorer = OverdueInvoiceScorer(
+        today, limit, days_medium_min, days_medium_max, days_high_min
+    )
+    range_filters = _overdue_range_filters(today, min_amount, max_amount, min_days, max_days)
+
+    if local_mirror is not None and _is_primary_site():
+        _ensure_mirror()
+        scorer.add_rows(local_mirror.overdue_invoices(today, customer, range_filters))
+        return scorer.result()
+
+    if INVOICE_SYNC and _is_primary_site():
+        sync_invoices()
+        scorer.add_rows(invoice_working_set.overdue_rows(today, customer, range_filters))
+        return scorer.result()
+
+    params = _overdue_invoice_params(today, customer, range_filters)
+    for page in iter_pages("Sales Invoice", params, record=SalesInvoiceRecord):
+        scorer.add_rows(page)
+
+    return scorer.result()
+
+
+async def get_overdue_invoices_async(
+    limit: int = 50,
+    customer: str = None,
+    days_medium_min: int = 8,
+    days_medium_max: int = 14,
+    days_high_min: int = 15,
+    min_amount: float = None,
+    max_amount: float = None,
+    min_days: int = None,
+    max_days: int = None
+):
+    """Async version of get_overdue_invoices."""
+    if not _erp_url():
+        raise ValueError("Missing ERP_URL in .env")
+
+    today = date.today()
+
+    scorer = OverdueInvoiceScorer(
+        today, limit, days_medium_min, days_medium_max, days_high_min
+    )
+    range_filters = _overdue_range_filters(today, min_amount, max_amount, min_days, max_days)
+
+    if local_mirror is not None and _is_primary_site():
+        await _ensure_mirror_async()
+        scorer.add_rows(local_mirror.overdue_invoices(today, customer, range_filters))
+        return scorer.result()
+
+    if INVOICE_SYNC and _is_primary_site():
+        await sync_invoices_async()
+        scorer.add_rows(invoice_working_set.overdue_rows(today, customer, range_filters))
+        return scorer.result()
+
+    params = _overdue_invoice_params(today, customer, range_filters)
+    async for page in aiter_pages("Sales Invoice", params, record=SalesInvoiceRecord):
+        scorer.add_rows(page)
+
+    return scorer.result()
+
+
+def _bin_stock_params(limit: int, item_code: str = None, warehouse: str = None):
+    """Build list query params for Bin stock rows."""
     fields = [
         "name",
         "item_code",
         "warehouse",
         "actual_qty"
     ]
-    
+
     filters = []
-    
+
     # Filter by item_code
     if item_code:
         filters.append(["item_code", "=", item_code])
-    
+
     # Filter by warehouse
     if warehouse:
         filters.append(["warehouse", "=", warehouse])
-    
+
     params = {
         "fields": str(fields).replace("'", '"'),
         "order_by": "actual_qty asc",
         "limit_page_length": limit
     }
-    
+
     # Only add filters if there are any
     if filters:
         params["filters"] = str(filters).replace("'", '"')
-    
-    url = f"{ERP_URL}/api/resource/Bin"
-    
-    response = requests.get(url, headers=get_headers(), params=params)
-    response.raise_for_status()
-    
-    data = response.json().get("data", [])
-    
-    # Aggregate by item_code if requested
-    if aggregate and not item_code:
-        aggregated = {}
-        for entry in data:
-            code = entry.get("item_code")
-            qty = entry.get("actual_qty", 0) or 0
-            if code in aggregated:
-                aggregated[code]["total_qty"] += qty
-                aggregated[code]["warehouses"].append({
-                    "warehouse": entry.get("warehouse"),
-                    "actual_qty": qty
-                })
-            else:
-                aggregated[code] = {
-                    "item_code": code,
-                    "total_qty": qty,
-                    "warehouses": [{
-                        "warehouse": entry.get("warehouse"),
-                        "actual_qty": qty
-                    }]
-                }
-        
-        # Convert to list and sort by total_qty ascending
-        result = list(aggregated.values())
-        result.sort(key=lambda x: x["total_qty"])
-        
-        return {
-            "count": len(result),
-            "data": result
+
+    return params
+
+
+def _bin_totals_params(limit: int, warehouse: str = None):
+    """
+    Build list query params for per-item stock totals.
+
+    ERPNext sums actual_qty grouped by item_code, so each returned row
+    is one item however many warehouses hold it.
+    """
+    fields = [
+        "item_code",
+        "sum(actual_qty) as total_qty",
+        "count(name) as warehouse_count"
+    ]
+
+    params = {
+        "fields": str(fields).replace("'", '"'),
+        "group_by": "item_code",
+        "order_by": "total_qty asc",
+        "limit_page_length": limit
+    }
+
+    if warehouse:
+        params["filters"] = str([["warehouse", "=", warehouse]]).replace("'", '"')
+
+    return params
+
+
+def _shape_bin_totals(rows):
+    """Shape grouped Bin rows into the aggregated /stock-ledger response."""
+    result = [
+        {
+            "item_code": row.get("item_code"),
+            "total_qty": row.get("total_qty", 0) or 0,
+            "warehouse_count": row.get("warehouse_count", 0) or 0
         }
-    
+        for row in rows
+    ]
+
     return {
-        "count": len(data),
-        "data": data
+        "count": len(result),
+        "data": result
     }
 
 
-def get_low_stock_items(
-    limit: int = 500,
+def get_bin_stock(
+    limit: int = 100,
+    item_code: str = None,
     warehouse: str = None,
-    item_code: str = None
+    aggregate: bool = True
 ):
     """
-Fetch low stock items from Bin ONLY for:
-- Finished Goods - SD
-- Stores - SD
+    Fetch current stock quantity per item using the Bin DocType.
+
+    The Bin DocType stores the current stock quantity per item/warehouse.
 
-Risk levels:
-- High: actual_qty < 30 
-- Medium: 30 <= actual_qty <= 60
-- Ignored: actual_qty > 60
+    Args:
+        limit: Maximum number of entries (items when aggregated) to return
+        item_code: Filter by specific item code
+        warehouse: Filter by specific warehouse
+        aggregate: If True, ERPNext sums actual_qty per item_code across
+            warehouses. The per-warehouse breakdown of an item is fetched
+            separately by passing its item_code.
 
-Returns:
-  Only Medium/High risk items, sorted by actual_qty ascending,
-  filtered to warehouses: Finished Goods - SD and Stores - SD.
+    Returns:
+        JSON response with count and stock data
     """
-    if not ERP_URL:
+    if not _erp_url():
+        raise ValueError("Missing ERP_URL in .env")
+
+    if aggregate and not item_code:
+        return _shape_bin_totals(fetch_list("Bin", _bin_totals_params(limit, warehouse)))
+
+    data = fetch_list("Bin", _bin_stock_params(limit, item_code, warehouse))
+
+    return {
+        "count": len(data),
+        "data": data
+    }
+
+
+async def get_bin_stock_async(
+    limit: int = 100,
+    item_code: str = None,
+    warehouse: str = None,
+    aggregate: bool = True
+):
+    """Async version of get_bin_stock."""
+    if not _erp_url():
         raise ValueError("Missing ERP_URL in .env")
 
-    ALLOWED_WAREHOUSES = ["Finished Goods - SD", "Stores - SD"]
+    if aggregate and not item_code:
+        return _shape_bin_totals(await afetch_list("Bin", _bin_totals_params(limit, warehouse)))
+
+    data = await afetch_list("Bin", _bin_stock_params(limit, item_code, warehouse))
+
+    return {
+        "count": len(data),
+        "data": data
+    }
+
+
+ALLOWED_WAREHOUSES = ["Finished Goods - SD", "Stores - SD"]
+
+# Default stock risk thresholds and number of rows returned
+LOW_STOCK_HIGH_BELOW = 30
+LOW_STOCK_MEDIUM_MAX = 60
+LOW_STOCK_TOP_N = 50
+
+
+def _empty_low_stock():
+    """Low stock payload of a query that cannot match any bin (a new dict each call)."""
+    return {
+        "count": 0,
+        "total_count": 0,
+        "high_count": 0,
+        "medium_count": 0,
+        "data": []
+    }
 
+
+def _low_stock_params(warehouse: str = None, item_code: str = None, medium_max: float = LOW_STOCK_MEDIUM_MAX):
+    """
+    Build list query params for low stock Bin rows.
+
+    Only rows with 0 <= actual_qty <= medium_max are requested, so bins
+    with sufficient stock never leave ERPNext. Paging is added by
+    iter_pages. Returns None when the requested warehouse is not
+    monitored.
+    """
     fields = [
         "name",
         "item_code",
@@ -319,17 +1060,15 @@ Returns:
         "actual_qty"
     ]
 
-    filters = []
+    filters = [
+        ["actual_qty", ">=", 0],
+        ["actual_qty", "<=", medium_max]
+    ]
 
     # Filter by warehouse - only allowed warehouses
     if warehouse:
         if warehouse not in ALLOWED_WAREHOUSES:
-            return {
-                "count": 0,
-                "high_count": 0,
-                "medium_count": 0,
-                "data": []
-            }
+            return None
         filters.append(["warehouse", "=", warehouse])
     else:
         filters.append(["warehouse", "in", ALLOWED_WAREHOUSES])
@@ -337,83 +1076,182 @@ Returns:
     if item_code:
         filters.append(["item_code", "=", item_code])
 
-    params = {
+    return {
         "fields": str(fields).replace("'", '"'),
         "filters": str(filters).replace("'", '"'),
-        "order_by": "actual_qty asc",
-        "limit_page_length": limit
+        "order_by": "actual_qty asc"
     }
 
-    url = f"{ERP_URL}/api/resource/Bin"
 
-    response = requests.get(url, headers=get_headers(), params=params)
-    response.raise_for_status()
+class LowStockScorer:
+    """
+    Incremental stock risk scorer for Bin rows sorted by actual_qty.
 
-    raw_data = response.json().get("data", [])
+    High/Medium counts cover every qualifying row fed in; only the
+    first top_n rows (lowest quantity first) are kept for the response.
+    Scanning stops once `limit` qualifying rows were seen, if set.
+    """
 
-    result = []
-    high_count = 0
-    medium_count = 0
-
-    for entry in raw_data:
-        qty = entry.get("actual_qty", 0) or 0
-
-        # High for 0 <= qty < 30
-        if   0<= qty <=29 :
-            risk_level = "High"
-            high_count += 1
-
-        # Medium for 30 <= qty <= 60
-        elif 30 <= qty <= 60:
-            risk_level = "Medium"
-            medium_count += 1
-        else:
-            # Ignore qty > 60
-            continue
-
-        result.append({
-            "item_code": entry.get("item_code"),
-            "warehouse": entry.get("warehouse"),
-            "actual_qty": qty,
-            "risk_level": risk_level
-        })
-
-    # Sort by lowest qty first
-    result.sort(key=lambda x: x["actual_qty"])
-
-    # Return top 50 results
-    top_50 = result[:50]
+    def __init__(
+        self,
+        high_below: float = LOW_STOCK_HIGH_BELOW,
+        medium_max: float = LOW_STOCK_MEDIUM_MAX,
+        top_n: int = LOW_STOCK_TOP_N,
+        limit: int = None
+    ):
+        self.high_below = high_below
+        self.medium_max = medium_max
+        self.top_n = top_n
+        self.limit = limit
 
-    return {
-        "count": len(top_50),
-        "high_count": sum(1 for x in top_50 if x["risk_level"] == "High"),
-        "medium_count": sum(1 for x in top_50 if x["risk_level"] == "Medium"),
-        "data": top_50
-    }
+        self.data = []
+        self.high_count = 0
+        self.medium_count = 0
+        self.scanned = 0
 
+    @property
+    def done(self):
+        """True once the optional scan limit was reached."""
+        return self.limit is not None and self.scanned >= self.limit
 
-def get_delayed_purchase_orders(limit: int = 100):
+    def add_rows(self, rows):
+        """Score an iterable of raw Bin rows."""
+        kept = self.high_count + self.medium_count
+        with metrics.SCORING_SECONDS.labels("low_stock").time():
+            self._score(rows)
+        metrics.ROWS_KEPT.labels("low_stock").inc(self.high_count + self.medium_count - kept)
+
+    def _score(self, rows):
+        for entry in rows:
+            if self.done:
+                return
+            self.scanned += 1
+
+            qty = entry.get("actual_qty", 0) or 0
+
+            # High for 0 <= qty < high_below
+            if 0 <= qty < self.high_below:
+                risk_level = "High"
+                self.high_count += 1
+
+            # Medium for high_below <= qty <= medium_max
+            elif self.high_below <= qty <= self.medium_max:
+                risk_level = "Medium"
+                self.medium_count += 1
+            else:
+                # Ignore qty > medium_max
+                continue
+
+            if len(self.data) >= self.top_n:
+                continue
+
+            self.data.append(LowStockItem(
+                item_code=entry.get("item_code"),
+                warehouse=entry.get("warehouse"),
+                actual_qty=qty,
+                risk_level=risk_level
+            ))
+
+    def result(self):
+        """Build the /inventory/low-stock response payload."""
+        return {
+            "count": len(self.data),
+            "total_count": self.high_count + self.medium_count,
+            "high_count": self.high_count,
+            "medium_count": self.medium_count,
+            "data": self.data
+        }
+
+
+def get_low_stock_items(
+    limit: int = None,
+    warehouse: str = None,
+    item_code: str = None,
+    high_below: float = LOW_STOCK_HIGH_BELOW,
+    medium_max: float = LOW_STOCK_MEDIUM_MAX,
+    top_n: int = LOW_STOCK_TOP_N
+):
     """
-    Fetch Purchase Orders that are delayed (stuck) with no/partial receipt.
-    
-    A PO is considered delayed/stuck if:
-    - docstatus = 1 (Submitted)
-    - status in ["To Receive", "To Receive and Bill"]
-    - today - transaction_date >= 7 days
-    - per_received < 100 (not fully received)
-    
-    Risk levels:
-    - Medium: 7 <= stuck_days <= 14
-    - High: stuck_days > 14
-    
-    Returns:
-        List of delayed POs sorted by stuck_days descending (most delayed first)
+Fetch low stock items from Bin ONLY for:
+- Finished Goods - SD
+- Stores - SD
+
+Risk levels (thresholds are configurable):
+- High: 0 <= actual_qty < high_below (30)
+- Medium: high_below <= actual_qty <= medium_max (60)
+- Ignored: actual_qty > medium_max, filtered out by ERPNext
+
+Returns:
+  The top_n lowest Medium/High risk items, sorted by actual_qty
+  ascending, filtered to warehouses: Finished Goods - SD and Stores - SD.
+  high_count / medium_count / total_count cover every qualifying bin
+  (or the first `limit` of them, if a limit is given).
     """
-    if not ERP_URL:
+    if not _erp_url():
         raise ValueError("Missing ERP_URL in .env")
-    
-    today = date.today()
-    
+
+    params = _low_stock_params(warehouse, item_code, medium_max)
+    if params is None:
+        return _empty_low_stock()
+
+    scorer = LowStockScorer(high_below, medium_max, top_n, limit)
+
+    if local_mirror is not None and _is_primary_site():
+        _ensure_mirror()
+        scorer.add_rows(local_mirror.low_stock_bins(
+            [warehouse] if warehouse else ALLOWED_WAREHOUSES,
+            item_code=item_code,
+            min_qty=0,
+            max_qty=medium_max
+        ))
+        return scorer.result()
+
+    for page in iter_pages("Bin", params, record=BinRecord):
+        scorer.add_rows(page)
+        if scorer.done:
+            break
+
+    return scorer.result()
+
+
+async def get_low_stock_items_async(
+    limit: int = None,
+    warehouse: str = None,
+    item_code: str = None,
+    high_below: float = LOW_STOCK_HIGH_BELOW,
+    medium_max: float = LOW_STOCK_MEDIUM_MAX,
+    top_n: int = LOW_STOCK_TOP_N
+):
+    """Async version of get_low_stock_items."""
+    if not _erp_url():
+        raise ValueError("Missing ERP_URL in .env")
+
+    params = _low_stock_params(warehouse, item_code, medium_max)
+    if params is None:
+        return _empty_low_stock()
+
+    scorer = LowStockScorer(high_below, medium_max, top_n, limit)
+
+    if local_mirror is not None and _is_primary_site():
+        await _ensure_mirror_async()
+        scorer.add_rows(local_mirror.low_stock_bins(
+            [warehouse] if warehouse else ALLOWED_WAREHOUSES,
+            item_code=item_code,
+            min_qty=0,
+            max_qty=medium_max
+        ))
+        return scorer.result()
+
+    async for page in aiter_pages("Bin", params, record=BinRecord):
+        scorer.add_rows(page)
+        if scorer.done:
+            break
+
+    return scorer.result()
+
+
+def _delayed_po_params(limit: int):
+    """Build list query params for open Purchase Orders."""
     # Fetch Purchase Orders with status "To Receive" or "To Receive and Bill"
     # per_received < 100 means not fully received yet
     po_fields = [
@@ -425,86 +1263,113 @@ def get_delayed_purchase_orders(limit: int = 100):
         "currency",
         "per_received"
     ]
-    
+
     po_filters = [
         ["docstatus", "=", 1],
         ["status", "in", ["To Receive", "To Receive and Bill"]]
     ]
-    
-    po_params = {
+
+    return {
         "fields": str(po_fields).replace("'", '"'),
         "filters": str(po_filters).replace("'", '"'),
         "order_by": "transaction_date asc",
         "limit_page_length": limit
     }
-    
-    po_url = f"{ERP_URL}/api/resource/Purchase Order"
-    response = requests.get(po_url, headers=get_headers(), params=po_params)
-    response.raise_for_status()
-    
-    purchase_orders = response.json().get("data", [])
-    
-    # Filter POs that are delayed >= 7 days
+
+
+def _score_delayed_purchase_orders(purchase_orders, today: date):
+    """Apply stuck-days risk scoring to raw Purchase Order rows."""
+    with metrics.SCORING_SECONDS.labels("delayed_purchase_orders").time():
+        result = _delayed_purchase_orders_payload(list(purchase_orders), today)
+    metrics.ROWS_KEPT.labels("delayed_purchase_orders").inc(result["count"])
+    return result
+
+
+def _delayed_purchase_orders_payload(purchase_orders, today: date):
+
+    transaction_days = scoring.date_column([po.get("transaction_date") for po in purchase_orders])
+    per_received = scoring.float_column([po.get("per_received") for po in purchase_orders])
+
+    # Medium for 7-14 stuck days, High above 14; fully received POs are skipped
+    stuck_days, buckets = scoring.score_stuck_purchase_orders(transaction_days, per_received, today)
+
+    # Delayed POs sorted by stuck_days descending (most delayed first)
+    delayed = np.flatnonzero(buckets)
+    delayed = delayed[np.argsort(-stuck_days[delayed], kind="stable")]
+
     result = []
-    high_count = 0
-    medium_count = 0
-    
-    for po in purchase_orders:
-        po_name = po.get("name")
-        per_received = po.get("per_received", 0) or 0
-        
-        # Skip if fully received
-        if per_received >= 100:
-            continue
-        
-        # Calculate stuck days
-        transaction_date_str = po.get("transaction_date")
-        if not transaction_date_str:
-            continue
-        
-        try:
-            transaction_date = datetime.strptime(transaction_date_str, "%Y-%m-%d").date()
-        except ValueError:
-            continue
-        
-        stuck_days = (today - transaction_date).days
-        
-        # Skip if not delayed (less than 7 days)
-        if stuck_days < 7:
-            continue
-        
-        # Assign risk level
-        if stuck_days > 14:
-            risk_level = "High"
-            high_count += 1
-        elif 7 <= stuck_days <= 14:
-            risk_level = "Medium"
-            medium_count += 1
-        else:
-            continue
-        
-        result.append({
-            "po": po_name,
-            "supplier": po.get("supplier"),
-            "transaction_date": transaction_date_str,
-            "stuck_days": stuck_days,
-            "status": po.get("status"),
-            "grand_total": po.get("grand_total"),
-            "currency": po.get("currency"),
-            "risk_level": risk_level
-        })
-    
-    # Sort by stuck_days descending (most delayed first)
-    result.sort(key=lambda x: x["stuck_days"], reverse=True)
-    
+    for i in delayed:
+        po = purchase_orders[i]
+        result.append(DelayedPurchaseOrder(
+            po=po.get("name"),
+            supplier=po.get("supplier"),
+            transaction_date=po.get("transaction_date"),
+            stuck_days=int(stuck_days[i]),
+            status=po.get("status"),
+            grand_total=po.get("grand_total"),
+            currency=po.get("currency"),
+            risk_level=scoring.RISK_LABELS[buckets[i]]
+        ))
+
     return {
         "count": len(result),
-        "high_count": high_count,
-        "medium_count": medium_count,
+        "high_count": int(np.count_nonzero(buckets == scoring.HIGH)),
+        "medium_count": int(np.count_nonzero(buckets == scoring.MEDIUM)),
         "data": result
     }
 
 
+def get_delayed_purchase_orders(limit: int = 100):
+    """
+    Fetch Purchase Orders that are delayed (stuck) with no/partial receipt.
+
+    A PO is considered delayed/stuck if:
+    - docstatus = 1 (Submitted)
+    - status in ["To Receive", "To Receive and Bill"]
+    - today - transaction_date >= 7 days
+    - per_received < 100 (not fully received)
+
+    Risk levels:
+    - Medium: 7 <= stuck_days <= 14
+    - High: stuck_days > 14
+
+    Returns:
+        List of delayed POs sorted by stuck_days descending (most delayed first)
+    """
+    if not _erp_url():
+        raise ValueError("Missing ERP_URL in .env")
+
+    today = date.today()
+
+    if local_mirror is not None and _is_primary_site():
+        _ensure_mirror()
+        purchase_orders = local_mirror.open_purchase_orders(limit=limit)
+        return _score_delayed_purchase_orders(purchase_orders, today)
+
+    purchase_orders = fetch_list("Purchase Order", _delayed_po_params(limit), record=PurchaseOrderRecord)
+
+    return _score_delayed_purchase_orders(purchase_orders, today)
+
+
+async def get_delayed_purchase_orders_async(limit: int = 100):
+    """Async version of get_delayed_purchase_orders."""
+    if not _erp_url():
+        raise ValueError("Missing ERP_URL in .env")
+
+    today = date.today()
+
+    if local_mirror is not None and _is_primary_site():
+        await _ensure_mirror_async()
+        purchase_orders = local_mirror.open_purchase_orders(limit=limit)
+        return _score_delayed_purchase_orders(purchase_orders, today)
+
+    purchase_orders = await afetch_list(
+        "Purchase Order", _delayed_po_params(limit), record=PurchaseOrderRecord
+    )
+
+    return _score_delayed_purchase_orders(purchase_orders, today)
+
+
 # Example usage:
 # if __name__ == "__main__":
 #     delayed_pos = get_delayed_purchase_orders()
@@ -0,0 +1,132 @@
+"""
+Server-Sent Events for live risk changes.
+
+When a dashboard snapshot is refreshed, its rows are diffed against the
+previous value and the row-level changes (new overdue invoice, risk
+escalated, PO received, bin replenished, ...) are published to every
+connected dashboard as one `patch` event per dataset. Clients apply the
+patches in place instead of re-downloading the whole board.
+"""
+import asyncio
+import logging
+
+import orjson
+
+from services.http import JSON_OPTIONS
+
+logger = logging.getLogger(__name__)
+
+RISK_RANK = {"Medium": 1, "High": 2}
+
+# dataset -> (row key fields, change name for added rows, for removed rows)
+DATASETS = {
+    "overdue_invoices": (("invoice_id",), "invoice_overdue", "invoice_cleared"),
+    "low_stock": (("item_code", "warehouse"), "stock_low", "bin_replenished"),
+    "delayed_purchase_orders": (("po",), "po_delayed", "po_received")
+}
+
+
+def row_key(row, fields):
+    """
+    Stable string key of a row, e.g. "ITEM-1|Stores - SD", prefixed with
+    the site of merged multi-site rows ("acme|ITEM-1|Stores - SD").
+    """
+    key = "|".join(str(row.get(field)) for field in fields)
+    site = row.get("site")
+    return f"{site}|{key}" if site is not None else key
+
+
+def diff_dataset(dataset: str, old, new):
+    """
+    Row-level changes between two payloads of a dataset.
+
+    Each change is {"op": "upsert", "change": ..., "row": ...} or
+    {"op": "remove", "change": ..., "key": ...}. Risk level increases
+    are reported as "risk_escalated", other field changes as "updated".
+    """
+    fields, added, removed = DATASETS[dataset]
+    old_rows = {row_key(row, fields): row for row in (old or {}).get("data", [])}
+    new_rows = {row_key(row, fields): row for row in (new or {}).get("data", [])}
+
+    changes = []
+    for key, row in new_rows.items():
+        previous = old_rows.get(key)
+        if previous is None:
+            changes.append({"op": "upsert", "change": added, "key": key, "row": row})
+        elif previous != row:
+            escalated = RISK_RANK.get(row.get("risk_level"), 0) > RISK_RANK.get(previous.get("risk_level"), 0)
+            changes.append({
+                "op": "upsert",
+                "change": "risk_escalated" if escalated else "updated",
+                "key": key,
+                "row": row
+            })
+
+    for key in old_rows.keys() - new_rows.keys():
+        changes.append({"op": "remove", "change": removed, "key": key})
+
+    return changes
+
+
+class EventBroker:
+    """Fan-out of published events to one bounded queue per subscriber."""
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._last_id = 0
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event: str, data):
+        """
+        Queue an event for every subscriber.
+
+        A subscriber that fell queue_size events behind is told to
+        `resync` (reload the full board) instead of receiving a gap.
+        """
+        self._last_id += 1
+        message = format_event(self._last_id, event, data)
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(format_event(self._last_id, "resync", {}))
+
+
+def format_event(event_id: int, event: str, data):
+    """Encode one SSE message."""
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (
+        event_id, event.encode(), orjson.dumps(data, option=JSON_OPTIONS)
+    )
+
+
+async def event_stream(request, broker: EventBroker, keepalive: float = 15):
+    """
+    Yield SSE messages from broker until the client disconnects.
+
+    A comment line is sent every `keepalive` seconds so proxies keep the
+    connection open.
+    """
+    queue = broker.subscribe()
+    try:
+        yield b"retry: 3000\n\n"
+        while not await request.is_disconnected():
+            try:
+                yield await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+    finally:
+        broker.unsubscribe(queue)
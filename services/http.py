@@ -0,0 +1,190 @@
+"""
+Response path for the API: orjson serialization, conditional requests
+and negotiated compression.
+
+Risk payloads hold thousands of rows (dicts, slotted records, NumPy
+scalars). ORJSONResponse serializes them in one orjson call, and
+json_response lets a route skip FastAPI's jsonable_encoder pass while
+keeping headers set on the injected Response. Responses carry a weak
+ETag; a matching If-None-Match gets a bodyless 304.
+CompressionMiddleware brotli- or gzip-compresses buffered bodies above
+a size threshold, depending on the client's Accept-Encoding.
+"""
+import gzip
+import hashlib
+
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse, Response
+
+from services import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional, gzip is always available
+    brotli = None
+
+# Headers of the injected Response that describe its own (empty) body
+_BODY_HEADERS = ("content-length", "content-type")
+
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (dataclasses and NumPy values included)."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=JSON_OPTIONS)
+
+
+def body_etag(body: bytes):
+    """Weak ETag for a serialized body."""
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def content_etag(content):
+    """Weak ETag for a JSON-serializable value."""
+    return body_etag(orjson.dumps(content, option=JSON_OPTIONS))
+
+
+def etag_matches(if_none_match: str, etag: str):
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in if_none_match.split(","))
+
+
+def json_response(content, response=None, request=None, status_code: int = 200):
+    """
+    Serialize content directly with orjson.
+
+    response is the Response a route received as a parameter; headers set
+    on it (e.g. X-Mirror-Freshness, ETag) are copied onto the returned
+    response. When the route also passes its request, the response gets
+    an ETag (the one already set on response, else a hash of the body)
+    and a matching If-None-Match is answered with a bodyless 304.
+    Serialization time is recorded per route in metrics.
+    """
+    headers = {}
+    if response is not None:
+        headers = {k: v for k, v in response.headers.items() if k not in _BODY_HEADERS}
+
+    route = metrics.route_label(request.scope) if request is not None else "unmatched"
+    if request is None:
+        return Response(_serialize(content, route), status_code=status_code, headers=headers,
+                        media_type="application/json")
+
+    etag = headers.get("etag")
+    body = None
+    if etag is None:
+        body = _serialize(content, route)
+        etag = body_etag(body)
+        headers["etag"] = etag
+    # Clients may reuse the body only after revalidating it
+    headers.setdefault("cache-control", "no-cache")
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if body is None:
+        body = _serialize(content, route)
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def _serialize(content, route: str):
+    with metrics.SERIALIZATION_SECONDS.labels(route).time():
+        return orjson.dumps(content, option=JSON_OPTIONS)
+
+
+def negotiate_encoding(accept_encoding: str):
+    """Pick "br" or "gzip" from an Accept-Encoding header, or None."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+
+    def allowed(coding):
+        return accepted.get(coding, accepted.get("*", 0)) > 0
+
+    if brotli is not None and allowed("br"):
+        return "br"
+    if allowed("gzip"):
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4):
+    """Compress body with the negotiated encoding."""
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing complete response bodies of at least
+    minimum_size bytes with brotli or gzip.
+
+    Streaming responses (more_body) and bodies that already carry a
+    Content-Encoding pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start = message
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+
+            if message.get("more_body") or "content-encoding" in headers:
+                # Streaming or already encoded: forward as-is
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            headers.add_vary_header("Accept-Encoding")
+            if len(body) >= self.minimum_size:
+                body = compress(body, encoding, self.gzip_level, self.brotli_quality)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
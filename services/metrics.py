@@ -0,0 +1,131 @@
+"""
+Prometheus metrics for the API, exposed on /metrics.
+
+Request latency is recorded per route by MetricsMiddleware. Inside a
+request the time is split into phases: upstream ERPNext calls (per
+doctype), risk scoring (per dataset) and JSON serialization (per
+route), so a slow endpoint can be attributed to one of them; with
+ERP_SITES the answer time of each site is recorded as well. Counters
+track rows fetched from ERPNext, rows kept after scoring and upstream
+errors by status.
+"""
+import time
+
+import requests
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+
+from services.breaker import CircuitOpenError
+
+registry = CollectorRegistry()
+
+# Latency buckets (seconds) shared by the request and phase histograms
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_SECONDS = Histogram(
+    "risk_radar_request_seconds",
+    "API request latency by route",
+    ["route", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry
+)
+UPSTREAM_SECONDS = Histogram(
+    "risk_radar_upstream_seconds",
+    "ERPNext list call latency by doctype (retries included)",
+    ["doctype"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry
+)
+SCORING_SECONDS = Histogram(
+    "risk_radar_scoring_seconds",
+    "Risk scoring time by dataset",
+    ["dataset"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry
+)
+SERIALIZATION_SECONDS = Histogram(
+    "risk_radar_serialization_seconds",
+    "JSON serialization time by route",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry
+)
+ROWS_FETCHED = Counter(
+    "risk_radar_rows_fetched",
+    "Rows received from ERPNext by doctype",
+    ["doctype"],
+    registry=registry
+)
+ROWS_KEPT = Counter(
+    "risk_radar_rows_kept",
+    "Rows classified as at risk by dataset",
+    ["dataset"],
+    registry=registry
+)
+SITE_SECONDS = Histogram(
+    "risk_radar_site_seconds",
+    "Time one ERPNext site took to answer a fanned-out risk query, by outcome",
+    ["site", "status"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry
+)
+UPSTREAM_ERRORS = Counter(
+    "risk_radar_upstream_errors",
+    "Failed ERPNext calls by doctype and status",
+    ["doctype", "status"],
+    registry=registry
+)
+
+# Long-lived or self-referential routes left out of REQUEST_SECONDS
+UNTIMED_ROUTES = ("/events", "/metrics")
+
+
+def error_status(exc):
+    """Status label for a failed ERPNext call: HTTP status or error kind."""
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        return str(exc.response.status_code)
+    if isinstance(exc, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(exc, requests.exceptions.Timeout):
+        return "timeout"
+    if isinstance(exc, requests.exceptions.ConnectionError):
+        return "connection"
+    return "error"
+
+
+def route_label(scope):
+    """Route template of a request (e.g. /invoices/overdue), or "unmatched"."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def render():
+    """Return (body, content_type) of the current metrics."""
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording REQUEST_SECONDS for every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = route_label(scope)
+            if route not in UNTIMED_ROUTES:
+                REQUEST_SECONDS.labels(route, scope["method"], status).observe(time.perf_counter() - started)
@@ -0,0 +1,234 @@
+"""
+Optional local SQLite mirror of the ERPNext documents the radar uses.
+
+Sales Invoice, Bin and Purchase Order rows are copied into indexed
+tables and kept current with `modified` deltas (see services.sync for
+the same approach applied in memory). The risk fetchers can then run
+customer, warehouse and threshold filters as local queries instead of
+new ERPNext calls.
+
+Each doctype keeps its own `modified` watermark in the sync_state
+table. The first sync requests only open documents; later ones request
+everything modified since the watermark, and apply() drops rows that
+were paid, cancelled or fully received in the meantime. Reads and
+writes share one connection behind a lock, so the API and the
+background sync can use the mirror from different threads.
+"""
+import sqlite3
+import threading
+import time
+
+from services.records import BinRecord, PurchaseOrderRecord, SalesInvoiceRecord
+from services.sync import FILTER_OPERATORS, is_open_invoice
+
+OPEN_PO_STATUSES = ["To Receive", "To Receive and Bill"]
+
+# doctype -> (table, mirrored columns, filters for the first full load)
+MIRRORED_DOCTYPES = {
+    "Sales Invoice": (
+        "sales_invoice",
+        ["name", "customer", "posting_date", "due_date", "status",
+         "outstanding_amount", "grand_total", "currency"],
+        [["docstatus", "=", 1], ["status", "!=", "Paid"], ["outstanding_amount", ">", 0]]
+    ),
+    "Bin": (
+        "bin",
+        ["name", "item_code", "warehouse", "actual_qty"],
+        []
+    ),
+    "Purchase Order": (
+        "purchase_order",
+        ["name", "supplier", "transaction_date", "status", "grand_total",
+         "currency", "per_received"],
+        [["docstatus", "=", 1], ["status", "in", OPEN_PO_STATUSES]]
+    )
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sales_invoice (
+    name TEXT PRIMARY KEY,
+    customer TEXT,
+    posting_date TEXT,
+    due_date TEXT,
+    status TEXT,
+    outstanding_amount REAL,
+    grand_total REAL,
+    currency TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sales_invoice_due_date ON sales_invoice (due_date);
+CREATE INDEX IF NOT EXISTS idx_sales_invoice_customer ON sales_invoice (customer, due_date);
+
+CREATE TABLE IF NOT EXISTS bin (
+    name TEXT PRIMARY KEY,
+    item_code TEXT,
+    warehouse TEXT,
+    actual_qty REAL
+);
+CREATE INDEX IF NOT EXISTS idx_bin_warehouse ON bin (warehouse, actual_qty);
+CREATE INDEX IF NOT EXISTS idx_bin_item_code ON bin (item_code);
+CREATE INDEX IF NOT EXISTS idx_bin_actual_qty ON bin (actual_qty);
+
+CREATE TABLE IF NOT EXISTS purchase_order (
+    name TEXT PRIMARY KEY,
+    supplier TEXT,
+    transaction_date TEXT,
+    status TEXT,
+    grand_total REAL,
+    currency TEXT,
+    per_received REAL
+);
+CREATE INDEX IF NOT EXISTS idx_purchase_order_transaction_date ON purchase_order (transaction_date);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    doctype TEXT PRIMARY KEY,
+    watermark TEXT,
+    synced_at REAL
+);
+"""
+
+
+class LocalMirror:
+    """SQLite copy of open invoices, all bins and open purchase orders."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def sync_params(self, doctype: str):
+        """Build list query params for the next full or delta sync."""
+        _, columns, open_filters = MIRRORED_DOCTYPES[doctype]
+        watermark = self._state(doctype)[0]
+
+        if watermark is None:
+            filters = open_filters
+        else:
+            # >= so documents sharing the watermark timestamp are never skipped
+            filters = [["modified", ">=", watermark]]
+
+        fields = columns + ["docstatus", "modified"]
+        return {
+            "fields": str(fields).replace("'", '"'),
+            "filters": str(filters).replace("'", '"'),
+            "order_by": "modified asc"
+        }
+
+    def apply(self, doctype: str, rows):
+        """Upsert open documents, delete closed ones and advance the watermark."""
+        table, columns, _ = MIRRORED_DOCTYPES[doctype]
+        upsert = (
+            f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+
+        watermark = self._state(doctype)[0]
+        keep, drop = [], []
+        for row in rows:
+            if self._is_open(doctype, row):
+                keep.append(tuple(row.get(col) for col in columns))
+            else:
+                drop.append((row.get("name"),))
+
+            modified = row.get("modified")
+            if modified and (watermark is None or modified > watermark):
+                watermark = modified
+
+        with self._lock, self._conn:
+            self._conn.executemany(upsert, keep)
+            self._conn.executemany(f"DELETE FROM {table} WHERE name = ?", drop)
+            self._conn.execute(
+                "INSERT INTO sync_state (doctype, watermark) VALUES (?, ?) "
+                "ON CONFLICT(doctype) DO UPDATE SET watermark = excluded.watermark",
+                (doctype, watermark)
+            )
+
+    def mark_synced(self, doctype: str):
+        """Record the time of the last completed sync of a doctype."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sync_state (doctype, synced_at) VALUES (?, ?) "
+                "ON CONFLICT(doctype) DO UPDATE SET synced_at = excluded.synced_at",
+                (doctype, time.time())
+            )
+
+    def freshness(self):
+        """
+        Seconds since the least recently synced doctype was synced,
+        or None if any doctype has never been synced.
+        """
+        synced = [self._state(doctype)[1] for doctype in MIRRORED_DOCTYPES]
+        if any(ts is None for ts in synced):
+            return None
+        return max(0.0, time.time() - min(synced))
+
+    def overdue_invoices(self, today, customer: str = None, filters: list = None):
+        """
+        Open invoices due before today, oldest due date first.
+
+        filters are extra [field, operator, value] conditions.
+        """
+        sql = "SELECT * FROM sales_invoice WHERE due_date < ?"
+        args = [today.isoformat()]
+        if customer:
+            sql += " AND customer = ?"
+            args.append(customer)
+        columns = MIRRORED_DOCTYPES["Sales Invoice"][1]
+        for field, op, value in filters or []:
+            if field not in columns or op not in FILTER_OPERATORS:
+                raise ValueError(f"Unsupported filter: {field} {op}")
+            sql += f" AND {field} {op} ?"
+            args.append(value)
+        sql += " ORDER BY due_date ASC"
+        return self._query(sql, args, SalesInvoiceRecord)
+
+    def low_stock_bins(self, warehouses, item_code: str = None, min_qty: float = None, max_qty: float = None):
+        """Bins in the given warehouses within [min_qty, max_qty], lowest qty first."""
+        sql = f"SELECT * FROM bin WHERE warehouse IN ({', '.join('?' for _ in warehouses)})"
+        args = list(warehouses)
+        if item_code:
+            sql += " AND item_code = ?"
+            args.append(item_code)
+        if min_qty is not None:
+            sql += " AND actual_qty >= ?"
+            args.append(min_qty)
+        if max_qty is not None:
+            sql += " AND actual_qty <= ?"
+            args.append(max_qty)
+        sql += " ORDER BY actual_qty ASC"
+        return self._query(sql, args, BinRecord)
+
+    def open_purchase_orders(self, limit: int = None):
+        """Open purchase orders, oldest transaction date first."""
+        sql = "SELECT * FROM purchase_order ORDER BY transaction_date ASC"
+        args = []
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return self._query(sql, args, PurchaseOrderRecord)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _query(self, sql, args, record):
+        with self._lock:
+            return [record(**row) for row in self._conn.execute(sql, args)]
+
+    def _state(self, doctype):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT watermark, synced_at FROM sync_state WHERE doctype = ?",
+                (doctype,)
+            ).fetchone()
+        return (row["watermark"], row["synced_at"]) if row else (None, None)
+
+    @staticmethod
+    def _is_open(doctype, row):
+        if doctype == "Bin":
+            return True
+        if doctype == "Sales Invoice":
+            return is_open_invoice(row)
+        return row.get("docstatus") == 1 and row.get("status") in OPEN_PO_STATUSES
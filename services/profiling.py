@@ -0,0 +1,183 @@
+"""
+Opt-in sampling profiler for single API requests.
+
+Disabled unless RISK_PROFILING=1, in which case app.py installs
+ProfilingMiddleware. A request with ?profile=1 or an `X-Profile: 1`
+header is then sampled every RISK_PROFILE_INTERVAL seconds from a
+background thread: while the request's task runs, the event loop
+thread's stack is recorded; while it is suspended (waiting on ERPNext,
+a shared single-flight request, ...) its await chain is recorded under
+an "[await]" frame. The samples are written to RISK_PROFILE_DIR in
+folded-stack format (flamegraph.pl, speedscope, inferno) and the file
+name is returned in the X-Profile response header.
+
+Samples of the loop thread may include other requests handled
+concurrently; profile on a quiet instance for clean results.
+
+Profiled requests run with `profiling` set, and app.py then loads risk
+payloads live from ERPNext instead of serving the cached snapshot, so
+the profile shows the fetch and scoring work rather than a cache hit.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers, MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.getenv("RISK_PROFILING", "0") == "1"
+PROFILE_DIR = Path(os.getenv("RISK_PROFILE_DIR", "profiles"))
+PROFILE_INTERVAL = float(os.getenv("RISK_PROFILE_INTERVAL", "0.005"))
+# Number of profile files kept in PROFILE_DIR (oldest are deleted)
+PROFILE_KEEP = int(os.getenv("RISK_PROFILE_KEEP", "100"))
+
+PROFILE_NAME = re.compile(r"^[\w-]+\.folded$")
+
+# True while a profiled request (and tasks started by it) runs
+profiling = contextvars.ContextVar("risk_profiling", default=False)
+
+
+def wants_profile(scope):
+    """True if the request asks to be profiled (?profile=1 or X-Profile: 1)."""
+    if Headers(scope=scope).get("x-profile") == "1":
+        return True
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("profile", [None])[-1] == "1"
+
+
+def frame_label(code):
+    """Flame graph label of a code object, e.g. erpnext.py:LowStockScorer._score."""
+    return f"{Path(code.co_filename).name}:{code.co_qualname}"
+
+
+def thread_stack(frame):
+    """Labels of a thread's frames, outermost first."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def await_chain(coro):
+    """Labels of a suspended coroutine and everything it awaits, outermost first."""
+    labels = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        labels.append(frame_label(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return labels
+
+
+class StackSampler:
+    """Samples the stack of one asyncio task from a background thread."""
+
+    def __init__(self, task: asyncio.Task, thread_id: int, interval: float = PROFILE_INTERVAL):
+        self.task = task
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def sample(self):
+        """Record one sample of the task."""
+        coro = self.task.get_coro()
+        if getattr(coro, "cr_running", False):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = thread_stack(frame)
+        else:
+            stack = ["[await]"] + await_chain(coro)
+        if stack:
+            self.samples[";".join(stack)] += 1
+
+    def folded(self):
+        """Samples in folded-stack format, one "frame;frame;... count" per line."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+
+def profile_name():
+    """New, sortable profile file name."""
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.folded"
+
+
+def save_profile(name: str, folded: str, directory: Path = PROFILE_DIR, keep: int = PROFILE_KEEP):
+    """Write a folded profile to directory, keeping only the newest `keep`."""
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / name).write_text(folded)
+
+    stored = sorted(directory.glob("*.folded"))
+    for old in stored[:max(len(stored) - keep, 0)]:
+        old.unlink(missing_ok=True)
+
+
+def load_profile(name: str, directory: Path = PROFILE_DIR):
+    """Return a stored profile by file name, or None if there is none."""
+    if not PROFILE_NAME.match(name):
+        return None
+    path = directory / name
+    return path.read_text() if path.is_file() else None
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling requests that ask for it (see wants_profile).
+
+    Other requests pass straight through. The X-Profile response header
+    names the stored profile.
+    """
+
+    def __init__(self, app, directory: Path = PROFILE_DIR, interval: float = PROFILE_INTERVAL):
+        self.app = app
+        self.directory = directory
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        name = profile_name()
+        sampler = StackSampler(asyncio.current_task(), threading.get_ident(), self.interval)
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile"] = name
+            await send(message)
+
+        token = profiling.set(True)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            profiling.reset(token)
+            # Joining the sampler and writing the file block; keep them off the loop
+            await asyncio.to_thread(sampler.stop)
+            try:
+                await asyncio.to_thread(save_profile, name, sampler.folded(), self.directory)
+            except OSError:
+                logger.warning("Could not store profile %s", name, exc_info=True)
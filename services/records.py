@@ -0,0 +1,115 @@
+"""
+Compact record types for the rows the radar keeps in memory.
+
+Fetched Sales Invoice, Bin and Purchase Order rows are stored as slotted
+dataclasses instead of dicts, so cached pages, the invoice working set
+and the scored response rows carry no per-row hash table. Records keep
+the read-only mapping interface the services use on dicts (`row.get`,
+`row["field"]`, `keys()`), and FastAPI serializes them like dicts.
+"""
+from dataclasses import dataclass, fields
+
+
+class Record:
+    """Mapping-style read access for slotted dataclass rows."""
+
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, row):
+        """Build a record from a decoded row, ignoring unknown keys."""
+        return cls(**{name: row.get(name) for name in cls.__slots__ if name in row})
+
+    def get(self, key, default=None):
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key)
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self):
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+
+# Upstream rows (field names as requested from ERPNext)
+
+@dataclass(slots=True)
+class SalesInvoiceRecord(Record):
+    name: str = None
+    customer: str = None
+    posting_date: str = None
+    due_date: str = None
+    status: str = None
+    outstanding_amount: float = None
+    grand_total: float = None
+    currency: str = None
+    docstatus: int = None
+    modified: str = None
+
+
+@dataclass(slots=True)
+class BinRecord(Record):
+    name: str = None
+    item_code: str = None
+    warehouse: str = None
+    actual_qty: float = None
+    docstatus: int = None
+    modified: str = None
+
+
+@dataclass(slots=True)
+class PurchaseOrderRecord(Record):
+    name: str = None
+    supplier: str = None
+    transaction_date: str = None
+    status: str = None
+    grand_total: float = None
+    currency: str = None
+    per_received: float = None
+    docstatus: int = None
+    modified: str = None
+
+
+# Scored response rows
+
+@dataclass(slots=True)
+class OverdueInvoice(Record):
+    invoice_id: str
+    customer: str
+    posting_date: str
+    due_date: str
+    days_overdue: int
+    status: str
+    outstanding_amount: float
+    grand_total: float
+    currency: str
+    risk_level: str
+
+
+@dataclass(slots=True)
+class LowStockItem(Record):
+    item_code: str
+    warehouse: str
+    actual_qty: float
+    risk_level: str
+
+
+@dataclass(slots=True)
+class DelayedPurchaseOrder(Record):
+    po: str
+    supplier: str
+    transaction_date: str
+    stuck_days: int
+    status: str
+    grand_total: float
+    currency: str
+    risk_level: str
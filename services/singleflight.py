@@ -0,0 +1,61 @@
+"""
+Single-flight coalescing of identical concurrent upstream requests.
+
+While a request for a key is in flight, further callers with the same
+key wait for it and share its result (or exception) instead of sending
+their own. The request runs as its own task, so a caller that gives up
+does not cancel it for the others.
+"""
+import asyncio
+import threading
+
+
+class SingleFlight:
+    """Per-key deduplication of concurrent async calls, with counters."""
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executions = 0
+        self.collapsed = 0
+
+    async def do(self, key, fn):
+        """Return await fn(), sharing one in-flight call per key."""
+        with self._lock:
+            self.calls += 1
+            task = self._inflight.get(key)
+            if task is not None and task.get_loop() is asyncio.get_running_loop():
+                self.collapsed += 1
+            else:
+                task = asyncio.ensure_future(fn())
+                self._inflight[key] = task
+                self.executions += 1
+                task.add_done_callback(lambda done, key=key: self._forget(key, done))
+
+        return await asyncio.shield(task)
+
+    def stats(self):
+        """Return call counters and the number of requests in flight."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "collapsed": self.collapsed,
+                "in_flight": len(self._inflight)
+            }
+
+    def reset(self):
+        """Reset the counters (in-flight requests are kept)."""
+        with self._lock:
+            self.calls = 0
+            self.executions = 0
+            self.collapsed = 0
+
+    def _forget(self, key, task):
+        with self._lock:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+            # Exceptions are delivered to the waiting callers
+            if not task.cancelled():
+                task.exception()
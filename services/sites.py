@@ -0,0 +1,209 @@
+"""
+Registry of ERPNext sites and fan-out of the risk fetchers across them.
+
+One ERPNext site per company: ERP_SITES lists the site names, e.g.
+ERP_SITES="acme,globex", and each site is configured with
+ERP_SITE_<NAME>_URL, ERP_SITE_<NAME>_API_KEY, ERP_SITE_<NAME>_API_SECRET
+and optionally ERP_SITE_<NAME>_DEADLINE (seconds, default
+ERP_SITE_DEADLINE). Without ERP_SITES the radar reads the single
+ERP_URL site as before.
+
+fan_out() runs a fetcher on every site concurrently, each bound to its
+site with services.erpnext.use_site and cut off at the site's deadline,
+so one slow site cannot hold up the others. The merge_* functions turn
+the per-site payloads into one ranked view: rows gain a `site` column,
+counts and KPIs are combined, and "sites" holds each site's own KPIs or
+its error, and its circuit breaker state.
+
+The local mirror (ERP_MIRROR_PATH) and the invoice working set
+(ERP_INVOICE_SYNC) are not per site: they hold the ERP_URL site only,
+and fetchers bound to a site from this registry always query that site
+directly.
+"""
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from operator import itemgetter
+
+import requests
+from dotenv import load_dotenv
+
+from services import erpnext, metrics
+
+load_dotenv()
+
+# Seconds a site may take to answer one risk query before it is skipped
+SITE_DEADLINE = float(os.getenv("ERP_SITE_DEADLINE", "15"))
+
+
+@dataclass(frozen=True, slots=True)
+class Site:
+    name: str
+    url: str
+    api_key: str = field(default=None, repr=False)
+    api_secret: str = field(default=None, repr=False)
+    deadline: float = SITE_DEADLINE
+
+
+def load_sites(environ=os.environ):
+    """Sites listed in ERP_SITES, in order (empty without ERP_SITES)."""
+    sites = []
+    for name in environ.get("ERP_SITES", "").split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if any(site.name == name for site in sites):
+            raise ValueError(f"ERPNext site {name} is listed twice in ERP_SITES")
+
+        prefix = f"ERP_SITE_{name.upper().replace('-', '_')}_"
+        url = environ.get(prefix + "URL", "").rstrip("/")
+        if not url:
+            raise ValueError(f"Missing {prefix}URL in .env")
+        sites.append(Site(
+            name=name,
+            url=url,
+            api_key=environ.get(prefix + "API_KEY"),
+            api_secret=environ.get(prefix + "API_SECRET"),
+            deadline=float(environ.get(prefix + "DEADLINE", SITE_DEADLINE))
+        ))
+    return sites
+
+
+SITES = load_sites()
+
+
+@dataclass(slots=True)
+class SiteResult:
+    """Outcome of one fetcher call on one site."""
+
+    site: Site
+    value: dict = None
+    error: Exception = None
+    elapsed: float = 0.0
+
+    @property
+    def status(self):
+        if self.error is None:
+            return "ok"
+        if isinstance(self.error, requests.exceptions.Timeout):
+            return "timeout"
+        return "error"
+
+
+async def fan_out(sites, fetch):
+    """
+    Await fetch() once per site, concurrently; return a SiteResult per site.
+
+    ERPNext and configuration errors of a site (including running past
+    its deadline, reported as a ReadTimeout) are kept in its SiteResult
+    instead of failing the other sites. Each site's answer time goes to
+    the risk_radar_site_seconds metric rather than into the payload, so
+    identical data merges into an identical snapshot (and ETag).
+    """
+    results = await asyncio.gather(*(_fetch_site(site, fetch) for site in sites))
+    for result in results:
+        metrics.SITE_SECONDS.labels(result.site.name, result.status).observe(result.elapsed)
+    return results
+
+
+async def _fetch_site(site: Site, fetch):
+    started = time.monotonic()
+    with erpnext.use_site(site):
+        try:
+            async with asyncio.timeout(site.deadline):
+                value = await fetch()
+        except TimeoutError:
+            error = requests.exceptions.ReadTimeout(
+                f"ERPNext site {site.name} did not answer within {site.deadline}s"
+            )
+        except (requests.exceptions.RequestException, ValueError) as e:
+            error = e
+        else:
+            return SiteResult(site, value, elapsed=time.monotonic() - started)
+    return SiteResult(site, error=error, elapsed=time.monotonic() - started)
+
+
+def site_row(site: str, row):
+    """A payload row (record or dict) as a dict with its site first."""
+    return {"site": site, **(row.to_dict() if hasattr(row, "to_dict") else row)}
+
+
+def site_summary(result: SiteResult):
+    """
+    Per-site entry of a merged payload: its circuit breaker state and
+    its KPIs and counts, or its error.
+    """
+    summary = {"status": result.status, "breaker": erpnext.site_breaker(result.site).state}
+    if result.error is not None:
+        summary["error"] = str(result.error)
+    else:
+        summary.update((key, value) for key, value in result.value.items() if key != "data")
+    return summary
+
+
+def merge_ranked(results, rank, counts, limit: int = None, descending: bool = False):
+    """
+    Merge the payloads of several sites into one.
+
+    Rows of every answering site are ranked by rank(row) (ties keep site
+    order) and cut to limit; each field in counts is summed. "partial"
+    is true when some sites failed. If every site failed, the first
+    site's error is raised so callers report it like a single-site one.
+    """
+    answered = [result for result in results if result.error is None]
+    if not answered:
+        raise results[0].error
+
+    rows = [site_row(result.site.name, row) for result in answered for row in result.value.get("data", [])]
+    rows.sort(key=rank, reverse=descending)
+    if limit is not None:
+        rows = rows[:limit]
+
+    merged = {"count": len(rows)}
+    for name in counts:
+        merged[name] = sum(result.value.get(name, 0) for result in answered)
+    merged["data"] = rows
+    merged["partial"] = len(answered) < len(results)
+    merged["sites"] = {result.site.name: site_summary(result) for result in results}
+    return merged
+
+
+def merge_overdue_invoices(results, limit: int):
+    """
+    Merged /invoices/overdue payload: the `limit` most overdue invoices
+    of all sites, with KPIs summed over the sites (outstanding amounts
+    are added as-is, so they assume one currency; per-site KPIs are in
+    "sites").
+    """
+    merged = merge_ranked(
+        results, itemgetter("days_overdue"), ("medium_count", "high_count"), limit, descending=True
+    )
+    kpis = [(result.site.name, result.value.get("kpis", {})) for result in results if result.error is None]
+    worst_site, worst = max(kpis, key=lambda item: item[1].get("most_overdue_days", 0))
+
+    return {
+        "kpis": {
+            "overdue_invoices_count": sum(k.get("overdue_invoices_count", 0) for _, k in kpis),
+            "total_outstanding_overdue_amount": sum(k.get("total_outstanding_overdue_amount", 0) for _, k in kpis),
+            "most_overdue_days": worst.get("most_overdue_days", 0),
+            "most_overdue_invoice_id": worst.get("most_overdue_invoice_id"),
+            "most_overdue_customer": worst.get("most_overdue_customer"),
+            "most_overdue_site": worst_site if worst.get("most_overdue_days") else None
+        },
+        **merged
+    }
+
+
+def merge_low_stock(results, top_n: int):
+    """Merged /inventory/low-stock payload: the top_n lowest bins of all sites."""
+    return merge_ranked(
+        results, itemgetter("actual_qty"), ("total_count", "high_count", "medium_count"), top_n
+    )
+
+
+def merge_delayed_purchase_orders(results):
+    """Merged /purchase-orders/delayed payload, most delayed first."""
+    return merge_ranked(
+        results, itemgetter("stuck_days"), ("high_count", "medium_count"), descending=True
+    )
@@ -0,0 +1,198 @@
+"""
+Latest-result snapshots for the risk endpoints (stale-while-revalidate).
+
+Each snapshot is keyed by dataset name + query parameters and holds the
+last computed payload. Requests are answered from the snapshot right
+away; a snapshot older than max_age triggers a single background
+revalidation. A failed refresh keeps the last good value and flags it
+as failed.
+
+A scheduler started from the app lifespan refreshes the registered
+snapshots (the dashboard datasets, at most max_refreshed of them) on a
+fixed interval so they stay warm. Other keys, such as ad-hoc filter
+combinations, are only revalidated when read and are evicted least
+recently used first, so browsing filters never adds to the steady
+background load on ERPNext.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from services.http import content_etag
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """Last payload computed for one key."""
+
+    __slots__ = ("value", "fetched_at", "refreshing", "etag", "failed")
+
+    def __init__(self, value, fetched_at: float):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.refreshing = False
+        self.etag = None
+        # True when the last refresh failed and value is the last good one
+        self.failed = False
+
+
+class SnapshotStore:
+    """Bounded set of snapshots plus the loaders that rebuild them."""
+
+    def __init__(self, max_age: float = 60, max_keys: int = 64, max_refreshed: int = 16, clock=time.monotonic):
+        self.max_age = max_age
+        self.max_keys = max_keys
+        self.max_refreshed = max_refreshed
+        self._clock = clock
+        self._snapshots = OrderedDict()
+        self._loaders = {}
+        # Keys refreshed in the background by refresh_all / run
+        self._refreshed = OrderedDict()
+        self._tasks = set()
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """
+        Call listener(key, old_value, new_value) whenever a loaded
+        snapshot is replaced by a refresh.
+        """
+        self._listeners.append(listener)
+
+    def register(self, key, loader):
+        """
+        Keep key warm: refresh it in the background (see run) without
+        loading it yet. Beyond max_refreshed keys, the earliest registered
+        one stops being refreshed.
+        """
+        self._loaders[key] = loader
+        self._refreshed[key] = None
+        self._refreshed.move_to_end(key)
+        while len(self._refreshed) > self.max_refreshed:
+            dropped, _ = self._refreshed.popitem(last=False)
+            if dropped not in self._snapshots:
+                self._loaders.pop(dropped, None)
+
+    def registered(self):
+        """Keys refreshed in the background."""
+        return list(self._refreshed)
+
+    async def get(self, key, loader):
+        """
+        Return (value, age_seconds) for key.
+
+        The first request for a key waits for the loader; later requests
+        get the stored value immediately, and a stale value schedules a
+        background refresh. Reading a key does not register it.
+        """
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            value = await loader()
+            self._loaders[key] = loader
+            self._store(key, value)
+            return value, 0.0
+
+        self._loaders[key] = loader
+        self._snapshots.move_to_end(key)
+        age = self._clock() - snapshot.fetched_at
+        if age > self.max_age and not snapshot.refreshing:
+            self._revalidate(key)
+        return snapshot.value, age
+
+    def put(self, key, value):
+        """Store value as the latest snapshot of key."""
+        self._store(key, value)
+
+    def last_good(self, key):
+        """Return (value, age_seconds) of the stored snapshot, or None."""
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return None
+        return snapshot.value, self._clock() - snapshot.fetched_at
+
+    def failed(self, key):
+        """True if the last refresh of key failed."""
+        snapshot = self._snapshots.get(key)
+        return snapshot is not None and snapshot.failed
+
+    def etag(self, key):
+        """
+        Weak ETag of the current value for key, or None if not loaded.
+
+        It is a hash of the content, computed once per stored value, so
+        a refresh that yields the same data keeps the same ETag.
+        """
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return None
+        if snapshot.etag is None:
+            snapshot.etag = content_etag(snapshot.value)
+        return snapshot.etag
+
+    async def refresh(self, key):
+        """Rebuild one snapshot, keeping the previous value on failure."""
+        loader = self._loaders.get(key)
+        if loader is None:
+            return
+
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None:
+            snapshot.refreshing = True
+        try:
+            value = await loader()
+        except Exception:
+            logger.warning("Snapshot refresh failed for %s", key, exc_info=True)
+            if snapshot is not None:
+                snapshot.failed = True
+        else:
+            self._store(key, value)
+        finally:
+            if snapshot is not None:
+                snapshot.refreshing = False
+
+    async def refresh_all(self):
+        """Refresh every registered snapshot concurrently."""
+        await asyncio.gather(*(self.refresh(key) for key in list(self._refreshed)))
+
+    async def run(self, interval: float):
+        """Refresh all snapshots every `interval` seconds until cancelled."""
+        while True:
+            await self.refresh_all()
+            await asyncio.sleep(interval)
+
+    def clear(self):
+        """Drop all snapshots and loaders."""
+        self._snapshots.clear()
+        self._loaders.clear()
+        self._refreshed.clear()
+
+    def _store(self, key, value):
+        previous = self._snapshots.get(key)
+        self._snapshots[key] = Snapshot(value, self._clock())
+        self._snapshots.move_to_end(key)
+        self._evict()
+
+        if previous is None:
+            return
+        for listener in self._listeners:
+            try:
+                listener(key, previous.value, value)
+            except Exception:
+                logger.warning("Snapshot listener failed for %s", key, exc_info=True)
+
+    def _revalidate(self, key):
+        self._snapshots[key].refreshing = True
+        task = asyncio.create_task(self.refresh(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _evict(self):
+        # Least recently used first; registered keys only if nothing else is left
+        while len(self._snapshots) > self.max_keys:
+            key = next((k for k in self._snapshots if k not in self._refreshed), None)
+            if key is None:
+                key = next(iter(self._snapshots))
+            del self._snapshots[key]
+            if key not in self._refreshed:
+                self._loaders.pop(key, None)
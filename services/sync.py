@@ -0,0 +1,127 @@
+"""
+Incremental sync of open Sales Invoices.
+
+The working set holds every open (submitted, unpaid, outstanding > 0)
+invoice. After the first full load only documents whose `modified`
+timestamp is at or after the watermark are requested, so the steady-state
+cost of a refresh is proportional to churn rather than ledger size.
+
+services.erpnext fetches the pages described by sync_params() and feeds
+them to apply(). is_open_invoice() is also the open-invoice rule of the
+SQLite mirror (services.mirror).
+"""
+import operator
+import time
+
+INVOICE_FIELDS = [
+    "name",
+    "customer",
+    "posting_date",
+    "due_date",
+    "status",
+    "outstanding_amount",
+    "grand_total",
+    "currency",
+    "docstatus",
+    "modified"
+]
+
+FILTER_OPERATORS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge
+}
+
+
+def matches_filters(row, filters):
+    """Evaluate ERPNext-style [field, operator, value] filters against a row."""
+    for field, op, value in filters or []:
+        actual = row.get(field)
+        if actual is None or not FILTER_OPERATORS[op](actual, value):
+            return False
+    return True
+
+
+def is_open_invoice(inv):
+    """True for a submitted, unpaid Sales Invoice with an outstanding amount."""
+    return (
+        inv.get("docstatus") == 1
+        and inv.get("status") != "Paid"
+        and (inv.get("outstanding_amount") or 0) > 0
+    )
+
+
+class InvoiceWorkingSet:
+    """Local copy of open Sales Invoices kept current via `modified` deltas."""
+
+    def __init__(self):
+        self.rows = {}
+        self.watermark = None
+        self.last_synced_at = None
+
+    def sync_params(self):
+        """
+        Build list query params for the next sync.
+
+        The first sync loads every open invoice; later syncs ask only for
+        invoices modified since the watermark, whatever their status, so
+        paid and cancelled documents can be evicted.
+        """
+        if self.watermark is None:
+            filters = [
+                ["docstatus", "=", 1],
+                ["status", "!=", "Paid"],
+                ["outstanding_amount", ">", 0]
+            ]
+        else:
+            # >= rather than > so documents sharing the watermark timestamp
+            # are never skipped; re-applying them is idempotent.
+            filters = [["modified", ">=", self.watermark]]
+
+        return {
+            "fields": str(INVOICE_FIELDS).replace("'", '"'),
+            "filters": str(filters).replace("'", '"'),
+            "order_by": "modified asc"
+        }
+
+    def apply(self, rows):
+        """Upsert open invoices and evict paid, cancelled or settled ones."""
+        for inv in rows:
+            name = inv.get("name")
+            if is_open_invoice(inv):
+                self.rows[name] = inv
+            else:
+                self.rows.pop(name, None)
+
+            modified = inv.get("modified")
+            if modified and (self.watermark is None or modified > self.watermark):
+                self.watermark = modified
+
+    def mark_synced(self):
+        """Record the time of the last completed sync."""
+        self.last_synced_at = time.time()
+
+    def overdue_rows(self, today, customer: str = None, filters: list = None):
+        """
+        Return open invoices due before today, oldest due date first.
+
+        filters are extra [field, operator, value] conditions.
+        """
+        today_str = today.isoformat()
+        rows = [
+            inv for inv in self.rows.values()
+            if inv.get("due_date") and inv["due_date"] < today_str
+            and (not customer or inv.get("customer") == customer)
+            and matches_filters(inv, filters)
+        ]
+        rows.sort(key=lambda inv: inv["due_date"])
+        return rows
+
+    def reset(self):
+        """Forget all rows so the next sync is a full load."""
+        self.rows.clear()
+        self.watermark = None
+        self.last_synced_at = None